@@ -0,0 +1,78 @@
+"""
+Time one allocation round of the batch matcher.
+
+    python benchmarks/bench_allocation.py --donations 2000 --ngos 400 --interest 15 --capacity 5
+
+Builds a synthetic round: each NGO registers interest in ``--interest``
+random donations and holds up to ``--capacity`` of them. The script times
+scoring and the assignment solve and reports how many donations were
+allocated. It uses scipy's linear_sum_assignment when scipy is installed,
+otherwise the NumPy fallback in core.allocation.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nowastemate.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from core import allocation  # noqa: E402
+
+
+def synthetic(donations, ngos, interest, capacity, seed):
+    rng = np.random.default_rng(seed)
+    # A city-sized box around Chennai; a tenth of each side has no coordinates.
+    centre = np.array([13.05, 80.25])
+    ngo_location = centre + rng.normal(scale=0.08, size=(ngos, 2))
+    ngo_location[rng.random(ngos) < 0.1] = np.nan
+    donation_location = centre + rng.normal(scale=0.08, size=(donations, 2))
+    donation_location[rng.random(donations) < 0.1] = np.nan
+    reliability = rng.beta(8, 2, ngos)
+    reliability[rng.random(ngos) < 0.2] = np.nan
+    # Popular donations (nearby, good categories) attract most of the interest.
+    popularity = rng.zipf(1.6, donations).astype(float)
+    popularity /= popularity.sum()
+    ngo_index = np.repeat(np.arange(ngos), interest)
+    donation_index = np.concatenate([
+        rng.choice(donations, size=min(interest, donations), replace=False, p=popularity) for _ in range(ngos)
+    ])
+    capacities = rng.integers(1, capacity + 1, ngos)
+    return ngo_location, reliability, donation_location, ngo_index, donation_index, capacities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--donations', type=int, default=2000)
+    parser.add_argument('--ngos', type=int, default=400)
+    parser.add_argument('--interest', type=int, default=15, help="Donations each NGO registers interest in.")
+    parser.add_argument('--capacity', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=7)
+    options = parser.parse_args()
+
+    round_ = synthetic(options.donations, options.ngos, options.interest, options.capacity, options.seed)
+    ngo_location, reliability, donation_location, ngo_index, donation_index, capacities = round_
+    solver = 'scipy' if allocation.linear_sum_assignment is not None else 'numpy fallback'
+    timings = []
+    for _ in range(options.repeat):
+        started = time.perf_counter()
+        scores = allocation.score_pairs(ngo_location, reliability, donation_location, ngo_index, donation_index)
+        matches = allocation.match(ngo_index, donation_index, scores, capacities)
+        timings.append(time.perf_counter() - started)
+    print(f"{options.donations} donations, {options.ngos} NGOs x {options.interest} interests, "
+          f"{int(capacities.sum())} capacity slots ({solver})")
+    print(f"allocated {len(matches)}; best {min(timings) * 1000:.0f} ms, "
+          f"median {sorted(timings)[len(timings) // 2] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Compare concurrent-claim throughput between the WSGI and ASGI deployments.
+
+    python benchmarks/bench_claims.py --donations 2000 --concurrency 64 --racers 4
+
+For each worker configuration in bench_workers.py this creates fresh
+available donations, then has logged-in NGO clients claim them through
+/donations/claim/<id>/, with ``--racers`` clients contending for every
+donation. Point DJANGO_SETTINGS_MODULE at the settings you want to measure;
+the database must be migrated first.
+"""
+import argparse
+import http.client
+import os
+import queue
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from bench_workers import CONFIGURATIONS, ROOT, wait_until_up
+
+sys.path.insert(0, str(ROOT))
+
+
+def setup_django():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nowastemate.settings_production')
+    django.setup()
+
+
+def session_cookies(count):
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.models import User
+
+    from core.models import UserProfile
+
+    store_class = import_module(settings.SESSION_ENGINE).SessionStore
+    cookies = []
+    for i in range(count):
+        ngo, created = User.objects.get_or_create(username=f'bench-ngo-{i}', defaults={'email': f'bench-ngo-{i}@example.com'})
+        if created:
+            UserProfile.objects.create(user=ngo, role='ngo', phone_number='0000000000', is_approved=True)
+        session = store_class()
+        session[SESSION_KEY] = str(ngo.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = ngo.get_session_auth_hash()
+        session.save()
+        cookies.append(f'{settings.SESSION_COOKIE_NAME}={session.session_key}')
+    return cookies
+
+
+def fresh_donations(count):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from core.models import Donation, UserProfile
+
+    donor, created = User.objects.get_or_create(username='bench-donor', defaults={'email': 'bench-donor@example.com'})
+    if created:
+        UserProfile.objects.create(user=donor, role='donor', phone_number='0000000000', is_approved=True)
+    pickup_by = timezone.now() + timedelta(days=1)
+    donations = Donation.objects.bulk_create(
+        Donation(donor=donor, food_item='Benchmark meal', category='cooked', quantity='1 kg',
+                 pickup_location='Main Canteen', pickup_by=pickup_by)
+        for _ in range(count)
+    )
+    return [donation.id for donation in donations]
+
+
+def claim_all(port, cookies, donation_ids, racers, concurrency):
+    work = queue.Queue()
+    for donation_id in donation_ids:
+        # Consecutive copies are picked up by different clients at once.
+        for _ in range(racers):
+            work.put(donation_id)
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def client(cookie):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        mine, failed = [], 0
+        while True:
+            try:
+                donation_id = work.get_nowait()
+            except queue.Empty:
+                break
+            started = time.perf_counter()
+            try:
+                connection.request('GET', f'/donations/claim/{donation_id}/', headers={'Cookie': cookie})
+                response = connection.getresponse()
+                response.read()
+                # Winners and losers are both redirected; anything else is an error.
+                if response.status != 302:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+            failures.append(failed)
+
+    threads = [threading.Thread(target=client, args=(cookies[i % len(cookies)],)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(failures), time.perf_counter() - started
+
+
+def run(name, app, args, options, cookies):
+    from core.models import Donation
+
+    donation_ids = fresh_donations(options.donations)
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', str(ROOT / 'gunicorn.conf.py'),
+        '--bind', f'127.0.0.1:{options.port}', '--access-logfile', '/dev/null', *args, app,
+    ]
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(options.port)
+        latencies, errors, elapsed = claim_all(options.port, cookies, donation_ids, options.racers, options.concurrency)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    claimed = Donation.objects.filter(id__in=donation_ids, status='claimed').count()
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float('nan')
+    print(f"{name:<12} {len(latencies) / elapsed:>10.1f} {claimed / elapsed:>10.1f} {p50:>9.1f} {p99:>9.1f} {errors:>7}")
+    Donation.objects.filter(id__in=donation_ids).delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--donations', type=int, default=2000)
+    parser.add_argument('--racers', type=int, default=4, help="Clients contending for each donation.")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--ngos', type=int, default=16)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--only', nargs='*', help="Run only these configuration names.")
+    options = parser.parse_args()
+
+    setup_django()
+    cookies = session_cookies(options.ngos)
+    print(f"{options.donations} donations x {options.racers} racers, {options.concurrency} clients")
+    print(f"{'workers':<12} {'req/s':>10} {'claims/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, app, args in CONFIGURATIONS:
+        if options.only and name not in options.only:
+            continue
+        run(name, app, args, options, cookies)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Time the reputation batch job.
+
+    python benchmarks/bench_reputation.py --donations 1000000 --users 20000
+    python benchmarks/bench_reputation.py --db
+
+By default the metrics are computed over synthetic arrays, which isolates the
+vectorized part. With --db it runs the full `refresh_reputation` job (load,
+compute, bulk_update) against the configured database; seed it first with
+`manage.py seed --donations 1000000`.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nowastemate.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from core import reputation  # noqa: E402
+
+
+def synthetic(donations, reviews, users, seed):
+    rng = np.random.default_rng(seed)
+    now = datetime.now(timezone.utc).timestamp()
+    claimed_at = now - rng.uniform(0, 3 * 365 * 86400, donations)
+    completed = rng.random(donations) < 0.85
+    completed_at = np.where(completed, claimed_at + rng.uniform(3600, 86400, donations), np.nan)
+    claimed_at[rng.random(donations) < 0.1] = np.nan  # rows claimed before claimed_at existed
+    donation_arrays = {
+        'donor': rng.integers(1, users // 2, donations),
+        'ngo': rng.integers(users // 2, users, donations),
+        'completed': completed,
+        'claimed_at': claimed_at,
+        'completed_at': completed_at,
+    }
+    review_arrays = {
+        'reviewed': rng.integers(1, users, reviews),
+        'rating': rng.choice([1.0, 2.0, 3.0, 4.0, 5.0], reviews, p=[0.05, 0.05, 0.15, 0.3, 0.45]),
+        'created_at': now - rng.uniform(0, 3 * 365 * 86400, reviews),
+    }
+    return donation_arrays, review_arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--donations', type=int, default=1_000_000)
+    parser.add_argument('--reviews', type=int, default=None, help="Defaults to 1.2x donations.")
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--db', action='store_true', help="Time the full job against the configured database.")
+    options = parser.parse_args()
+
+    if options.db:
+        started = time.perf_counter()
+        donations, reviews = reputation.load()
+        loaded = time.perf_counter()
+        count = reputation.refresh()
+        print(f"load only: {loaded - started:.2f}s for {len(donations['donor'])} donations, "
+              f"{len(reviews['reviewed'])} reviews")
+        print(f"full refresh of {count} profiles: {time.perf_counter() - loaded:.2f}s")
+        return
+
+    review_count = options.reviews if options.reviews is not None else int(options.donations * 1.2)
+    donations, reviews = synthetic(options.donations, review_count, options.users, options.seed)
+    now = datetime.now(timezone.utc)
+    timings = []
+    for _ in range(options.repeat):
+        started = time.perf_counter()
+        reputation.compute(donations, reviews, options.users, now, prior_weight=5, half_life_days=30)
+        timings.append(time.perf_counter() - started)
+    print(f"compute: {options.donations} donations, {review_count} reviews, {options.users} users")
+    print(f"best {min(timings) * 1000:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
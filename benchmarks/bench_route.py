@@ -0,0 +1,61 @@
+"""
+Time the NGO pickup route planner.
+
+    python benchmarks/bench_route.py --stops 50 200 400
+
+For each size this scatters random pickup sites over a city and times
+the distance matrix, the nearest-neighbour tour and the 2-opt pass. It
+prints each tour's length before and after 2-opt.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nowastemate.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from core import routing  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stops', type=int, nargs='+', default=[50, 200, 400])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    options = parser.parse_args()
+
+    rng = np.random.default_rng(options.seed)
+    print(f"{'stops':>6} {'matrix ms':>10} {'nn ms':>8} {'2-opt ms':>9} {'nn km':>8} {'2-opt km':>9}")
+    for stops in options.stops:
+        timings = {'matrix': [], 'nn': [], 'opt': []}
+        for attempt in range(options.repeat):
+            coordinates = np.array([13.05, 80.25]) + rng.normal(scale=0.08, size=(stops, 2))
+            # Fresh ids each time so the matrix cache never hits.
+            site_ids = list(range(attempt * stops, (attempt + 1) * stops))
+            started = time.perf_counter()
+            distances = routing.distance_matrix(site_ids, coordinates)
+            built = time.perf_counter()
+            tour = routing.nearest_neighbour(distances)
+            toured = time.perf_counter()
+            improved = routing.two_opt(distances, tour.copy())
+            finished = time.perf_counter()
+            timings['matrix'].append(built - started)
+            timings['nn'].append(toured - built)
+            timings['opt'].append(finished - toured)
+        ms = {name: statistics.median(values) * 1000 for name, values in timings.items()}
+        print(f"{stops:>6} {ms['matrix']:>10.2f} {ms['nn']:>8.2f} {ms['opt']:>9.2f} "
+              f"{routing.path_length(distances, tour):>8.1f} {routing.path_length(distances, improved):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
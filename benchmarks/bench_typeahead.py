@@ -0,0 +1,82 @@
+"""
+Time feed typeahead lookups.
+
+    python benchmarks/bench_typeahead.py --donations 10000 100000
+
+For each size this fills an in-memory index with random food items and
+addresses (no database), then times lookups for every one- to four-letter
+prefix of sampled words, and single add/remove updates.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nowastemate.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from core import typeahead  # noqa: E402
+
+FOODS = ['rice', 'dal', 'chapati', 'biryani', 'sambar', 'idli', 'dosa', 'curd', 'bread', 'buns', 'paneer',
+         'mixed', 'vegetables', 'fried', 'lemon', 'tomato', 'curry', 'chicken', 'egg', 'fruit', 'salad']
+PLACES = ['main', 'canteen', 'hostel', 'block', 'north', 'south', 'gate', 'library', 'road', 'street',
+          'station', 'college', 'department', 'kitchen', 'hall', 'mess', 'campus', 'avenue']
+
+
+def phrase(rng, words, length):
+    return ' '.join(rng.choice(words) for _ in range(length))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--donations', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    options = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    deadline = datetime.now(timezone.utc) + timedelta(hours=4)
+    print(f"{'donations':>10} {'build s':>8} {'median ms':>10} {'p99 ms':>8} {'max ms':>8} {'update ms':>10}")
+    for donations in options.donations:
+        rows = [
+            (i, phrase(rng, FOODS, rng.randint(1, 3)), f"{rng.randint(1, 500)} {phrase(rng, PLACES, rng.randint(2, 4))}",
+             deadline)
+            for i in range(donations)
+        ]
+        index = typeahead.DonationIndex()
+        started = time.perf_counter()
+        index.load(rows)
+        built = time.perf_counter() - started
+
+        timings = []
+        for _ in range(options.lookups):
+            field, words = rng.choice([('food', FOODS), ('location', PLACES)])
+            word = rng.choice(words)
+            prefix = word[:rng.randint(1, min(4, len(word)))]
+            started = time.perf_counter()
+            index.search(field, prefix)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+
+        updates = []
+        for i in range(200):
+            started = time.perf_counter()
+            index.add(donations + i, f"special dish {i}", f"{i} new kitchen road", deadline)
+            index.remove(donations + i)
+            updates.append(time.perf_counter() - started)
+        print(f"{donations:>10} {built:>8.2f} {statistics.median(timings) * 1000:>10.3f} "
+              f"{timings[int(len(timings) * 0.99)] * 1000:>8.3f} {timings[-1] * 1000:>8.3f} "
+              f"{statistics.median(updates) * 1000:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
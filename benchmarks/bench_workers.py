@@ -0,0 +1,139 @@
+"""
+Compare requests/sec across gunicorn worker models on this machine.
+
+    python benchmarks/bench_workers.py --path /impact/ --concurrency 64 --duration 20
+
+Each configuration is started with gunicorn.conf.py (so preload and warmup are
+included), loaded with keep-alive client threads, then stopped. Point
+DJANGO_SETTINGS_MODULE at the settings you want to measure; the database must
+be migrated (and ideally seeded with `manage.py seed`) first.
+"""
+import argparse
+import http.client
+import importlib.util
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CORES = multiprocessing.cpu_count()
+
+# (name, application, gunicorn arguments, module the worker class needs)
+CONFIGURATIONS = [
+    ('sync', 'nowastemate.wsgi:application', ['-k', 'sync', '-w', str(CORES * 2 + 1)], None),
+    ('gthread-4', 'nowastemate.wsgi:application', ['-k', 'gthread', '-w', str(CORES * 2 + 1), '--threads', '4'], None),
+    ('gthread-16', 'nowastemate.wsgi:application', ['-k', 'gthread', '-w', str(CORES), '--threads', '16'], None),
+    ('uvicorn', 'nowastemate.asgi:application', ['-k', 'uvicorn.workers.UvicornWorker', '-w', str(CORES * 2 + 1)], 'uvicorn.workers'),
+]
+
+
+def importable(module):
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ImportError:  # a missing parent package
+        return False
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def load(port, path, concurrency, duration):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        mine = []
+        failed = 0
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                continue
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors)
+
+
+def run(name, app, args, options, port):
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', str(ROOT / 'gunicorn.conf.py'),
+        '--bind', f'127.0.0.1:{port}', '--access-logfile', '/dev/null', *args, app,
+    ]
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        try:
+            wait_until_up(port)
+        except RuntimeError as error:
+            print(f"{name:<12} skipped: {error}")
+            return
+        load(port, options.path, options.concurrency, 2)  # warm every worker
+        latencies, errors = load(port, options.path, options.concurrency, options.duration)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    latencies.sort()
+    rps = len(latencies) / options.duration
+    p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float('nan')
+    print(f"{name:<12} {rps:>10.1f} {p50:>9.1f} {p99:>9.1f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default='/impact/')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=int, default=15)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--only', nargs='*', help="Run only these configuration names.")
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nowastemate.settings_production')
+    print(f"{CORES} cores, {options.concurrency} clients, GET {options.path} for {options.duration}s")
+    print(f"{'workers':<12} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, app, args, module in CONFIGURATIONS:
+        if options.only and name not in options.only:
+            continue
+        if module and not importable(module):
+            print(f"{name:<12} skipped: {module} cannot be imported")
+            continue
+        run(name, app, args, options, options.port)
+
+
+if __name__ == '__main__':
+    main()
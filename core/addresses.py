@@ -0,0 +1,73 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .lru import LRUCache
+from .models import PickupSite
+
+ABBREVIATIONS = {
+    'rd': 'road', 'st': 'street', 'ave': 'avenue', 'blk': 'block', 'bldg': 'building',
+    'hstl': 'hostel', 'opp': 'opposite', 'nr': 'near', 'flr': 'floor', 'no': 'number',
+    'univ': 'university', 'clg': 'college', 'dept': 'department',
+}
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+_site_ids = LRUCache(maxsize=4096)
+EARTH_RADIUS_KM = 6371.0
+
+
+def normalize_text(raw):
+    # Case, punctuation and spacing only. Search terms stop here: expanding
+    # abbreviations would turn a partial "st" into "street".
+    text = unicodedata.normalize('NFKC', raw or '').casefold()
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', text)).strip()
+
+
+@lru_cache(maxsize=8192)
+def normalize_address(raw):
+    words = [ABBREVIATIONS.get(word, word) for word in normalize_text(raw).split(' ')]
+    return ' '.join(words)[:PickupSite._meta.get_field('normalized_address').max_length]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # Great-circle distance; takes scalars or broadcastable arrays, NaN in -> NaN out.
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def geocode(address):
+    if not settings.GEOCODER:
+        return None
+    return import_string(settings.GEOCODER)(address)
+
+
+def site_for(raw):
+    normalized = normalize_address(raw)
+    if not normalized:
+        return None
+    site_id = _site_ids.get(normalized)
+    if site_id is None:
+        site, _ = PickupSite.objects.get_or_create(normalized_address=normalized, defaults={'address': raw.strip()})
+        site_id = site.id
+        # Only remember ids that survive the surrounding transaction.
+        transaction.on_commit(lambda: _site_ids.set(normalized, site_id))
+    return site_id
+
+
+def site_cache_stats():
+    return _site_ids.stats()
+
+
+def prepare(raw):
+    # Runs in backfill worker processes: pure CPU (plus an optional geocoder
+    # call), no database access.
+    normalized = normalize_address(raw)
+    coordinates = geocode(raw) if normalized else None
+    return raw, normalized, coordinates
@@ -1,12 +1,78 @@
+import json
+
 from django.contrib import admin
-from django.core.mail import send_mail
+from django.core.paginator import Paginator
 from django.conf import settings
-from .models import UserProfile, Donation, ContactMessage, Notification, Review
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+from . import notifications, profiles
+from .models import (
+    UserProfile, Donation, ContactMessage, Notification, Review, PickupSite,
+    WebhookSubscription, WebhookDelivery, WebhookDeadLetter, DonationEvent, EventCursor,
+)
+
+
+def planner_estimate(queryset):
+    # PostgreSQL's row estimate for the query, from table statistics.
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    # An exact COUNT(*) over millions of rows dominates a changelist's load
+    # time. Above ADMIN_EXACT_COUNT_LIMIT rows, show the planner's estimate.
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = planner_estimate(queryset)
+            if estimate >= settings.ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # Changelists for tables that grow without bound: estimated counts, no
+    # second unfiltered count, and a search that stays on indexes. A number
+    # finds that id. Otherwise each ``^field`` in search_fields is matched by
+    # prefix, and ``^relation__field`` as a subquery over the related table's
+    # index. The whole search stays one statement with no join to fan out.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-pk',)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        condition = Q()
+        for field in self.get_search_fields(request):
+            relation, _, column = field.lstrip('^').rpartition('__')
+            if relation:
+                related = queryset.model._meta.get_field(relation).related_model
+                ids = related._default_manager.filter(**{f'{column}__istartswith': term})
+                condition |= Q(**{f'{relation}__in': ids.values('pk')})
+            else:
+                condition |= Q(**{f'{column}__istartswith': term})
+        return queryset.filter(condition), False
+
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'get_email', 'phone_number', 'role', 'is_approved', 'average_rating')
+    list_display = (
+        'user', 'get_email', 'phone_number', 'role', 'is_approved', 'average_rating',
+        'bayesian_rating', 'completion_rate', 'avg_completion_hours',
+    )
     list_filter = ('is_approved', 'role')
+    list_select_related = ('user',)
     actions = ['approve_users']
     search_fields = ('user__username', 'user__email', 'phone_number')
 
@@ -19,50 +85,49 @@ class UserProfileAdmin(admin.ModelAdmin):
             'fields': ('user', 'get_email'), 
         }),
         ('Profile Details', {
-            'fields': ('role', 'phone_number', 'average_rating'),
+            'fields': ('role', 'phone_number', 'average_rating', 'digest_frequency', 'last_digest_at'),
+        }),
+        ('Reputation', {
+            'fields': ('bayesian_rating', 'recent_rating', 'completion_rate', 'avg_completion_hours', 'reputation_updated_at'),
         }),
         ('Authorization Status', {
             'fields': ('is_approved',),
         }),
     )
     
-    readonly_fields = ('user', 'get_email', 'average_rating')
+    readonly_fields = (
+        'user', 'get_email', 'average_rating', 'bayesian_rating', 'recent_rating',
+        'completion_rate', 'avg_completion_hours', 'reputation_updated_at', 'last_digest_at',
+    )
 
     def approve_users(self, request, queryset):
         queryset.update(is_approved=True)
+        # update() skips save signals, so drop the cached approval explicitly.
+        for user_id in queryset.values_list('user_id', flat=True):
+            profiles.invalidate(user_id)
         
-        for profile in queryset:
+        for profile in queryset.select_related('user'):
             user = profile.user
-            
-            Notification.objects.create(
-                user=user,
-                message="Welcome! Your account has been approved.",
-                link="/dashboard/"
+            notifications.notify(
+                user, 'approved', "Welcome! Your account has been approved.",
+                subject="Your NoWasteMate Account is Approved!",
+                body=f"Hi {user.username},\n\nGood news! Your account on NoWasteMate has been approved.",
             )
 
-            if user.email:
-                user_subject = "Your NoWasteMate Account is Approved!"
-                user_message = f"Hi {user.username},\n\nGood news! Your account on NoWasteMate has been approved."
-                send_mail(
-                    subject=user_subject,
-                    message=user_message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[user.email],
-                    fail_silently=True,
-                )
-            
     approve_users.short_description = "Approve selected users"
 
 @admin.register(Donation)
-class DonationAdmin(admin.ModelAdmin):
+class DonationAdmin(LargeTableAdmin):
     list_display = ('food_item', 'donor', 'status', 'category', 'pickup_by')
-    list_filter = ('status', 'category', 'created_at')
-    search_fields = ('food_item', 'donor__username')
+    list_filter = ('status', 'category', 'is_archived', 'created_at')
+    list_select_related = ('donor',)
+    search_fields = ('^food_item', '^donor__username')
+    autocomplete_fields = ('donor', 'claimed_by', 'pickup_site')
 
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
-    list_display = ('name', 'email', 'subject', 'sent_at')
-    readonly_fields = ('name', 'email', 'subject', 'message', 'sent_at')
+    list_display = ('name', 'email', 'subject', 'sent_at', 'digested_at')
+    readonly_fields = ('name', 'email', 'subject', 'message', 'sent_at', 'digested_at')
     actions = ['delete_selected_messages']
 
     def has_add_permission(self, request):
@@ -79,13 +144,79 @@ class ContactMessageAdmin(admin.ModelAdmin):
     delete_selected_messages.short_description = "Delete selected contact messages"
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'message', 'is_read', 'created_at')
-    list_filter = ('is_read', 'created_at')
-    search_fields = ('user__username', 'message')
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ('user', 'message', 'kind', 'count', 'is_read', 'email_pending', 'created_at')
+    list_filter = ('is_read', 'kind', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('^user__username', '^message')
+    autocomplete_fields = ('user',)
     
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ('donation', 'reviewer', 'reviewed_user', 'rating', 'created_at')
     list_filter = ('rating', 'created_at')
-    search_fields = ('donation__food_item', 'reviewer__username', 'reviewed_user__username')
\ No newline at end of file
+    list_select_related = ('donation', 'reviewer', 'reviewed_user')
+    search_fields = ('^donation__food_item', '^reviewer__username', '^reviewed_user__username')
+    autocomplete_fields = ('donation', 'reviewer', 'reviewed_user')
+
+@admin.register(PickupSite)
+class PickupSiteAdmin(admin.ModelAdmin):
+    list_display = ('address', 'normalized_address', 'latitude', 'longitude', 'created_at')
+    search_fields = ('normalized_address',)
+
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'url', 'events', 'is_active', 'created_at')
+    list_filter = ('is_active',)
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(LargeTableAdmin):
+    list_display = ('event', 'subscription', 'attempts', 'next_attempt_at', 'last_error', 'created_at')
+    list_filter = ('event', 'subscription')
+    list_select_related = ('subscription',)
+
+
+@admin.register(WebhookDeadLetter)
+class WebhookDeadLetterAdmin(admin.ModelAdmin):
+    list_display = ('event', 'subscription', 'attempts', 'last_error', 'failed_at')
+    list_filter = ('event', 'subscription')
+    list_select_related = ('subscription',)
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        letters = list(queryset)
+        with transaction.atomic():
+            WebhookDelivery.objects.bulk_create(
+                WebhookDelivery(
+                    id=letter.delivery_id, subscription_id=letter.subscription_id, event=letter.event,
+                    payload=letter.payload, created_at=letter.created_at,
+                )
+                for letter in letters
+            )
+            queryset.delete()
+        self.message_user(request, f"Requeued {len(letters)} deliveries.")
+    requeue.short_description = "Requeue selected deliveries"
+
+
+@admin.register(DonationEvent)
+class DonationEventAdmin(LargeTableAdmin):
+    # The log is append-only; the admin only reads it.
+    list_display = ('id', 'kind', 'donation_id', 'actor_id', 'category', 'occurred_at', 'recorded_at')
+    list_filter = ('kind',)
+    search_fields = ('^donor__username',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(EventCursor)
+class EventCursorAdmin(admin.ModelAdmin):
+    list_display = ('name', 'position', 'updated_at')
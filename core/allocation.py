@@ -0,0 +1,216 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.db.models import Avg, Count
+from django.utils import timezone
+
+from . import addresses, lifecycle, notifications, typeahead
+from .models import Donation, DonationInterest, UserProfile
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy is optional; _assign below is the fallback.
+    linear_sum_assignment = None
+
+# In allocation mode (ALLOCATION_MODE) a new donation stays closed to direct
+# claims for ALLOCATION_WINDOW_MINUTES while NGOs register interest. The
+# allocate_donations command then assigns every closed round at once,
+# maximizing the total score of the pairs it picks. No NGO gets more than
+# its remaining capacity. Donations nobody wanted reopen to first come,
+# first served.
+WEIGHTS = {'base': 0.1, 'proximity': 0.5, 'reliability': 0.4}
+# Stand-in for proximity or completion rate when either side is unknown.
+NEUTRAL = 0.5
+# Cost of a pair nobody registered interest in; scores are at most 1.
+FORBIDDEN = 1e6
+
+
+def round_closes(now=None):
+    """When a donation posted now should be allocated, or None outside allocation mode."""
+    if not settings.ALLOCATION_MODE:
+        return None
+    return (now or timezone.now()) + timedelta(minutes=settings.ALLOCATION_WINDOW_MINUTES)
+
+
+def register_interest(donation, ngo):
+    try:
+        DonationInterest.objects.get_or_create(donation=donation, ngo=ngo)
+    except IntegrityError:
+        pass  # a concurrent request registered the same interest
+
+
+def score_pairs(ngo_location, ngo_reliability, donation_location, ngo_index, donation_index):
+    """
+    Score each interested (NGO, donation) pair. Locations are (n, 2) arrays
+    of latitude/longitude and may be NaN. Reliability is a completion rate in
+    [0, 1] or NaN. Every score is positive.
+    """
+    a, b = ngo_location[ngo_index], donation_location[donation_index]
+    km = addresses.haversine_km(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+    proximity = np.where(np.isnan(km), NEUTRAL, np.exp(-km / settings.ALLOCATION_DISTANCE_SCALE_KM))
+    reliability = ngo_reliability[ngo_index]
+    reliability = np.where(np.isnan(reliability), NEUTRAL, reliability)
+    return WEIGHTS['base'] + WEIGHTS['proximity'] * proximity + WEIGHTS['reliability'] * reliability
+
+
+def _assign(cost):
+    # Shortest augmenting path Hungarian algorithm with row/column potentials
+    # for an n x m matrix, n <= m. The inner loop over columns is vectorized.
+    # Returns the column assigned to each row.
+    n, m = cost.shape
+    u, v = np.zeros(n + 1), np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.intp)  # 1-based row holding each column; 0 = free
+    way = np.zeros(m + 1, dtype=np.intp)
+    for row in range(1, n + 1):
+        owner[0] = row
+        column = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while owner[column]:
+            used[column] = True
+            current = owner[column]
+            free = ~used
+            reduced = cost[current - 1] - u[current] - v[1:]
+            better = free[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = column
+            candidates = np.where(free, minv, np.inf)
+            candidates[0] = np.inf
+            column = int(np.argmin(candidates))
+            delta = candidates[column]
+            u[owner[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+    rows = np.full(n, -1, dtype=np.intp)
+    assigned = np.nonzero(owner[1:])[0]
+    rows[owner[1:][assigned] - 1] = assigned
+    return rows
+
+
+def solve(slots, donations, slot_index, donation_index, scores):
+    """
+    Maximum-score assignment of ``slots`` NGO capacity slots to ``donations``.
+    Only listed (slot, donation, score) pairs are allowed. Returns the
+    matched (slot, donation) pairs.
+    """
+    # Unlisted pairs are forbidden, and every slot gets a private zero-cost
+    # "unmatched" column, so the search only ever walks real interest edges.
+    cost = np.full((slots, donations + slots), FORBIDDEN)
+    cost[slot_index, donation_index] = -scores
+    cost[np.arange(slots), donations + np.arange(slots)] = 0.0
+    if linear_sum_assignment is not None:
+        rows, columns = linear_sum_assignment(cost)
+    else:
+        columns = _assign(cost)
+        rows = np.arange(slots)
+    matched = columns < donations
+    return [(int(slot), int(column)) for slot, column in zip(rows[matched], columns[matched])]
+
+
+def match(ngo_index, donation_index, scores, capacity):
+    """
+    Best allocation for interest pairs (``ngo_index[k]`` wants
+    ``donation_index[k]`` with ``scores[k]``) when NGO i may take up to
+    ``capacity[i]`` donations. Returns matched (ngo, donation) index pairs.
+    """
+    # Only donations someone asked for take part in the solve.
+    wanted, donation_index = np.unique(donation_index, return_inverse=True)
+    # An NGO with capacity c becomes c identical rows, capped at the number
+    # of donations it asked for.
+    capacity = np.minimum(capacity, np.bincount(ngo_index, minlength=len(capacity)))
+    first_slot = np.concatenate(([0], np.cumsum(capacity)))
+    slot_ngo = np.repeat(np.arange(len(capacity)), capacity)
+    copies = capacity[ngo_index]
+    slot_index = np.repeat(first_slot[ngo_index], copies) + _ranges(copies)
+    matches = solve(
+        len(slot_ngo), len(wanted), slot_index, np.repeat(donation_index, copies), np.repeat(scores, copies)
+    )
+    return [(int(slot_ngo[slot]), int(wanted[column])) for slot, column in matches]
+
+
+def _ngo_state(ngo_ids):
+    # Location: mean coordinates of the pickup sites the NGO has collected from.
+    location = np.full((len(ngo_ids), 2), np.nan)
+    row = {ngo_id: i for i, ngo_id in enumerate(ngo_ids)}
+    history = (
+        Donation.objects.filter(claimed_by__in=ngo_ids, pickup_site__latitude__isnull=False)
+        .values('claimed_by')
+        .annotate(lat=Avg('pickup_site__latitude'), lon=Avg('pickup_site__longitude'))
+    )
+    for item in history:
+        location[row[item['claimed_by']]] = (item['lat'], item['lon'])
+    rates = dict(UserProfile.objects.filter(user_id__in=ngo_ids).values_list('user_id', 'completion_rate'))
+    reliability = np.array([np.nan if rates.get(n) is None else rates[n] for n in ngo_ids])
+    open_claims = dict(
+        Donation.objects.hot().filter(claimed_by__in=ngo_ids, status='claimed')
+        .values('claimed_by').annotate(n=Count('id')).values_list('claimed_by', 'n')
+    )
+    capacity = np.array([max(0, settings.ALLOCATION_NGO_CAPACITY - open_claims.get(n, 0)) for n in ngo_ids])
+    return location, reliability, capacity
+
+
+def _ranges(counts):
+    # concatenate([arange(c) for c in counts]) without the Python loop.
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=np.intp)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(total) - starts
+
+
+def allocate(now=None):
+    """Allocate every donation whose interest window has closed. Returns (allocated, reopened)."""
+    now = now or timezone.now()
+    due = list(
+        Donation.objects.hot()
+        .filter(status='available', allocate_after__lte=now)
+        .values_list('id', 'pickup_site__latitude', 'pickup_site__longitude')
+    )
+    if not due:
+        return 0, 0
+    donation_ids = [d[0] for d in due]
+    interests = list(
+        DonationInterest.objects.filter(donation_id__in=donation_ids, donation__pickup_by__gt=now)
+        .values_list('ngo_id', 'donation_id')
+    )
+    pairs = []
+    if interests:
+        ngo_ids = sorted({ngo_id for ngo_id, _ in interests})
+        ngo_row = {ngo_id: i for i, ngo_id in enumerate(ngo_ids)}
+        donation_column = {donation_id: j for j, donation_id in enumerate(donation_ids)}
+        ngo_index = np.array([ngo_row[n] for n, _ in interests], dtype=np.intp)
+        donation_index = np.array([donation_column[d] for _, d in interests], dtype=np.intp)
+        location, reliability, capacity = _ngo_state(ngo_ids)
+        donation_location = np.array([(d[1], d[2]) for d in due], dtype=float)
+        scores = score_pairs(location, reliability, donation_location, ngo_index, donation_index)
+        matches = match(ngo_index, donation_index, scores, capacity)
+        pairs = [(ngo_ids[ngo], donation_ids[column]) for ngo, column in matches]
+
+    ngos = User.objects.in_bulk({ngo_id for ngo_id, _ in pairs})
+    allocated = 0
+    for ngo_id, donation_id in pairs:
+        try:
+            donation = lifecycle.claim(donation_id, ngos[ngo_id], allocated=True)
+        except lifecycle.TransitionConflict:
+            continue  # withdrawn or expired since the round was read
+        allocated += 1
+        typeahead.note_unavailable(donation.id)
+        notifications.notify(
+            donation.donor, 'claimed',
+            f"Your donation '{donation.food_item}' was allocated to {donation.claimed_by.username}.",
+        )
+        notifications.notify(
+            donation.claimed_by, 'allocated',
+            f"You have been allocated '{donation.food_item}'. Please arrange pickup.",
+        )
+    reopened = Donation.objects.filter(id__in=donation_ids, status='available').update(allocate_after=None)
+    DonationInterest.objects.filter(donation_id__in=donation_ids).delete()
+    return allocated, reopened
+
@@ -1,11 +1,15 @@
-from .models import Notification
+from . import profiles
+from .models import Notification, UserProfile
 
 def unread_notifications(request):
     if request.user.is_authenticated:
         unread_count = request.user.notifications.filter(is_read=False).count()
         latest_notifications = request.user.notifications.order_by('-created_at')[:5]
+        info = profiles.lookup(request.user)
         return {
             'unread_notification_count': unread_count,
-            'latest_notifications': latest_notifications
+            'latest_notifications': latest_notifications,
+            'digest_frequency': info.digest_frequency if info else None,
+            'digest_choices': UserProfile.DIGEST_CHOICES,
         }
     return {}
\ No newline at end of file
@@ -0,0 +1,15 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def increment(model, field='count', amount=1, **lookup):
+    # Conditional UPDATE first, INSERT only for a brand-new counter row; relies
+    # on a unique constraint over ``lookup`` to settle concurrent creators.
+    rows = model.objects.filter(**lookup)
+    if rows.update(**{field: F(field) + amount}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{field: amount})
+    except IntegrityError:
+        rows.update(**{field: F(field) + amount})
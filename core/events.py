@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import leaderboard, timeseries
+from .models import Donation, DonationEvent, EventCursor
+
+# The donation event log. core.lifecycle and the post view append a
+# DonationEvent in the same transaction as each change. Consumers tail the
+# log by id: read() returns the events after a position, and consume() moves
+# a named EventCursor along with the consumer's own writes. Ids are handed
+# out when a row is inserted but become visible when its transaction
+# commits, so a later id can show up first. Readers therefore stop short of
+# events younger than DONATION_EVENT_SETTLE_SECONDS. recorded_at is stamped
+# at insert, not at commit, so writers record the event as the last write of
+# their transaction (after the post view's photo upload, for instance); the
+# settle window then only has to cover the commit itself. A reader that
+# cannot afford to miss an event in a stalled commit should also re-read the
+# settle window behind its cursor and skip ids it has already seen.
+
+
+class IncompleteLog(Exception):
+    def __init__(self, missing):
+        super().__init__(f"{missing} completed donations have no 'completed' event; backfill the log first.")
+        self.missing = missing
+
+
+def record(kind, donation, actor=None, when=None, **data):
+    return DonationEvent.objects.create(
+        donation_id=donation.id, kind=kind, actor=actor, donor_id=donation.donor_id,
+        category=donation.category, occurred_at=when or timezone.now(), data=data,
+    )
+
+
+def read(after=0, limit=500, now=None):
+    """Settled events with ids above ``after``, oldest first."""
+    settled = (now or timezone.now()) - timedelta(seconds=settings.DONATION_EVENT_SETTLE_SECONDS)
+    return list(DonationEvent.objects.filter(id__gt=after, recorded_at__lte=settled).order_by('id')[:limit])
+
+
+def serialize(event):
+    return {
+        'id': event.id, 'kind': event.kind, 'donation': event.donation_id, 'actor': event.actor_id,
+        'donor': event.donor_id, 'category': event.category, 'occurred_at': event.occurred_at.isoformat(),
+        'data': event.data,
+    }
+
+
+def consume(name, handler, batch_size=500):
+    """
+    Pass every unread event to ``handler`` in batches, oldest first. Each
+    batch runs in one transaction with the cursor update, so a handler that
+    writes to the database sees each event exactly once, and a failed batch
+    is retried on the next call. Returns the number of events handled.
+    """
+    EventCursor.objects.get_or_create(name=name)
+    handled = 0
+    while True:
+        with transaction.atomic():
+            cursor = EventCursor.objects.select_for_update().get(name=name)
+            batch = read(cursor.position, batch_size)
+            if not batch:
+                return handled
+            handler(batch)
+            cursor.position = batch[-1].id
+            cursor.save(update_fields=['position', 'updated_at'])
+        handled += len(batch)
+
+
+def backfill(batch_size=5000):
+    """
+    Add the events of changes made before the log existed, dated from the
+    donations' own timestamps and marked ``backfilled``. Safe to re-run.
+    Returns the number of events added.
+    """
+    stamps = {'posted': 'created_at', 'claimed': 'claimed_at', 'completed': 'completed_at'}
+    actors = {'posted': 'donor_id', 'claimed': 'claimed_by_id', 'completed': 'donor_id'}
+    added = 0
+    for kind, stamp in stamps.items():
+        missing = (
+            Donation.objects.filter(**{f'{stamp}__isnull': False})
+            .exclude(events__kind=kind).order_by('id')
+            .values_list('id', 'donor_id', 'category', actors[kind], stamp)
+        )
+        last = 0
+        while True:
+            rows = list(missing.filter(id__gt=last)[:batch_size])
+            if not rows:
+                break
+            DonationEvent.objects.bulk_create(
+                DonationEvent(
+                    donation_id=donation_id, kind=kind, actor_id=actor_id, donor_id=donor_id,
+                    category=category, occurred_at=occurred_at, data={'backfilled': True},
+                )
+                for donation_id, donor_id, category, actor_id, occurred_at in rows
+            )
+            added += len(rows)
+            last = rows[-1][0]
+    return added
+
+
+def unlogged_completions():
+    return Donation.objects.filter(completed_at__isnull=False).exclude(events__kind='completed')
+
+
+def replay(batch_size=5000):
+    """
+    Rebuild the impact buckets and leaderboards from completion events.
+    Returns (buckets, entries). Raises IncompleteLog, changing nothing, while
+    completions from before the log are missing from it: the rebuild would
+    drop them from the history.
+    """
+    missing = unlogged_completions().count()
+    if missing:
+        raise IncompleteLog(missing)
+    completed = DonationEvent.objects.filter(kind='completed')
+    buckets = timeseries.rebuild(batch_size, completed, when='occurred_at')
+    entries = leaderboard.rebuild(batch_size, completed, when='occurred_at')
+    return buckets, entries
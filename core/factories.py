@@ -0,0 +1,186 @@
+import random
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from queue import Queue
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import Avg
+from django.utils import timezone
+
+from .addresses import normalize_address
+from .models import UserProfile, Donation, Review, Notification, PickupSite
+
+DEFAULT_PASSWORD = 'seedpass123'
+
+FOOD_ITEMS = {
+    'cooked': ['Veg Biryani', 'Dal Rice', 'Rajma Chawal', 'Chole', 'Mixed Veg Curry', 'Khichdi'],
+    'packaged': ['Biscuit Packets', 'Instant Noodles', 'Juice Boxes', 'Packaged Snacks'],
+    'bakery': ['Bread Loaves', 'Buns', 'Muffins', 'Rusk', 'Cake Slices'],
+    'produce': ['Bananas', 'Apples', 'Tomatoes', 'Potatoes', 'Leafy Greens'],
+    'other': ['Milk Packets', 'Curd', 'Sweets'],
+}
+LOCATIONS = [
+    'Hostel A Mess Hall', 'Hostel B Mess Hall', 'Main Canteen', 'Library Cafe',
+    'Sports Complex Canteen', 'Faculty Club', 'Night Canteen', 'Central Kitchen',
+]
+COMMENTS = ['Great coordination!', 'Food was fresh.', 'Pickup was on time.', 'Smooth handover.', None]
+
+
+def _prefetch(batches, depth=2):
+    # Builds the next batch on a worker thread while the caller is blocked on
+    # the database inserting the previous one.
+    queue = Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        try:
+            for batch in batches:
+                queue.put(batch)
+        except Exception as exc:
+            queue.put(exc)
+        queue.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (batch := queue.get()) is not done:
+        if isinstance(batch, Exception):
+            raise batch
+        yield batch
+
+
+@contextmanager
+def _manual_timestamps(*fields):
+    # auto_now_add would stamp every seeded row with the same instant.
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Seeder:
+    def __init__(self, seed=0, batch_size=5000, prefix='seed', days=365, password=DEFAULT_PASSWORD):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.now = timezone.now()
+        self.days = days
+        # PBKDF2 is deliberately slow; hash once and share it across every seeded user.
+        self.password_hash = make_password(password)
+
+    def _batches(self, total, build):
+        for start in range(0, total, self.batch_size):
+            yield [build(i) for i in range(start, min(start + self.batch_size, total))]
+
+    def _past(self, days=None):
+        return self.now - timedelta(seconds=self.rng.randrange(int((days or self.days) * 86400)))
+
+    def users(self, count, role):
+        def build(i):
+            username = f'{self.prefix}-{role}-{i}'
+            return User(username=username, email=f'{username}@example.com', password=self.password_hash)
+
+        ids = []
+        for batch in _prefetch(self._batches(count, build)):
+            users = User.objects.bulk_create(batch)
+            UserProfile.objects.bulk_create([
+                UserProfile(user=user, role=role, phone_number=f'{self.rng.randrange(10**9, 10**10)}', is_approved=True)
+                for user in users
+            ])
+            ids.extend(user.id for user in users)
+        return ids
+
+    def pickup_sites(self):
+        sites = [PickupSite(normalized_address=normalize_address(raw), address=raw) for raw in LOCATIONS]
+        PickupSite.objects.bulk_create(sites, ignore_conflicts=True)
+        return dict(PickupSite.objects.filter(
+            normalized_address__in=[site.normalized_address for site in sites]
+        ).values_list('normalized_address', 'id'))
+
+    def donations(self, count, donor_ids, ngo_ids):
+        site_ids = self.pickup_sites()
+
+        def build(i):
+            category = self.rng.choice(Donation.CATEGORY_CHOICES)[0]
+            created_at = self._past()
+            status = self.rng.choices(['available', 'claimed', 'completed'], weights=[1, 1, 8])[0]
+            location = self.rng.choice(LOCATIONS)
+            claimed_at = None if status == 'available' else created_at + timedelta(minutes=self.rng.randint(5, 360))
+            return Donation(
+                donor_id=self.rng.choice(donor_ids),
+                claimed_by_id=None if status == 'available' else self.rng.choice(ngo_ids),
+                food_item=self.rng.choice(FOOD_ITEMS[category]),
+                category=category,
+                quantity=f'{self.rng.randint(1, 50)} kg',
+                pickup_location=location,
+                pickup_site_id=site_ids[normalize_address(location)],
+                pickup_by=created_at + timedelta(hours=self.rng.randint(2, 48)),
+                created_at=created_at,
+                claimed_at=claimed_at,
+                completed_at=claimed_at + timedelta(hours=self.rng.randint(1, 24)) if status == 'completed' else None,
+                status=status,
+            )
+
+        completed = []
+        with _manual_timestamps(Donation._meta.get_field('created_at')):
+            for batch in _prefetch(self._batches(count, build)):
+                for donation in Donation.objects.bulk_create(batch):
+                    if donation.status == 'completed':
+                        completed.append((donation.id, donation.donor_id, donation.claimed_by_id, donation.created_at))
+        return completed
+
+    def reviews(self, completed, review_rate=0.6):
+        def build_all():
+            batch = []
+            for donation_id, donor_id, ngo_id, created_at in completed:
+                for reviewer, reviewed in ((donor_id, ngo_id), (ngo_id, donor_id)):
+                    if self.rng.random() < review_rate:
+                        batch.append(Review(
+                            donation_id=donation_id, reviewer_id=reviewer, reviewed_user_id=reviewed,
+                            rating=self.rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 6, 8])[0],
+                            comment=self.rng.choice(COMMENTS),
+                            created_at=created_at + timedelta(days=1),
+                        ))
+                        if len(batch) == self.batch_size:
+                            yield batch
+                            batch = []
+            if batch:
+                yield batch
+
+        created = 0
+        with _manual_timestamps(Review._meta.get_field('created_at')):
+            for batch in _prefetch(build_all()):
+                created += len(Review.objects.bulk_create(batch))
+        return created
+
+    def notifications(self, count, user_ids):
+        def build(i):
+            return Notification(
+                user_id=self.rng.choice(user_ids),
+                message=self.rng.choice([
+                    'Your donation was claimed.', 'A donation you claimed is complete. Please leave a review!',
+                    'You received a new review.',
+                ]),
+                link='/dashboard/',
+                is_read=self.rng.random() < 0.7,
+                created_at=self._past(30),
+            )
+
+        created = 0
+        with _manual_timestamps(Notification._meta.get_field('created_at')):
+            for batch in _prefetch(self._batches(count, build)):
+                created += len(Notification.objects.bulk_create(batch))
+        return created
+
+    def refresh_ratings(self):
+        ratings = dict(
+            Review.objects.filter(reviewed_user__username__startswith=f'{self.prefix}-')
+            .values('reviewed_user').annotate(avg=Avg('rating')).values_list('reviewed_user', 'avg')
+        )
+        profiles = list(UserProfile.objects.filter(user__username__startswith=f'{self.prefix}-').only('id', 'user_id'))
+        for profile in profiles:
+            profile.average_rating = ratings.get(profile.user_id, 0.0)
+        UserProfile.objects.bulk_update(profiles, ['average_rating'], batch_size=self.batch_size)
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .counters import increment
+from .models import Donation, LeaderboardEntry
+
+ALL_TIME = 'all'
+
+
+def month_board(when):
+    return f'month:{timezone.localtime(when):%Y-%m}'
+
+
+def category_board(category):
+    return f'category:{category}'
+
+
+def boards_for(donation):
+    return [ALL_TIME, month_board(donation.completed_at), category_board(donation.category)]
+
+
+def record_completion(donation):
+    for board in boards_for(donation):
+        increment(LeaderboardEntry, board=board, user_id=donation.donor_id)
+
+
+def top(board=ALL_TIME, k=5):
+    return list(
+        LeaderboardEntry.objects.filter(board=board, count__gt=0)
+        .select_related('user').order_by('-count', 'user_id')[:k]
+    )
+
+
+def total_completed():
+    # One counter row per donor, so this stays cheap however many donations are archived.
+    return LeaderboardEntry.objects.filter(board=ALL_TIME).aggregate(total=Sum('count'))['total'] or 0
+
+
+def rebuild(batch_size=5000, completed=None, when='completed_at'):
+    # Rows need ``donor`` and ``category``; see timeseries.rebuild for the arguments.
+    if completed is None:
+        completed = Donation.objects.filter(status='completed', completed_at__isnull=False)
+    completed = completed.order_by()
+    entries = [
+        LeaderboardEntry(board=ALL_TIME, user_id=row['donor'], count=row['n'])
+        for row in completed.values('donor').annotate(n=Count('id'))
+    ]
+    entries += [
+        LeaderboardEntry(board=month_board(row['month']), user_id=row['donor'], count=row['n'])
+        for row in completed.annotate(month=TruncMonth(when)).values('donor', 'month').annotate(n=Count('id'))
+    ]
+    entries += [
+        LeaderboardEntry(board=category_board(row['category']), user_id=row['donor'], count=row['n'])
+        for row in completed.values('donor', 'category').annotate(n=Count('id'))
+    ]
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=batch_size)
+    return len(entries)
@@ -0,0 +1,72 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import events, leaderboard, timeseries, webhooks
+from .models import Donation, IdempotencyKey
+
+# Donation lifecycle: action -> (required current status, new status). Each
+# move is logged as a DonationEvent named after the new status, and queued
+# for partner webhooks as donation.<new status>, in the same transaction.
+TRANSITIONS = {
+    'claim': ('available', 'claimed'),
+    'complete': ('claimed', 'completed'),
+}
+
+
+class TransitionConflict(Exception):
+    # The donation was not in the state the action requires, usually because
+    # another request got there first. ``current`` is the fresh row (or None).
+    def __init__(self, action, current):
+        super().__init__(f"Cannot {action} donation in its current state.")
+        self.action = action
+        self.current = current
+
+
+def _transition(action, rows, condition=Q(), actor=None, event_data=None, **changes):
+    source, target = TRANSITIONS[action]
+    # A single conditional UPDATE is the check and the act: exactly one of any
+    # number of concurrent requests can move the row out of ``source``.
+    with transaction.atomic():
+        if not rows.filter(condition, status=source).update(status=target, **changes):
+            raise TransitionConflict(action, rows.select_related('donor', 'claimed_by').first())
+        donation = rows.select_related('donor', 'claimed_by').get()
+        webhooks.emit(f'donation.{target}', donation)
+        if action == 'complete':
+            timeseries.record_completion(donation.completed_at)
+            leaderboard.record_completion(donation)
+        events.record(target, donation, actor=actor, when=getattr(donation, f'{target}_at'), **(event_data or {}))
+    return donation
+
+
+def claim(donation_id, ngo, allocated=False):
+    # A donation in an open allocation round (core.allocation) can only be
+    # claimed by the allocator; the conflict's ``current.allocate_after`` says so.
+    return _transition(
+        'claim', Donation.objects.hot().filter(id=donation_id),
+        Q(allocate_after__isnull=not allocated), actor=ngo, event_data={'allocated': True} if allocated else None,
+        claimed_by=ngo, claimed_at=timezone.now(), allocate_after=None,
+    )
+
+
+def complete(donation_id, donor):
+    return _transition(
+        'complete', Donation.objects.filter(id=donation_id, donor=donor), actor=donor, completed_at=timezone.now()
+    )
+
+
+def use_idempotency_key(request):
+    """
+    Record the form's idempotency key; False means this exact submission was
+    already processed. Call inside the transaction doing the work so a failed
+    attempt does not burn the key.
+    """
+    key = request.POST.get('idempotency_key')
+    if not key:
+        return True
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(key=key[:64], user=request.user)
+    except IntegrityError:
+        return False
+    return True
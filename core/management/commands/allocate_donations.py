@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core import allocation
+
+
+class Command(BaseCommand):
+    help = "Assign every donation whose interest window has closed to the best-scoring interested NGO."
+
+    def handle(self, *args, **options):
+        allocated, reopened = allocation.allocate()
+        self.stdout.write(self.style.SUCCESS(
+            f"Allocated {allocated} donations; {reopened} reopened to first come, first served."
+        ))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Donation
+
+
+class Command(BaseCommand):
+    help = "Move completed donations older than N days out of the hot set."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.DONATION_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        candidates = Donation.objects.hot().filter(status='completed', completed_at__lt=cutoff)
+
+        # Short batches keep each UPDATE's row locks brief on a live table.
+        archived = 0
+        while True:
+            ids = list(candidates.order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            archived += Donation.objects.filter(id__in=ids).update(is_archived=True)
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} donations completed before {cutoff:%Y-%m-%d}."))
@@ -0,0 +1,54 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import addresses
+from core.models import Donation, PickupSite
+
+
+class Command(BaseCommand):
+    help = "Normalize historical pickup_location values into PickupSite rows and link donations to them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = Donation.objects.filter(pickup_site__isnull=True)
+        raws = list(pending.values_list('pickup_location', flat=True).distinct())
+        self.stdout.write(f"{len(raws)} distinct addresses to normalize.")
+
+        # Forked workers must not share the parent's database socket.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            prepared = list(pool.map(addresses.prepare, raws, chunksize=256))
+
+        sites = {}
+        for raw, normalized, coordinates in prepared:
+            if normalized and normalized not in sites:
+                latitude, longitude = coordinates or (None, None)
+                sites[normalized] = PickupSite(normalized_address=normalized, address=raw.strip(), latitude=latitude, longitude=longitude)
+        PickupSite.objects.bulk_create(sites.values(), batch_size=batch_size, ignore_conflicts=True)
+
+        site_ids = {}
+        keys = list(sites)
+        for start in range(0, len(keys), batch_size):
+            chunk = keys[start:start + batch_size]
+            site_ids.update(PickupSite.objects.filter(normalized_address__in=chunk).values_list('normalized_address', 'id'))
+        site_for_raw = {raw: site_ids[normalized] for raw, normalized, _ in prepared if normalized}
+
+        # One keyset-paginated pass over the table instead of an UPDATE per address.
+        linked, last_id = 0, 0
+        while True:
+            rows = list(pending.filter(id__gt=last_id).order_by('id').values_list('id', 'pickup_location')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = [Donation(id=pk, pickup_site_id=site_for_raw[raw]) for pk, raw in rows if raw in site_for_raw]
+            linked += Donation.objects.bulk_update(updates, ['pickup_site'])
+
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} donations to {len(site_ids)} pickup sites."))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import webhooks
+
+
+class Command(BaseCommand):
+    help = "Deliver queued partner webhooks, retrying failures with backoff. Runs until stopped unless --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Make a single pass and exit.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when nothing is due.")
+        parser.add_argument('--limit', type=int, default=1000, help="Most deliveries leased per pass.")
+
+    def handle(self, *args, **options):
+        # One pool for the life of the worker, so connections to each partner stay open between passes.
+        pool = webhooks.ConnectionPool(settings.WEBHOOK_TIMEOUT_SECONDS)
+        try:
+            while True:
+                delivered, dead, leased = webhooks.deliver_due(pool, limit=options['limit'])
+                if leased:
+                    self.stdout.write(f"Delivered {delivered}, dead-lettered {dead}, of {leased} leased.")
+                if options['once']:
+                    break
+                if leased < options['limit']:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.close()
@@ -0,0 +1,69 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from core import leaderboard
+from core.models import Donation, ImpactBucket, LeaderboardEntry, Notification, UserProfile
+
+# Plan lines that mean a whole table was read: PostgreSQL "Seq Scan on x",
+# SQLite "SCAN x" without an index.
+FULL_SCAN = re.compile(r'Seq Scan on (\w+)|\bSCAN (\w+)(?!.*\bUSING\b.*\bINDEX\b)')
+
+
+def hot_queries(donor, ngo):
+    """The query shapes behind the busiest pages, as (name, queryset)."""
+    now = timezone.now()
+    feed = Donation.objects.hot().filter(status='available')
+    history = Donation.objects.filter(claimed_by=ngo).order_by()
+    return [
+        ('feed', feed.order_by('-created_at')),
+        ('feed by category', feed.filter(category='cooked').order_by('-created_at')),
+        ('recommendation candidates', feed.filter(pickup_by__gt=now).values_list('id', 'category', 'donor_id')),
+        ('ngo category history', history.values('category').annotate(n=Count('id'))),
+        ('ngo donor history', history.values('donor').annotate(n=Count('id'))),
+        ('donor dashboard', Donation.objects.hot().filter(donor=donor).order_by('-created_at')),
+        ('ngo dashboard', Donation.objects.hot().filter(claimed_by=ngo).order_by('-created_at')),
+        ('completed count', LeaderboardEntry.objects.filter(board=leaderboard.ALL_TIME).values('count')),
+        ('approved users', UserProfile.objects.filter(role='donor', is_approved=True).values('id')),
+        ('unread count', Notification.objects.filter(user=donor, is_read=False).values('id')),
+        ('latest notifications', Notification.objects.filter(user=donor).order_by('-created_at')[:5]),
+        ('leaderboard', LeaderboardEntry.objects.filter(board=leaderboard.ALL_TIME).order_by('-count')[:5]),
+        ('impact series', ImpactBucket.objects.filter(resolution='day', start__gte=now)),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot query shapes and flag any that fall back to a full table scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every plan, not just flagged ones.")
+        parser.add_argument('--fail-on-scan', action='store_true', help="Exit non-zero if any query scans a table.")
+
+    def handle(self, *args, **options):
+        donor = User.objects.filter(userprofile__role='donor').first()
+        ngo = User.objects.filter(userprofile__role='ngo').first()
+        if donor is None or ngo is None:
+            raise CommandError("Needs at least one donor and one NGO; run `manage.py seed` first.")
+
+        queries = hot_queries(donor, ngo)
+        flagged = []
+        for name, queryset in queries:
+            plan = queryset.explain()
+            scans = sorted({table for match in FULL_SCAN.finditer(plan) for table in match.groups() if table})
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"{name}: full scan of {', '.join(scans)}"))
+            else:
+                self.stdout.write(f"{name}: ok")
+            if scans or options['verbose_plans']:
+                self.stdout.write(plan)
+
+        # PostgreSQL prefers sequential scans on small tables, so judge plans on
+        # realistically sized data.
+        self.stdout.write(f"{len(flagged)} of {len(queries)} queries scan a table ({connection.vendor}).")
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f"Full table scans in: {', '.join(flagged)}")
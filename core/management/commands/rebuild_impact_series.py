@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import timeseries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly, daily and monthly impact buckets from completed donations."
+
+    def handle(self, *args, **options):
+        count = timeseries.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} impact buckets."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Rebuild the all-time, monthly and per-category donor leaderboards from completed donations."
+
+    def handle(self, *args, **options):
+        count = leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} leaderboard entries."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import matching
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the cached top-K recommended donations for every approved NGO. "
+        "Only useful with a cache backend shared between processes."
+    )
+
+    def handle(self, *args, **options):
+        results = matching.refresh_all()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed recommendations for {len(results)} NGOs."))
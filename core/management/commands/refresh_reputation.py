@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import reputation
+
+
+class Command(BaseCommand):
+    help = "Recompute completion rate, completion latency and smoothed ratings for every user in one vectorized pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = reputation.refresh(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Refreshed reputation for {count} profiles in {elapsed:.1f}s."))
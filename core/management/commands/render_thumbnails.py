@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import photos
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails for donation photos that have none."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Render at most this many donations.")
+
+    def handle(self, *args, **options):
+        if not photos.FORMATS:
+            raise CommandError("This Pillow build cannot encode AVIF or WebP.")
+        ids = list(photos.missing_thumbnails()[:options['limit']])
+        failed = 0
+        for donation_id in ids:
+            try:
+                photos.make_thumbnails(donation_id)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"Donation {donation_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Rendered thumbnails for {len(ids) - failed} of {len(ids)} donations."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import events
+
+
+class Command(BaseCommand):
+    help = "Rebuild the impact buckets and donor leaderboards from the donation event log."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help="First log events for changes made before the log existed, from the donations' timestamps.",
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            added = events.backfill(options['batch_size'])
+            self.stdout.write(f"Backfilled {added} events.")
+        try:
+            buckets, entries = events.replay(options['batch_size'])
+        except events.IncompleteLog as exc:
+            raise CommandError(f"{exc} Run with --backfill.")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} impact buckets and {entries} leaderboard entries."))
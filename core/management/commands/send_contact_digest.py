@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ContactMessage
+
+
+class Command(BaseCommand):
+    help = "Email admins one digest of all contact messages received since the last digest."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help="Most messages to include in one digest.")
+
+    def handle(self, *args, **options):
+        pending = list(
+            ContactMessage.objects.filter(digested_at__isnull=True)
+            .order_by('sent_at')
+            .values('id', 'name', 'email', 'subject', 'message', 'sent_at')[:options['limit']]
+        )
+        if not pending:
+            self.stdout.write("No new contact messages.")
+            return
+
+        sections = [
+            f"[{timezone.localtime(m['sent_at']):%d %b %H:%M}] {m['name']} <{m['email']}>\n"
+            f"Subject: {m['subject']}\n\n{m['message']}"
+            for m in pending
+        ]
+        send_mail(
+            subject=f"NoWasteMate: {len(pending)} new contact message{'s' if len(pending) != 1 else ''}",
+            message=f"\n\n{'-' * 60}\n\n".join(sections),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=settings.CONTACT_DIGEST_RECIPIENTS,
+        )
+        ContactMessage.objects.filter(id__in=[m['id'] for m in pending]).update(digested_at=timezone.now())
+        self.stdout.write(self.style.SUCCESS(f"Sent a digest of {len(pending)} messages."))
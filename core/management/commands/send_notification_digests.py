@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import notifications
+
+
+class Command(BaseCommand):
+    help = "Email each user whose digest is due one summary of their pending notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Emails sent per SMTP connection batch.")
+
+    def handle(self, *args, **options):
+        users, count = notifications.send_digests(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {users} digests covering {count} notifications."))
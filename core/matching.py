@@ -0,0 +1,229 @@
+import bisect
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Avg, Count
+from django.utils import timezone
+
+from .addresses import haversine_km
+from .models import Donation, PickupSite, UserProfile
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 12
+CACHE_TIMEOUT = 15 * 60
+BATCH_SIZE = 256
+
+# Relative weight of each signal in a donation's score for an NGO. The
+# distance term decays with the great-circle distance from the centre of the
+# pickup sites the NGO has claimed from to the donation's site. Where either
+# end has no coordinates it falls back to the share of the NGO's past claims
+# that came from the same donor.
+WEIGHTS = {'category': 0.4, 'distance': 0.25, 'urgency': 0.2, 'rating': 0.15}
+URGENCY_HOURS = 12.0
+DISTANCE_KM = 5.0
+
+CATEGORIES = [key for key, _ in Donation.CATEGORY_CHOICES]
+CATEGORY_INDEX = {key: i for i, key in enumerate(CATEGORIES)}
+REGISTRY_KEY = 'matching:ngos'
+LOCK_KEY = 'matching:lock'
+LOCK_SECONDS = 5
+
+
+def _top_key(ngo_id):
+    return f'matching:top:{ngo_id}'
+
+
+def _pref_key(ngo_id):
+    return f'matching:pref:v2:{ngo_id}'
+
+
+@contextmanager
+def _locked():
+    # Serializes read-modify-writes of the registry and top lists. cache.add
+    # is atomic, so this holds across processes sharing the cache; a holder
+    # that dies only blocks others for LOCK_SECONDS. Yields whether the lock
+    # was taken; callers skip their update when it was not.
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_SECONDS
+    acquired = cache.add(LOCK_KEY, token, LOCK_SECONDS)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.01)
+        acquired = cache.add(LOCK_KEY, token, LOCK_SECONDS)
+    if not acquired:
+        logger.warning("Timed out waiting for the matching lock")
+    try:
+        yield acquired
+    finally:
+        # Leave alone a lock that expired under us and was taken by another process.
+        if acquired and cache.get(LOCK_KEY) == token:
+            cache.delete(LOCK_KEY)
+
+
+class Candidates:
+    def __init__(self, rows, now):
+        rows = list(rows)
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.category = np.array([CATEGORY_INDEX.get(r[1], CATEGORY_INDEX['other']) for r in rows], dtype=np.intp)
+        hours_left = np.array([(r[2] - now).total_seconds() / 3600 for r in rows], dtype=float)
+        self.urgency = np.exp(-np.clip(hours_left, 0, None) / URGENCY_HOURS)
+        self.rating = np.array([r[4] or 0.0 for r in rows], dtype=float) / 5
+        self.latitude = np.array([np.nan if r[5] is None else r[5] for r in rows], dtype=float)
+        self.longitude = np.array([np.nan if r[6] is None else r[6] for r in rows], dtype=float)
+        self.by_donor = {}
+        for column, row in enumerate(rows):
+            self.by_donor.setdefault(row[3], []).append(column)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def available_candidates():
+    now = timezone.now()
+    rows = Donation.objects.hot().filter(status='available', pickup_by__gt=now).values_list(
+        'id', 'category', 'pickup_by', 'donor_id', 'donor__userprofile__average_rating',
+        'pickup_site__latitude', 'pickup_site__longitude',
+    )
+    return Candidates(rows, now)
+
+
+def load_preferences(ngo_ids):
+    row = {ngo_id: i for i, ngo_id in enumerate(ngo_ids)}
+    # Start every category at one claim so NGOs without history get a flat prior.
+    categories = np.ones((len(ngo_ids), len(CATEGORIES)))
+    history = Donation.objects.filter(claimed_by__in=ngo_ids)
+    for item in history.values('claimed_by', 'category').annotate(n=Count('id')):
+        categories[row[item['claimed_by']], CATEGORY_INDEX.get(item['category'], CATEGORY_INDEX['other'])] += item['n']
+    categories /= categories.max(axis=1, keepdims=True)
+
+    donors = [{} for _ in ngo_ids]
+    for item in history.values('claimed_by', 'donor').annotate(n=Count('id')):
+        donors[row[item['claimed_by']]][item['donor']] = item['n']
+    for shares in donors:
+        total = sum(shares.values())
+        for donor_id in shares:
+            shares[donor_id] /= total
+
+    # Sites are a few km apart at most, so a plain mean of the coordinates is close enough.
+    origins = np.full((len(ngo_ids), 2), np.nan)
+    centres = history.filter(pickup_site__latitude__isnull=False, pickup_site__longitude__isnull=False)
+    for item in centres.values('claimed_by').annotate(lat=Avg('pickup_site__latitude'), lon=Avg('pickup_site__longitude')):
+        origins[row[item['claimed_by']]] = (item['lat'], item['lon'])
+    return categories, donors, origins
+
+
+def score_matrix(categories, donors, origins, candidates):
+    scores = WEIGHTS['category'] * categories[:, candidates.category]
+    scores += WEIGHTS['urgency'] * candidates.urgency + WEIGHTS['rating'] * candidates.rating
+    affinity = np.zeros_like(scores)
+    for i, shares in enumerate(donors):
+        for donor_id, share in shares.items():
+            columns = candidates.by_donor.get(donor_id)
+            if columns:
+                affinity[i, columns] = share
+    km = haversine_km(
+        origins[:, :1], origins[:, 1:], candidates.latitude[np.newaxis, :], candidates.longitude[np.newaxis, :]
+    )
+    with np.errstate(invalid='ignore'):
+        proximity = np.exp(-km / DISTANCE_KM)
+    scores += WEIGHTS['distance'] * np.where(np.isnan(km), affinity, proximity)
+    return scores
+
+
+def _top_lists(scores, ids, k):
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return [[] for _ in range(scores.shape[0])]
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    return [
+        [(float(s), int(d)) for s, d in zip(row_scores, ids[row])]
+        for row_scores, row in zip(best_scores, best)
+    ]
+
+
+def refresh(ngo_ids, candidates=None):
+    """Recompute and cache the top-K lists for ``ngo_ids``; returns them by NGO id."""
+    candidates = candidates if candidates is not None else available_candidates()
+    results = {}
+    for start in range(0, len(ngo_ids), BATCH_SIZE):
+        batch = list(ngo_ids[start:start + BATCH_SIZE])
+        categories, donors, origins = load_preferences(batch)
+        lists = _top_lists(score_matrix(categories, donors, origins, candidates), candidates.ids, TOP_K)
+        entries = {}
+        for i, ngo_id in enumerate(batch):
+            results[ngo_id] = lists[i]
+            entries[_top_key(ngo_id)] = lists[i]
+            entries[_pref_key(ngo_id)] = (categories[i].tolist(), donors[i], origins[i].tolist())
+        cache.set_many(entries, CACHE_TIMEOUT)
+
+    with _locked() as acquired:
+        # Unregistered lists still serve reads; they just miss new donations until they expire.
+        if acquired:
+            registry = cache.get(REGISTRY_KEY, set()) | set(results)
+            cache.set(REGISTRY_KEY, registry, CACHE_TIMEOUT)
+    return results
+
+
+def refresh_all():
+    ngo_ids = list(UserProfile.objects.filter(role='ngo', is_approved=True).values_list('user_id', flat=True))
+    return refresh(ngo_ids)
+
+
+def note_new_donation(donation, donor_rating):
+    # Scores one new donation against every cached NGO preference vector at
+    # once and merges it into the lists it makes the cut for, instead of
+    # recomputing whole lists.
+    if not cache.get(REGISTRY_KEY):
+        return
+    site = (None, None)
+    if donation.pickup_site_id:
+        site = PickupSite.objects.filter(id=donation.pickup_site_id).values_list('latitude', 'longitude').first() or site
+    row = (donation.id, donation.category, donation.pickup_by, donation.donor_id, donor_rating, *site)
+    candidates = Candidates([row], timezone.now())
+
+    with _locked() as acquired:
+        if not acquired:
+            return
+        ngo_ids = sorted(cache.get(REGISTRY_KEY, ()))
+        cached = cache.get_many([_pref_key(n) for n in ngo_ids] + [_top_key(n) for n in ngo_ids])
+        ngo_ids = [n for n in ngo_ids if _pref_key(n) in cached and _top_key(n) in cached]
+        if not ngo_ids:
+            return
+
+        categories = np.array([cached[_pref_key(n)][0] for n in ngo_ids])
+        donors = [cached[_pref_key(n)][1] for n in ngo_ids]
+        origins = np.array([cached[_pref_key(n)][2] for n in ngo_ids], dtype=float)
+        scores = score_matrix(categories, donors, origins, candidates)[:, 0]
+
+        updates = {}
+        for ngo_id, score in zip(ngo_ids, scores):
+            top = cached[_top_key(ngo_id)]
+            if len(top) < TOP_K or score > top[-1][0]:
+                # Lists are kept in descending score order; bisect on the negated keys.
+                position = bisect.bisect_left([-s for s, _ in top], -score)
+                top = (top[:position] + [(float(score), donation.id)] + top[position:])[:TOP_K]
+                updates[_top_key(ngo_id)] = top
+        if updates:
+            cache.set_many(updates, CACHE_TIMEOUT)
+
+
+def recommended_donations(ngo):
+    top = cache.get(_top_key(ngo.id))
+    if top is None:
+        top = refresh([ngo.id])[ngo.id]
+    ids = [donation_id for _, donation_id in top]
+    if not ids:
+        return []
+    # Lists may hold donations claimed or expired since they were cached.
+    live = Donation.objects.hot().filter(
+        id__in=ids, status='available', pickup_by__gt=timezone.now()
+    ).select_related('donor__userprofile').in_bulk()
+    return [live[i] for i in ids if i in live]
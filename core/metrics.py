@@ -0,0 +1,314 @@
+import json
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from . import addresses, profiles, tasks, webhooks
+from .models import Donation, Notification, WebhookDeadLetter, WebhookDelivery
+
+# Prometheus metrics, served in the text exposition format at /metrics.
+# Counters and histograms live in process memory. Gunicorn runs several
+# workers and a scrape reaches only one of them, so with METRICS_DIR set each
+# worker also writes a snapshot there at most every METRICS_FLUSH_SECONDS.
+# A scrape then adds up every worker's snapshot. Counts from exited workers
+# are folded into one archive file, so counters never go backwards. Table
+# counts and connection usage come from the database; they are computed at
+# most once per METRICS_GAUGE_TTL and shared through the cache.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+GAUGE_CACHE_KEY = 'metrics:gauges'
+ARCHIVE = 'archive.json'
+
+_lock = threading.Lock()
+_registry = {}
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        _registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per key: a count for each bucket and one for +Inf (not cumulative,
+        # so snapshots add up element-wise), then the sum of observations.
+        self.values = {}
+        _registry[name] = self
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+
+request_latency = Histogram(
+    'nowastemate_http_request_duration_seconds', "Time to respond, by view.", ['view', 'method'],
+)
+responses = Counter('nowastemate_http_responses_total', "Responses sent, by view and status.", ['view', 'status'])
+donations_posted = Counter('nowastemate_donations_posted_total', "Donations posted.")
+claims = Counter(
+    'nowastemate_claims_total',
+    "Claim attempts by outcome: claimed, interest (registered for allocation), already_claimed, unavailable.",
+    ['outcome'],
+)
+completions = Counter('nowastemate_completions_total', "Donations marked completed.")
+reviews = Counter('nowastemate_reviews_total', "Reviews submitted.")
+
+
+def _cache_counters():
+    caches = {
+        'profiles': profiles.stats(),
+        'pickup_sites': addresses.site_cache_stats(),
+        'webhook_subscriptions': webhooks._subscriptions.stats(),
+    }
+    normalized = addresses.normalize_address.cache_info()
+    caches['normalized_addresses'] = {'hits': normalized.hits, 'misses': normalized.misses}
+    return caches
+
+
+def snapshot():
+    """This process's samples as {name: [[label values, value], ...]}."""
+    with _lock:
+        samples = {name: [[list(key), value if metric.kind == 'counter' else list(value)]
+                          for key, value in metric.values.items()]
+                   for name, metric in _registry.items()}
+    caches = _cache_counters()
+    samples['nowastemate_cache_hits_total'] = [[[name], stats['hits']] for name, stats in caches.items()]
+    samples['nowastemate_cache_misses_total'] = [[[name], stats['misses']] for name, stats in caches.items()]
+    executor = tasks._executor
+    samples['nowastemate_background_tasks_queued'] = [[[], executor._work_queue.qsize() if executor else 0]]
+    return samples
+
+
+# Metrics built at snapshot time rather than kept in _registry:
+# (name, type, help, label names).
+PROCESS_METRICS = [
+    ('nowastemate_cache_hits_total', 'counter', "In-process cache hits.", ('cache',)),
+    ('nowastemate_cache_misses_total', 'counter', "In-process cache misses.", ('cache',)),
+    ('nowastemate_background_tasks_queued', 'gauge', "Background tasks waiting for a thread.", ()),
+]
+
+_flushed = {'pid': None, 'path': None, 'at': 0.0}
+
+
+def _own_path():
+    # Unique per process: a recycled pid must not overwrite an exited
+    # worker's counts before they are archived.
+    if _flushed['pid'] != os.getpid():
+        _flushed.update(pid=os.getpid(), path=Path(settings.METRICS_DIR) / f'{os.getpid()}-{secrets.token_hex(4)}.json')
+    return _flushed['path']
+
+
+def flush(force=False):
+    """Write this process's snapshot to METRICS_DIR if one is due."""
+    if not settings.METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _flushed['at'] < settings.METRICS_FLUSH_SECONDS:
+        return
+    _flushed['at'] = now
+    path = _own_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(snapshot()))
+    os.replace(temporary, path)
+
+
+def _alive(path):
+    try:
+        os.kill(int(path.name.split('-', 1)[0]), 0)
+    except ProcessLookupError:
+        return False
+    except (ValueError, PermissionError):
+        pass
+    return True
+
+
+def _add(total, samples):
+    for name, entries in samples.items():
+        merged = total.setdefault(name, {})
+        for key, value in entries:
+            key = tuple(key)
+            if key not in merged:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            else:
+                merged[key] += value
+
+
+def _read_directory(directory, kinds):
+    # Runs under a lock so a concurrent scrape never reads an exited worker's
+    # file and the archive it was just folded into.
+    import fcntl
+
+    total = {}
+    with open(directory / '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = directory / ARCHIVE
+        if archive_path.exists():
+            _add(total, json.loads(archive_path.read_text()))
+        exited = []
+        stale = time.time() - settings.METRICS_STALE_SECONDS
+        for path in directory.glob('*-*.json'):
+            if path == _own_path():
+                continue
+            samples = json.loads(path.read_text())
+            alive = _alive(path)
+            if not alive:
+                exited.append((path, samples))
+            if not alive or path.stat().st_mtime < stale:
+                # Gauges of exited or long-idle workers are out of date.
+                samples = {name: entries for name, entries in samples.items() if kinds.get(name) != 'gauge'}
+            _add(total, samples)
+        if exited:
+            # Fold exited workers' counters into the archive.
+            archived = {}
+            if archive_path.exists():
+                _add(archived, json.loads(archive_path.read_text()))
+            for _, samples in exited:
+                _add(archived, {name: entries for name, entries in samples.items() if kinds.get(name) != 'gauge'})
+            temporary = archive_path.with_suffix('.tmp')
+            temporary.write_text(json.dumps({name: [[list(key), value] for key, value in entries.items()]
+                                             for name, entries in archived.items()}))
+            os.replace(temporary, archive_path)
+            for path, _ in exited:
+                path.unlink()
+    return total
+
+
+def collect():
+    """Every worker's samples added together, as {name: {label values: value}}."""
+    total = {}
+    _add(total, snapshot())
+    if not settings.METRICS_DIR:
+        return total
+    flush(force=True)
+    kinds = {name: metric.kind for name, metric in _registry.items()}
+    kinds.update({name: kind for name, kind, _, _ in PROCESS_METRICS})
+    for name, entries in _read_directory(Path(settings.METRICS_DIR), kinds).items():
+        _add(total, {name: list(entries.items())})
+    return total
+
+
+def _database_gauges():
+    now = timezone.now()
+    gauges = {
+        'nowastemate_donations': [
+            [[row['status']], row['n']]
+            for row in Donation.objects.hot().values('status').annotate(n=Count('id')).order_by()
+        ],
+        'nowastemate_donations_awaiting_allocation': [[[], Donation.objects.filter(
+            status='available', allocate_after__isnull=False,
+        ).count()]],
+        'nowastemate_notifications_unread': [[[], Notification.objects.filter(is_read=False).count()]],
+        'nowastemate_notification_emails_pending': [[[], Notification.objects.filter(email_pending=True).count()]],
+        'nowastemate_webhook_deliveries_queued': [[[], WebhookDelivery.objects.count()]],
+        'nowastemate_webhook_deliveries_due': [[[], WebhookDelivery.objects.filter(next_attempt_at__lte=now).count()]],
+        'nowastemate_webhook_dead_letters': [[[], WebhookDeadLetter.objects.count()]],
+    }
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COALESCE(state, 'unknown'), COUNT(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() GROUP BY 1"
+            )
+            gauges['nowastemate_db_connections'] = [[[state], n] for state, n in cursor.fetchall()]
+            cursor.execute("SHOW max_connections")
+            gauges['nowastemate_db_max_connections'] = [[[], int(cursor.fetchone()[0])]]
+    gauges['nowastemate_gauges_computed_timestamp_seconds'] = [[[], now.timestamp()]]
+    return gauges
+
+
+DATABASE_METRICS = [
+    ('nowastemate_donations', "Donations not yet archived, by status.", ('status',)),
+    ('nowastemate_donations_awaiting_allocation', "Available donations in an open allocation round.", ()),
+    ('nowastemate_notifications_unread', "Unread notifications.", ()),
+    ('nowastemate_notification_emails_pending', "Notifications waiting for a digest email.", ()),
+    ('nowastemate_webhook_deliveries_queued', "Webhook deliveries not yet sent.", ()),
+    ('nowastemate_webhook_deliveries_due', "Webhook deliveries due now.", ()),
+    ('nowastemate_webhook_dead_letters', "Webhook deliveries that exhausted their retries.", ()),
+    ('nowastemate_db_connections', "PostgreSQL connections to this database, by state.", ('state',)),
+    ('nowastemate_db_max_connections', "PostgreSQL max_connections.", ()),
+    ('nowastemate_gauges_computed_timestamp_seconds', "When the database gauges were last computed.", ()),
+]
+
+
+def database_gauges():
+    gauges = cache.get(GAUGE_CACHE_KEY)
+    if gauges is None:
+        gauges = _database_gauges()
+        cache.set(GAUGE_CACHE_KEY, gauges, settings.METRICS_GAUGE_TTL)
+    return gauges
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    samples = collect()
+    families = [(m.name, m.kind, m.help, m.labels, getattr(m, 'buckets', None)) for m in _registry.values()]
+    families += [(name, kind, help, labels, None) for name, kind, help, labels in PROCESS_METRICS]
+    gauges = database_gauges()
+    families += [(name, 'gauge', help, labels, None) for name, help, labels in DATABASE_METRICS if name in gauges]
+    samples.update({name: {tuple(key): value for key, value in entries} for name, entries in gauges.items()})
+
+    lines = []
+    for name, kind, help, labels, buckets in families:
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(samples.get(name, {}).items()):
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels, key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound}"'
+                lines.append(f'{name}_bucket{_labels(labels, key, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels, key)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(labels, key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
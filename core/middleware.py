@@ -0,0 +1,168 @@
+import cProfile
+import io
+import itertools
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+
+class StackSampler:
+    # Polls the stack of a single thread and counts identical stacks, which is
+    # exactly the "collapsed" format flamegraph.pl / speedscope read.
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_table(self, limit):
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        samples = sum(self.stacks.values()) or 1
+        lines = [f"{samples} samples every {self.interval * 1000:.1f} ms", '', f"{'own %':>7} {'total %':>7}  frame"]
+        for frame, count in own.most_common(limit):
+            lines.append(f"{100 * count / samples:7.1f} {100 * total[frame] / samples:7.1f}  {frame}")
+        return '\n'.join(lines) + '\n'
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when a staff user asks for it with ``?_profile=1`` (or
+    ``?_profile=cprofile``) / an ``X-Profile`` header, and every
+    PROFILING_SAMPLE_EVERY-th request otherwise. Removed from the middleware
+    chain entirely unless PROFILING_ENABLED is set.
+    """
+    MODES = ('sample', 'cprofile')
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.output_dir = settings.PROFILING_DIR
+        self.sample_every = settings.PROFILING_SAMPLE_EVERY
+        self.interval = settings.PROFILING_INTERVAL
+        self.top_n = settings.PROFILING_TOP_N
+        self.counter = itertools.count(1)
+
+    def __call__(self, request):
+        mode = self.requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+        else:
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        elapsed = time.perf_counter() - started
+
+        name = self.write_output(request, mode, profiler, elapsed)
+        if request.user.is_authenticated and request.user.is_staff:
+            response['X-Profile-Output'] = name
+        return response
+
+    def requested_mode(self, request):
+        flag = request.GET.get('_profile') or request.headers.get('X-Profile')
+        if flag and request.user.is_authenticated and request.user.is_staff:
+            return flag if flag in self.MODES else 'sample'
+        if self.sample_every and next(self.counter) % self.sample_every == 0:
+            return 'sample'
+        return None
+
+    def write_output(self, request, mode, profiler, elapsed):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{slug}-{mode}"
+        header = f"{request.method} {request.get_full_path()} took {elapsed * 1000:.1f} ms\n\n"
+
+        if mode == 'cprofile':
+            profiler.dump_stats(self.output_dir / f"{name}.prof")
+            table = io.StringIO()
+            pstats.Stats(profiler, stream=table).sort_stats('cumulative').print_stats(self.top_n)
+            table = table.getvalue()
+        else:
+            (self.output_dir / f"{name}.folded").write_text(profiler.collapsed())
+            table = profiler.top_table(self.top_n)
+
+        (self.output_dir / f"{name}.txt").write_text(header + table)
+        return name
+
+
+class MetricsMiddleware:
+    """
+    Records each response's latency and status per view (core.metrics).
+    Works in both sync and async chains, so it does not push the async claim
+    and complete views onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, elapsed):
+        # Unmatched paths share one label so scanners cannot add series.
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.request_latency.observe(elapsed, view=view, method=request.method)
+        metrics.responses.inc(view=view, status=response.status_code)
+        metrics.flush()
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:11
+
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth
+
+
+def backfill_completed_at(apps, schema_editor):
+    # Completion time was never recorded; creation time is the closest value
+    # we have and is what the old impact chart bucketed by.
+    Donation = apps.get_model('core', 'Donation')
+    Donation.objects.filter(status='completed', completed_at__isnull=True).update(completed_at=F('created_at'))
+
+
+def fill_impact_buckets(apps, schema_editor):
+    # Frozen copy of timeseries.rebuild, so the impact page shows existing
+    # history as soon as this runs.
+    Donation = apps.get_model('core', 'Donation')
+    ImpactBucket = apps.get_model('core', 'ImpactBucket')
+    completed = Donation.objects.filter(status='completed', completed_at__isnull=False)
+    for resolution, truncate in (('hour', TruncHour), ('day', TruncDay), ('month', TruncMonth)):
+        rows = completed.annotate(bucket=truncate('completed_at')).values('bucket').annotate(count=Count('id')).order_by()
+        ImpactBucket.objects.bulk_create(
+            (ImpactBucket(resolution=resolution, start=row['bucket'], count=row['count']) for row in rows),
+            batch_size=5000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_pickupsite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ImpactBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('resolution', 'start')},
+            },
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+        migrations.RunPython(fill_impact_buckets, migrations.RunPython.noop),
+    ]
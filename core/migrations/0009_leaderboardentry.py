@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def fill_leaderboards(apps, schema_editor):
+    # Frozen copy of leaderboard.rebuild, so totals and top-donor lists show
+    # existing history as soon as this runs.
+    Donation = apps.get_model('core', 'Donation')
+    LeaderboardEntry = apps.get_model('core', 'LeaderboardEntry')
+    completed = Donation.objects.filter(status='completed', completed_at__isnull=False).order_by()
+    entries = [
+        LeaderboardEntry(board='all', user_id=row['donor'], count=row['n'])
+        for row in completed.values('donor').annotate(n=Count('id'))
+    ]
+    entries += [
+        LeaderboardEntry(board=f"month:{timezone.localtime(row['month']):%Y-%m}", user_id=row['donor'], count=row['n'])
+        for row in completed.annotate(month=TruncMonth('completed_at')).values('donor', 'month').annotate(n=Count('id'))
+    ]
+    entries += [
+        LeaderboardEntry(board=f"category:{row['category']}", user_id=row['donor'], count=row['n'])
+        for row in completed.values('donor', 'category').annotate(n=Count('id'))
+    ]
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_impact_time_series'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=32)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', '-count'], name='leaderboard_rank_idx')],
+                'unique_together': {('board', 'user')},
+            },
+        ),
+        migrations.RunPython(fill_leaderboards, migrations.RunPython.noop),
+    ]
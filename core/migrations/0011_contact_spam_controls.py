@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:18
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_digested(apps, schema_editor):
+    # These were already emailed to the admins one by one.
+    ContactMessage = apps.get_model('core', 'ContactMessage')
+    ContactMessage.objects.filter(digested_at__isnull=True).update(digested_at=F('sent_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactmessage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='contactmessage',
+            name='digested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(condition=models.Q(('digested_at__isnull', True)), fields=['sent_at'], name='contact_undigested_idx'),
+        ),
+        migrations.RunPython(mark_existing_digested, migrations.RunPython.noop),
+    ]
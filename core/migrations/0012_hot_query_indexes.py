@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    # CREATE INDEX CONCURRENTLY on PostgreSQL so the donation and notification
+    # tables stay writable while these build; a plain AddIndex elsewhere.
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_contact_spam_controls'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='donation',
+            index=models.Index(condition=models.Q(('is_archived', False), ('status', 'available')), fields=['category', '-created_at'], name='donation_available_cat_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='donation',
+            index=models.Index(fields=['donor', '-created_at'], name='donation_donor_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='donation',
+            index=models.Index(fields=['claimed_by', '-created_at'], name='donation_claimer_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='donation',
+            index=models.Index(fields=['claimed_by', 'category', 'donor'], name='donation_claim_history_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='donation',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['completed_at'], name='donation_completed_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user'], name='notif_user_unread_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='userprofile',
+            index=models.Index(fields=['role', 'is_approved'], name='profile_role_approved_idx'),
+        ),
+    ]
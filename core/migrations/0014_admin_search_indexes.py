@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Admin search matches by prefix with ``istartswith``, which Django compiles
+# on PostgreSQL to ``UPPER(col::text) LIKE UPPER('term%')``. These expression
+# indexes match that form exactly. Other backends have no equivalent, so the
+# migration does nothing there.
+INDEXES = [
+    ('donation_food_item_upper_idx', 'core_donation', 'food_item'),
+    ('auth_user_username_upper_idx', 'auth_user', 'username'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" (UPPER("{column}"::text) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _table, _column in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_reputation_metrics'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
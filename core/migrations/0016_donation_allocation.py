@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_notification_coalescing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationInterest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='allocate_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(condition=models.Q(('allocate_after__isnull', False), ('status', 'available')), fields=['allocate_after'], name='donation_allocation_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='donationinterest',
+            name='donation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interests', to='core.donation'),
+        ),
+        migrations.AddField(
+            model_name='donationinterest',
+            name='ngo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='donation_interests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='donationinterest',
+            constraint=models.UniqueConstraint(fields=('donation', 'ngo'), name='unique_donation_interest'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_donation_allocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='photo',
+            field=models.ImageField(blank=True, upload_to='donations/originals/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
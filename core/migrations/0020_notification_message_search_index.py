@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# Prefix index for the notification admin's ``^message`` search, in the same
+# ``UPPER(col::text)`` form as 0014_admin_search_indexes. PostgreSQL only.
+NAME = 'notif_message_upper_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{NAME}" ON "core_notification" (UPPER("message"::text) text_pattern_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{NAME}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0019_donation_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
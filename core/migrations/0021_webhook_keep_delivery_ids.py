@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_notification_message_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookdeadletter',
+            name='delivery_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='webhookdelivery',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models import Avg
+from django.utils import timezone
+import hashlib
+import secrets
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -9,6 +12,19 @@ class UserProfile(models.Model):
     phone_number = models.CharField(max_length=10)
     is_approved = models.BooleanField(default=False)
     average_rating = models.FloatField(default=0.0)
+    # Reliability metrics, recomputed for everyone by `manage.py refresh_reputation`.
+    completion_rate = models.FloatField(null=True, blank=True)
+    avg_completion_hours = models.FloatField(null=True, blank=True)
+    bayesian_rating = models.FloatField(default=0.0)
+    recent_rating = models.FloatField(null=True, blank=True)
+    reputation_updated_at = models.DateTimeField(null=True, blank=True)
+    # How notification emails are delivered; see core.notifications.
+    DIGEST_CHOICES = (('instant', 'Instant'), ('hourly', 'Hourly digest'), ('daily', 'Daily digest'))
+    digest_frequency = models.CharField(max_length=10, choices=DIGEST_CHOICES, default='instant')
+    last_digest_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['role', 'is_approved'], name='profile_role_approved_idx')]
 
     def __str__(self):
         return f"{self.user.username} - {self.get_role_display()}"
@@ -21,6 +37,30 @@ class UserProfile(models.Model):
             self.average_rating = 0.0
         self.save()
 
+class PickupSite(models.Model):
+    # One row per distinct pickup address once normalized (see core.addresses),
+    # so location filters compare ids instead of scanning free text.
+    normalized_address = models.CharField(max_length=255, unique=True)
+    address = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.address
+
+
+class DonationQuerySet(models.QuerySet):
+    # Donations completed more than DONATION_ARCHIVE_AFTER_DAYS ago are flagged
+    # as archived (see the archive_donations command). Hot-path queries go
+    # through hot() so they only use the partial index over live rows.
+    def hot(self):
+        return self.filter(is_archived=False)
+
+    def archived(self):
+        return self.filter(is_archived=True)
+
+
 class Donation(models.Model):
     CATEGORY_CHOICES = [
         ('cooked', 'Cooked Meal'),
@@ -40,19 +80,159 @@ class Donation(models.Model):
     category = models.CharField(max_length=10, choices=CATEGORY_CHOICES, default='other')
     quantity = models.CharField(max_length=100)
     pickup_location = models.TextField()
+    pickup_site = models.ForeignKey(PickupSite, on_delete=models.SET_NULL, null=True, blank=True, related_name='donations')
     pickup_by = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='available')
+    is_archived = models.BooleanField(default=False)
+    # Set while the donation waits for an allocation round (core.allocation);
+    # direct claims are refused until then.
+    allocate_after = models.DateTimeField(null=True, blank=True)
+    # Uploaded original (never served) and the rendered sizes (core.photos).
+    photo = models.ImageField(upload_to='donations/originals/%Y/%m/', blank=True)
+    thumbnails = models.JSONField(default=dict, blank=True)
+
+    objects = DonationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', '-created_at'],
+                name='donation_hot_status_idx',
+                condition=models.Q(is_archived=False),
+            ),
+            # Feed filtered by category.
+            models.Index(
+                fields=['category', '-created_at'],
+                name='donation_available_cat_idx',
+                condition=models.Q(status='available', is_archived=False),
+            ),
+            # Donor and NGO dashboards, newest first.
+            models.Index(fields=['donor', '-created_at'], name='donation_donor_created_idx'),
+            models.Index(fields=['claimed_by', '-created_at'], name='donation_claimer_created_idx'),
+            # NGO claim history for recommendations, answered from the index alone.
+            models.Index(fields=['claimed_by', 'category', 'donor'], name='donation_claim_history_idx'),
+            # Completed counts and completion-time ranges.
+            models.Index(
+                fields=['completed_at'],
+                name='donation_completed_at_idx',
+                condition=models.Q(status='completed'),
+            ),
+            # Rounds due for allocation.
+            models.Index(
+                fields=['allocate_after'],
+                name='donation_allocation_due_idx',
+                condition=models.Q(status='available', allocate_after__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return self.food_item
 
+class ImpactBucket(models.Model):
+    # Pre-aggregated completed-donation counts, maintained incrementally by
+    # core.timeseries so the impact charts read one index range per window.
+    RESOLUTION_CHOICES = [('hour', 'Hour'), ('day', 'Day'), ('month', 'Month')]
+    resolution = models.CharField(max_length=5, choices=RESOLUTION_CHOICES)
+    start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('resolution', 'start')
+
+    def __str__(self):
+        return f"{self.resolution} {self.start}: {self.count}"
+
+class LeaderboardEntry(models.Model):
+    # Completed-donation counter per donor per board: 'all', 'month:YYYY-MM'
+    # or 'category:<key>'. Maintained by core.leaderboard.
+    board = models.CharField(max_length=32)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('board', 'user')
+        indexes = [models.Index(fields=['board', '-count'], name='leaderboard_rank_idx')]
+
+    def __str__(self):
+        return f"{self.board}: {self.user.username} ({self.count})"
+
+class DonationEvent(models.Model):
+    # Append-only log of lifecycle changes, written in the same transaction as
+    # the change (core.events). Ids only grow, so a consumer's position in the
+    # log is the last id it handled. Rows outlive their donation and users.
+    KIND_CHOICES = [('posted', 'Posted'), ('claimed', 'Claimed'), ('completed', 'Completed')]
+    donation = models.ForeignKey(
+        Donation, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events',
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    actor = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+',
+    )
+    # Copied from the donation so replays aggregate the log alone.
+    donor = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    category = models.CharField(max_length=10)
+    occurred_at = models.DateTimeField()
+    recorded_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} donation {self.donation_id}"
+
+class EventCursor(models.Model):
+    # How far a named consumer has read the DonationEvent log.
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+
+class DonationInterest(models.Model):
+    # An NGO's bid for a donation in an open allocation round (core.allocation).
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name='interests')
+    ngo = models.ForeignKey(User, on_delete=models.CASCADE, related_name='donation_interests')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['donation', 'ngo'], name='unique_donation_interest')]
+
+    def __str__(self):
+        return f"{self.ngo.username} wants {self.donation.food_item}"
+
+class IdempotencyKey(models.Model):
+    # One row per processed form submission; the unique key turns a replayed
+    # POST into an IntegrityError instead of a second side effect.
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
 class ContactMessage(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
     subject = models.CharField(max_length=200)
     message = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
+    # sha256 of the normalized subject and text, used to drop resubmissions
+    # even when the sender address changes.
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # Set once the message has gone out in an admin digest email.
+    digested_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at'], name='contact_undigested_idx', condition=models.Q(digested_at__isnull=True)),
+        ]
+
+    @staticmethod
+    def hash_content(subject, message):
+        text = '\x00'.join(' '.join(part.split()).casefold() for part in (subject, message))
+        return hashlib.sha256(text.encode()).hexdigest()
 
     def __str__(self):
         return f"Message from {self.name}"
@@ -77,9 +257,72 @@ class Notification(models.Model):
     link = models.CharField(max_length=255, blank=True, null=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Events of the same kind within NOTIFICATION_COALESCE_MINUTES share one
+    # row; ``count`` is how many it stands for.
+    kind = models.CharField(max_length=20, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    email_pending = models.BooleanField(default=False)
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message}"
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Notification dropdown (latest five) and the unread badge.
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            models.Index(fields=['user'], name='notif_user_unread_idx', condition=models.Q(is_read=False)),
+            models.Index(fields=['user'], name='notif_email_pending_idx', condition=models.Q(email_pending=True)),
+        ]
+def _webhook_secret():
+    return secrets.token_hex(32)
+
+class WebhookSubscription(models.Model):
+    # A partner endpoint. Each POST is signed with ``secret`` (see core.webhooks).
+    EVENT_CHOICES = (
+        ('donation.posted', 'Donation posted'),
+        ('donation.claimed', 'Donation claimed'),
+        ('donation.completed', 'Donation completed'),
+    )
+    name = models.CharField(max_length=100)
+    url = models.URLField()
+    secret = models.CharField(max_length=64, default=_webhook_secret)
+    # Event names to send; empty means all of them.
+    events = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+class WebhookDelivery(models.Model):
+    # Outbox: one row per event per subscription until the partner accepts it.
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='deliveries')
+    event = models.CharField(max_length=30)
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['next_attempt_at'], name='webhook_due_idx')]
+
+    def __str__(self):
+        return f"{self.event} to {self.subscription}"
+
+class WebhookDeadLetter(models.Model):
+    # Deliveries that ran out of retries, kept for inspection and requeueing.
+    # ``delivery_id`` is the original delivery's id, which partners may use to
+    # deduplicate; a requeued delivery gets it back.
+    delivery_id = models.BigIntegerField(null=True, blank=True)
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='dead_letters')
+    event = models.CharField(max_length=30)
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event} to {self.subscription}"
@@ -0,0 +1,156 @@
+import logging
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import profiles
+from .models import Notification, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# A busy donor can have dozens of donations claimed in an hour. Each event
+# kind listed here is merged into the user's latest unread notification of
+# that kind if one was raised within NOTIFICATION_COALESCE_MINUTES, and the
+# message is replaced by the summary. Kinds not listed always get their own row.
+SUMMARIES = {
+    'claimed': "{count} of your donations were claimed.",
+    'completed': "{count} donations you claimed are now complete. Please leave reviews!",
+    'review': "You received {count} new reviews.",
+    'allocated': "{count} donations were allocated to you. Please arrange pickups.",
+}
+
+# How long after the previous digest each preference is due again. Instant
+# users get the first event of a window straight away; anything merged into
+# it afterwards goes out with the next digest run.
+DIGEST_PERIODS = {
+    'instant': timedelta(0),
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+}
+# Tolerance for a digest job that starts a little early.
+DIGEST_SLACK = timedelta(minutes=5)
+
+
+def notify(user, kind, message, link='/dashboard/', subject=None, body=None, email=True):
+    """Record an event for ``user``. Returns the Notification row that now holds it."""
+    now = timezone.now()
+    email = email and bool(user.email)
+    with transaction.atomic():
+        notification = None
+        if kind in SUMMARIES:
+            window_start = now - timedelta(minutes=settings.NOTIFICATION_COALESCE_MINUTES)
+            notification = (
+                Notification.objects.select_for_update()
+                .filter(user=user, kind=kind, is_read=False, created_at__gte=window_start)
+                .order_by('-created_at')
+                .first()
+            )
+        if notification is not None:
+            notification.count += 1
+            notification.message = SUMMARIES[kind].format(count=notification.count)
+            notification.created_at = now
+            notification.email_pending = notification.email_pending or email
+            notification.save(update_fields=['count', 'message', 'created_at', 'email_pending'])
+            return notification
+        notification = Notification.objects.create(
+            user=user, kind=kind, message=message, link=link, email_pending=email
+        )
+
+    info = profiles.lookup(user)
+    if email and (info is None or info.digest_frequency == 'instant'):
+        try:
+            send_mail(
+                subject=subject or message,
+                message=body or message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[user.email],
+            )
+        except Exception:
+            # Still pending, so the next digest run retries it.
+            logger.exception("Could not email notification %s", notification.pk)
+            return notification
+        Notification.objects.filter(pk=notification.pk).update(email_pending=False)
+        notification.email_pending = False
+    return notification
+
+
+def due_notifications(now):
+    """Notifications waiting for an email whose owner's digest is due at ``now``."""
+    due = Q(user__userprofile__isnull=True)
+    for frequency, period in DIGEST_PERIODS.items():
+        due |= Q(user__userprofile__digest_frequency=frequency) & (
+            Q(user__userprofile__last_digest_at__isnull=True)
+            | Q(user__userprofile__last_digest_at__lte=now - period + DIGEST_SLACK)
+        )
+    return Notification.objects.filter(due, email_pending=True)
+
+
+def _digest(user, notifications):
+    lines = [f"- {n.message} ({timezone.localtime(n.created_at):%d %b %H:%M})" for n in notifications]
+    events = sum(n.count for n in notifications)
+    return EmailMessage(
+        subject=f"NoWasteMate: {events} update{'s' if events != 1 else ''} on your donations",
+        body=f"Hi {user.username},\n\nHere is what happened since your last update:\n\n" + "\n".join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+
+
+def send_digests(now=None, batch_size=500):
+    """
+    Email every due user one digest of their pending notifications. Returns
+    (users, notifications) sent. A digest that fails to send is logged and
+    left pending for the next run.
+    """
+    now = now or timezone.now()
+    # Read up front: the batches below update the very rows being selected.
+    pending = list(due_notifications(now).select_related('user').order_by('user_id', 'created_at'))
+    users = notifications = 0
+    connection = get_connection()
+    batch = []
+
+    def flush():
+        # The emails go out over one connection, one message per call so a
+        # failure pins down which digests were not sent; only the sent ones
+        # are then marked.
+        sent_ids, user_ids = [], []
+        try:
+            connection.open()
+        except Exception:
+            logger.exception("Could not connect to send %d digests", len(batch))
+            batch.clear()
+            return 0, 0
+        try:
+            for user, group, message in batch:
+                try:
+                    connection.send_messages([message])
+                except Exception:
+                    logger.exception("Could not send the digest for user %s", user.id)
+                    continue
+                sent_ids.extend(n.id for n in group)
+                user_ids.append(user.id)
+        finally:
+            connection.close()
+        Notification.objects.filter(id__in=sent_ids).update(email_pending=False)
+        UserProfile.objects.filter(user_id__in=user_ids).update(last_digest_at=now)
+        batch.clear()
+        return len(user_ids), len(sent_ids)
+
+    for _user_id, group in groupby(pending, key=lambda n: n.user_id):
+        group = list(group)
+        user = group[0].user
+        batch.append((user, group, _digest(user, group)))
+        if len(batch) >= batch_size:
+            sent_users, sent = flush()
+            users += sent_users
+            notifications += sent
+    if batch:
+        sent_users, sent = flush()
+        users += sent_users
+        notifications += sent
+    return users, notifications
@@ -0,0 +1,30 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# Keyset ("seek") pagination over (-created_at, -id). Each page is one indexed
+# range scan however deep the history goes, unlike OFFSET, and rows inserted
+# meanwhile cannot shift items between pages.
+
+def encode_cursor(obj):
+    return f'{obj.created_at.isoformat()}|{obj.id}'
+
+
+def decode_cursor(raw):
+    try:
+        stamp, pk = raw.rsplit('|', 1)
+        created_at, pk = parse_datetime(stamp), int(pk)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return (created_at, pk) if created_at else None
+
+
+def keyset_page(queryset, position, size):
+    """Return (rows, next_cursor) for the ``size`` rows after ``position``."""
+    queryset = queryset.order_by('-created_at', '-id')
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = list(queryset[:size + 1])
+    next_cursor = encode_cursor(rows[size - 1]) if len(rows) > size else None
+    return rows[:size], next_cursor
@@ -0,0 +1,82 @@
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .models import Donation
+
+logger = logging.getLogger(__name__)
+
+# Donation photos. The uploaded original is kept but never served. A
+# background task (core.tasks) renders each size in every format Pillow can
+# encode here. The renders are re-encoded from pixels only, so EXIF (including
+# GPS), ICC and XMP metadata are dropped. Rendered files are named by content
+# hash, which lets them be cached forever.
+SIZES = {'small': 320, 'medium': 640, 'large': 1280}
+FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+QUALITY = {'avif': 55, 'webp': 75}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def validate(upload):
+    if not FORMATS:
+        raise ValidationError("Photo uploads are not available right now.")
+    if upload.size > settings.DONATION_PHOTO_MAX_MB * 1024 * 1024:
+        raise ValidationError(f"Photos can be at most {settings.DONATION_PHOTO_MAX_MB} MB.")
+    try:
+        with Image.open(upload) as image:
+            image.verify()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValidationError("That file is not an image we can read.")
+    finally:
+        upload.seek(0)
+
+
+def _render(image, width, fmt):
+    copy = image.copy()
+    copy.thumbnail((width, width * 4))
+    buffer = io.BytesIO()
+    copy.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+    return buffer.getvalue(), copy.size
+
+
+def make_thumbnails(donation_id):
+    donation = Donation.objects.filter(id=donation_id).only('id', 'photo').first()
+    if donation is None or not donation.photo or not FORMATS:
+        return
+    with donation.photo.open('rb') as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        files = {}
+        for fmt in FORMATS:
+            files[fmt] = {}
+            for size, width in SIZES.items():
+                if size != 'small' and width > image.width * 1.5:
+                    continue  # no upscaled copies of small photos
+                data, (w, h) = _render(image, width, fmt)
+                digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+                name = default_storage.save(f'donations/thumbs/{donation_id}/{size}-{digest}.{fmt}', ContentFile(data))
+                files[fmt][size] = [name.rsplit('/', 1)[-1], w, h]
+    smallest = files[FORMATS[-1]]['small']
+    Donation.objects.filter(id=donation_id).update(
+        thumbnails={'width': smallest[1], 'height': smallest[2], 'files': files}
+    )
+    logger.info("Rendered %d thumbnails for donation %s", sum(len(f) for f in files.values()), donation_id)
+
+
+def missing_thumbnails():
+    """Ids of donations with a photo but no renders, e.g. after a lost background task."""
+    return Donation.objects.exclude(photo='').filter(thumbnails={}).order_by('id').values_list('id', flat=True)
+
+
+def thumbnail_path(donation, name):
+    """Storage name of one of the donation's rendered files, or None if it has no such file."""
+    for sizes in donation.thumbnails.get('files', {}).values():
+        if any(entry[0] == name for entry in sizes.values()):
+            return f'donations/thumbs/{donation.id}/{name}'
+    return None
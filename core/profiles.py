@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+from django.conf import settings
+
+from .lru import LRUCache
+from .models import UserProfile
+
+# Role, approval, digest preference and rating are read on nearly every request but change rarely, so
+# they are memoized per process instead of costing a profile query each time.
+# Saves and deletes in this process invalidate immediately (core.signals);
+# changes made by other processes are picked up within PROFILE_CACHE_TTL.
+ProfileInfo = namedtuple('ProfileInfo', ['role', 'is_approved', 'digest_frequency', 'average_rating'])
+
+_profiles = LRUCache(maxsize=settings.PROFILE_CACHE_SIZE, ttl=settings.PROFILE_CACHE_TTL)
+_NO_PROFILE = ProfileInfo(None, False, None, None)
+
+
+def lookup(user):
+    """ProfileInfo for ``user``, or None for users without a profile (e.g. superusers)."""
+    if not user.is_authenticated:
+        return None
+    info = _profiles.get(user.pk)
+    if info is None:
+        row = UserProfile.objects.filter(user_id=user.pk).values_list(
+            'role', 'is_approved', 'digest_frequency', 'average_rating'
+        ).first()
+        info = ProfileInfo(*row) if row else _NO_PROFILE
+        _profiles.set(user.pk, info)
+    return None if info is _NO_PROFILE else info
+
+
+def role(user):
+    info = lookup(user)
+    return info.role if info else None
+
+
+def invalidate(user_id):
+    _profiles.pop(user_id)
+
+
+def stats():
+    return _profiles.stats()
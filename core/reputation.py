@@ -0,0 +1,114 @@
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Donation, Review, UserProfile
+
+FIELDS = ['completion_rate', 'avg_completion_hours', 'bayesian_rating', 'recent_rating', 'reputation_updated_at']
+
+
+def _epoch(values):
+    return np.fromiter((v.timestamp() if v else np.nan for v in values), dtype=float, count=len(values))
+
+
+def _columns(queryset, fields, chunk_size):
+    rows = list(queryset.order_by().values_list(*fields).iterator(chunk_size=chunk_size))
+    return list(zip(*rows)) if rows else [()] * len(fields)
+
+
+def load(chunk_size=20000):
+    """Every claimed/completed donation and every review, one array per column."""
+    donor, ngo, status, claimed_at, completed_at = _columns(
+        Donation.objects.filter(status__in=('claimed', 'completed')),
+        ['donor_id', 'claimed_by_id', 'status', 'claimed_at', 'completed_at'],
+        chunk_size,
+    )
+    reviewed, rating, reviewed_at = _columns(
+        Review.objects.all(), ['reviewed_user_id', 'rating', 'created_at'], chunk_size
+    )
+    donations = {
+        'donor': np.array(donor, dtype=np.int64),
+        'ngo': np.fromiter((n or -1 for n in ngo), dtype=np.int64, count=len(ngo)),
+        'completed': np.array([s == 'completed' for s in status], dtype=bool),
+        'claimed_at': _epoch(claimed_at),
+        'completed_at': _epoch(completed_at),
+    }
+    reviews = {
+        'reviewed': np.array(reviewed, dtype=np.int64),
+        'rating': np.array(rating, dtype=float),
+        'created_at': _epoch(reviewed_at),
+    }
+    return donations, reviews
+
+
+def _mean(total, count):
+    return np.divide(total, count, out=np.full(len(total), np.nan), where=count > 0)
+
+
+def compute(donations, reviews, size, now, prior_weight, half_life_days):
+    """
+    Metric arrays indexed by user id (``size`` = largest id + 1). Completion
+    metrics are computed from both sides of each donation, and the caller
+    picks the donor or NGO version by the user's role.
+    """
+    latency = donations['completed_at'] - donations['claimed_at']  # NaN when either is unknown
+    metrics = {}
+    for side in ('donor', 'ngo'):
+        users = donations[side]
+        known = users >= 0
+        users, completed, side_latency = users[known], donations['completed'][known], latency[known]
+        handled = np.bincount(users, minlength=size)
+        timed = ~np.isnan(side_latency)
+        metrics[side] = {
+            'completion_rate': _mean(np.bincount(users, weights=completed, minlength=size), handled),
+            'avg_completion_hours': _mean(
+                np.bincount(users[timed], weights=side_latency[timed], minlength=size) / 3600,
+                np.bincount(users[timed], minlength=size),
+            ),
+        }
+
+    reviewed, rating = reviews['reviewed'], reviews['rating']
+    count = np.bincount(reviewed, minlength=size)
+    total = np.bincount(reviewed, weights=rating, minlength=size)
+    # Shrink each user's mean towards the site-wide mean as if they had
+    # ``prior_weight`` extra average reviews, so one 5-star review does not
+    # outrank fifty 4.8s.
+    prior = rating.mean() if len(rating) else 0.0
+    bayesian = (prior_weight * prior + total) / (prior_weight + count)
+    # Recent rating: each review's weight halves every ``half_life_days``.
+    age_days = np.clip(now.timestamp() - reviews['created_at'], 0, None) / 86400
+    weight = np.exp2(-age_days / half_life_days)
+    recent = _mean(
+        np.bincount(reviewed, weights=weight * rating, minlength=size),
+        np.bincount(reviewed, weights=weight, minlength=size),
+    )
+    for side in metrics.values():
+        side['bayesian_rating'] = bayesian
+        side['recent_rating'] = recent
+    return metrics
+
+
+def _value(x):
+    return None if np.isnan(x) else round(float(x), 4)
+
+
+def refresh(batch_size=1000, now=None):
+    now = now or timezone.now()
+    donations, reviews = load()
+    profiles = list(UserProfile.objects.only('id', 'user_id', 'role'))
+    if not profiles:
+        return 0
+    columns = [donations['donor'], donations['ngo'], reviews['reviewed']]
+    size = 1 + max([p.user_id for p in profiles] + [int(column.max()) for column in columns if len(column)])
+    metrics = compute(
+        donations, reviews, size, now,
+        settings.REPUTATION_PRIOR_REVIEWS, settings.REPUTATION_HALF_LIFE_DAYS,
+    )
+    for profile in profiles:
+        side = metrics['ngo' if profile.role == 'ngo' else 'donor']
+        for field in FIELDS[:-1]:
+            setattr(profile, field, _value(side[field][profile.user_id]))
+        profile.bayesian_rating = profile.bayesian_rating or 0.0
+        profile.reputation_updated_at = now
+    UserProfile.objects.bulk_update(profiles, FIELDS, batch_size=batch_size)
+    return len(profiles)
@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from . import addresses
+from .lru import LRUCache
+from .models import Donation
+
+# Pickup tours for an NGO's outstanding claims. Donations at the same pickup
+# site are one stop. The tour starts at the stop with the earliest deadline,
+# is built nearest-neighbour first and then improved with 2-opt. Stops whose
+# site has no coordinates cannot be placed and are listed after the tour in
+# deadline order.
+
+# Distance matrices keyed by the sorted site ids they cover. An NGO re-opening
+# its route with the same claims reuses the matrix.
+_matrices = LRUCache(maxsize=256)
+
+
+def distance_matrix(site_ids, coordinates):
+    """Pairwise km between sites; ``site_ids`` sorted, ``coordinates`` an (n, 2) array in the same order."""
+    key = tuple(site_ids)
+    matrix = _matrices.get(key)
+    if matrix is None:
+        lat, lon = coordinates[:, 0], coordinates[:, 1]
+        matrix = addresses.haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+        _matrices.set(key, matrix)
+    return matrix
+
+
+def nearest_neighbour(distances, start=0):
+    n = len(distances)
+    tour = [start]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, distances[tour[-1]])
+        tour.append(int(np.argmin(row)))
+        visited[tour[-1]] = True
+    return np.array(tour, dtype=np.intp)
+
+
+def two_opt(distances, tour, max_rounds=1000, moves_per_round=64):
+    """
+    Improve an open path with a fixed first stop by reversing segments. Each
+    round scores every (i, j) reversal at once. It then applies the best
+    improving reversals whose segments do not touch each other; their gains
+    add up exactly. Rounds repeat until no reversal shortens the path.
+    """
+    n = len(tour)
+    if n < 4:
+        return tour
+    # A zero-distance sentinel after the last stop makes the open path's tail
+    # look like any other edge.
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = distances
+    tour = np.append(tour, n)
+    i = np.arange(1, n)[:, None]
+    j = np.arange(1, n)[None, :]
+    invalid = j <= i
+    for _ in range(max_rounds):
+        a, b = tour[i - 1], tour[i]
+        c, d = tour[j], tour[j + 1]
+        gain = padded[a, b] + padded[c, d] - padded[a, c] - padded[b, d]
+        gain[invalid] = 0.0
+        improving = np.flatnonzero(gain > 1e-9)
+        if not len(improving):
+            break
+        if len(improving) > moves_per_round:
+            improving = improving[np.argpartition(-gain.flat[improving], moves_per_round)[:moves_per_round]]
+        improving = improving[np.argsort(-gain.flat[improving])]
+        taken = []
+        for start, end in zip(*np.unravel_index(improving, gain.shape)):
+            start, end = start + 1, end + 1
+            # Segments must leave a gap so no two moves share an edge.
+            if all(end + 1 < s or e + 1 < start for s, e in taken):
+                taken.append((start, end))
+                tour[start:end + 1] = tour[start:end + 1][::-1]
+    return tour[:-1]
+
+
+def path_length(distances, tour):
+    return float(distances[tour[:-1], tour[1:]].sum()) if len(tour) > 1 else 0.0
+
+
+def _stops(donations):
+    stops = {}
+    for donation in donations:
+        key = donation.pickup_site_id or f'donation-{donation.id}'
+        stops.setdefault(key, []).append(donation)
+    return list(stops.values())
+
+
+def plan(ngo, now=None):
+    """
+    The NGO's pickup tour. Returns a dict with ``stops`` (in visiting order,
+    each with its donations, leg and cumulative km, ETA and whether the ETA
+    misses the earliest deadline), ``unplaced`` stops and ``total_km``.
+    """
+    now = now or timezone.now()
+    donations = (
+        Donation.objects.hot()
+        .filter(claimed_by=ngo, status='claimed')
+        .select_related('pickup_site', 'donor__userprofile')
+        .order_by('pickup_by', 'id')
+    )
+    placed, unplaced = [], []
+    for stop in _stops(donations):
+        site = stop[0].pickup_site
+        located = site is not None and site.latitude is not None and site.longitude is not None
+        (placed if located else unplaced).append(stop)
+
+    route = []
+    total = 0.0
+    if placed:
+        placed.sort(key=lambda stop: stop[0].pickup_site_id)
+        site_ids = [stop[0].pickup_site_id for stop in placed]
+        coordinates = np.array([(s[0].pickup_site.latitude, s[0].pickup_site.longitude) for s in placed])
+        distances = distance_matrix(site_ids, coordinates)
+        start = min(range(len(placed)), key=lambda k: placed[k][0].pickup_by)
+        tour = two_opt(distances, nearest_neighbour(distances, start))
+        total = path_length(distances, tour)
+        speed = settings.ROUTE_SPEED_KMH
+        travelled = 0.0
+        previous = None
+        for index in tour:
+            leg = 0.0 if previous is None else float(distances[previous, index])
+            travelled += leg
+            previous = index
+            eta = now + timedelta(hours=travelled / speed)
+            deadline = placed[index][0].pickup_by
+            route.append({
+                'donations': placed[index], 'leg_km': leg, 'cumulative_km': travelled,
+                'eta': eta, 'late': eta > deadline,
+            })
+    return {'stops': route, 'unplaced': sorted(unplaced, key=lambda s: s[0].pickup_by), 'total_km': total}
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import profiles, webhooks
+from .models import UserProfile, WebhookSubscription
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def forget_cached_profile(sender, instance, **kwargs):
+    profiles.invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=WebhookSubscription)
+def forget_cached_subscriptions(sender, instance, **kwargs):
+    webhooks.forget_subscriptions()
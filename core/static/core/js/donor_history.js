@@ -0,0 +1,25 @@
+// Infinite scroll: fetch the next page of history when its "Load older"
+// link nears the viewport. Without JS the link loads it as a full page.
+(function () {
+    const container = document.getElementById('donation-history');
+    if (!container || !('IntersectionObserver' in window)) return;
+    const observer = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (!entry.isIntersecting) return;
+            const more = entry.target;
+            observer.unobserve(more);
+            fetch(more.dataset.next, { credentials: 'same-origin' })
+                .then(response => response.ok ? response.text() : Promise.reject(response.status))
+                .then(html => {
+                    more.insertAdjacentHTML('afterend', html);
+                    more.remove();
+                    watch();
+                })
+                .catch(() => {});
+        });
+    }, { rootMargin: '400px' });
+    function watch() {
+        container.querySelectorAll('.history-more').forEach(more => observer.observe(more));
+    }
+    watch();
+})();
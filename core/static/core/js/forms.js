@@ -0,0 +1,18 @@
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('[data-bs-toggle="popover"]').forEach(function (popoverTriggerEl) {
+        new bootstrap.Popover(popoverTriggerEl, { container: 'body' });
+    });
+
+    // Eye icons next to password fields show or hide the input named in
+    // their data-password-input attribute.
+    document.querySelectorAll('[data-password-input]').forEach(function (toggleButton) {
+        const passwordInput = document.getElementById(toggleButton.dataset.passwordInput);
+        if (!passwordInput) return;
+        toggleButton.addEventListener('click', function () {
+            const type = passwordInput.getAttribute('type') === 'password' ? 'text' : 'password';
+            passwordInput.setAttribute('type', type);
+            this.classList.toggle('fa-eye', type === 'password');
+            this.classList.toggle('fa-eye-slash', type !== 'password');
+        });
+    });
+});
@@ -0,0 +1,65 @@
+document.addEventListener('DOMContentLoaded', function () {
+    // Chart data is embedded by the template with json_script.
+    function data(id) {
+        return JSON.parse(document.getElementById(id).textContent);
+    }
+
+    const topDonorsData = {
+        labels: data('donor-labels'),
+        datasets: [{
+            label: 'Donations Made',
+            data: data('donor-counts'),
+            backgroundColor: '#28a745',
+        }]
+    };
+    const topDonorsCtx = document.getElementById('topDonorsChart').getContext('2d');
+    new Chart(topDonorsCtx, {
+        type: 'bar',
+        data: topDonorsData,
+        options: {
+            indexAxis: 'y',
+            scales: {
+                x: { beginAtZero: true, ticks: { precision: 0 } }
+            },
+            plugins: { legend: { display: false } }
+        }
+    });
+
+    const timeData = {
+        labels: data('time-labels'),
+        datasets: [{
+            label: 'Donations Completed',
+            data: data('time-counts'),
+            backgroundColor: 'rgba(40, 167, 69, 0.1)',
+            borderColor: '#28a745',
+            borderWidth: 2,
+            fill: true,
+            tension: 0.1
+        }]
+    };
+    const timeCtx = document.getElementById('donationsOverTimeChart').getContext('2d');
+    const timeChart = new Chart(timeCtx, {
+        type: 'line',
+        data: timeData,
+        options: {
+            scales: { y: { beginAtZero: true, ticks: { precision: 0 } } },
+            plugins: { legend: { display: false } }
+        }
+    });
+
+    const rangeButtons = document.getElementById('timeRangeButtons');
+    rangeButtons.querySelectorAll('button').forEach(function (button) {
+        button.addEventListener('click', function () {
+            fetch(rangeButtons.dataset.url + '?range=' + button.dataset.range)
+                .then(function (response) { return response.json(); })
+                .then(function (series) {
+                    timeChart.data.labels = series.labels;
+                    timeChart.data.datasets[0].data = series.counts;
+                    timeChart.update();
+                    rangeButtons.querySelectorAll('button').forEach(function (other) {
+                        other.classList.toggle('active', other === button);
+                    });
+                });
+        });
+    });
+});
@@ -0,0 +1,34 @@
+// Suggestions for the feed's search boxes. Each input with data-suggest
+// fills its datalist from the typeahead endpoint as the user types; answers
+// are kept per prefix so backspacing costs no request.
+(function () {
+    const url = document.currentScript.dataset.url;
+    document.querySelectorAll('[data-suggest]').forEach(input => {
+        const list = document.getElementById(input.getAttribute('list'));
+        const answers = new Map();
+        let timer = null;
+        function show(suggestions) {
+            list.replaceChildren(...suggestions.map(text => {
+                const option = document.createElement('option');
+                option.value = text;
+                return option;
+            }));
+        }
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (!query) return show([]);
+            if (answers.has(query)) return show(answers.get(query));
+            timer = setTimeout(() => {
+                const params = new URLSearchParams({ field: input.dataset.suggest, q: query });
+                fetch(`${url}?${params}`, { credentials: 'same-origin' })
+                    .then(response => response.ok ? response.json() : Promise.reject(response.status))
+                    .then(data => {
+                        answers.set(query, data.suggestions);
+                        if (input.value.trim() === query) show(data.suggestions);
+                    })
+                    .catch(() => {});
+            }, 120);
+        });
+    });
+})();
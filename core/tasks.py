@@ -0,0 +1,44 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Fire-and-forget side effects (notification rows, emails) run on a small
+# per-process thread pool so the request that triggered them can respond
+# first. Tasks are best effort: a task still queued when the process dies is
+# lost, so nothing that must happen belongs here.
+_executor = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    # Created on first use rather than at import, so a preloading server
+    # (gunicorn --preload) does not fork a parent's dead worker threads.
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASK_WORKERS, thread_name_prefix='background-task'
+            )
+        return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", func.__qualname__)
+    finally:
+        if not settings.BACKGROUND_TASKS_EAGER:
+            connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    if settings.BACKGROUND_TASKS_EAGER:
+        _run(func, args, kwargs)
+    else:
+        _pool().submit(_run, func, args, kwargs)
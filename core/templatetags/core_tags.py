@@ -0,0 +1,36 @@
+import uuid
+
+from django import template
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+
+from core import photos
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_key_input():
+    return format_html('<input type="hidden" name="idempotency_key" value="{}">', uuid.uuid4().hex)
+
+
+@register.simple_tag
+def donation_photo(donation, sizes='100vw', css_class=''):
+    """A lazily loaded <picture> of the donation's thumbnails, or nothing until they exist."""
+    files = donation.thumbnails.get('files')
+    if not files:
+        return ''
+
+    def url(name):
+        return reverse('donation_photo', args=[donation.id, name])
+
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (photos.MIME_TYPES[fmt], ', '.join(f'{url(name)} {w}w' for name, w, _ in by_size.values()), sizes)
+        for fmt, by_size in files.items()
+    ))
+    fallback = files['webp']['small'][0] if 'webp' in files else next(iter(files.values()))['small'][0]
+    return format_html(
+        '<picture>{}<img src="{}" width="{}" height="{}" alt="{}" class="{}" loading="lazy" decoding="async"></picture>',
+        sources, url(fallback), donation.thumbnails['width'], donation.thumbnails['height'],
+        donation.food_item, css_class,
+    )
@@ -1,12 +1,50 @@
+import gzip
+import importlib
+import io
+import json
+import shutil
+import smtplib
+import tempfile
 import time
+import threading
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from asgiref.sync import sync_to_async
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from django.apps import apps
+from django.contrib import admin as django_admin
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
+from django.conf import settings
 from django.contrib.auth.models import User
-from core.models import UserProfile, Donation, Review
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+from core import (
+    addresses, allocation, events, leaderboard, lifecycle, matching, metrics, notifications, pagination, photos,
+    profiles, reputation, routing, storage, throttling, timeseries, typeahead, warmup, webhooks,
+)
+from core.management.commands.explain_hot_queries import hot_queries
+from core.middleware import ProfilingMiddleware
+from core.models import UserProfile, Donation, Review, Notification, LeaderboardEntry, ImpactBucket, PickupSite
+from core.models import ContactMessage
+from core.models import WebhookSubscription, WebhookDelivery, WebhookDeadLetter, DonationEvent
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.edge.service import Service
 from django.utils import timezone
-from django.db.models import Avg
+from django.db.models import Avg, Sum
+from PIL import Image
+import numpy as np
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
@@ -161,3 +199,864 @@ class TestE2EWorkflows(StaticLiveServerTestCase):
         claim_button.click()
 
         self.assertIn("Claimed", self.driver.page_source)
+
+
+class DonationFixtures:
+    # One approved donor, ``ngo_count`` approved NGOs and one available donation.
+    ngo_count = 3
+
+    def setUp(self):
+        # Table flushes between tests send no signals, so drop per-process caches by hand.
+        webhooks.forget_subscriptions()
+        addresses._site_ids.clear()
+        # No passwords: the clients use force_login, so skip PBKDF2.
+        self.donor = User.objects.create_user(username='donor', email='donor@test.com')
+        UserProfile.objects.create(user=self.donor, role='donor', phone_number='1111111111', is_approved=True)
+        self.ngos = []
+        for i in range(self.ngo_count):
+            ngo = User.objects.create_user(username=f'ngo{i}', email=f'ngo{i}@test.com')
+            UserProfile.objects.create(user=ngo, role='ngo', phone_number='2222222222', is_approved=True)
+            self.ngos.append(ngo)
+        self.donation = Donation.objects.create(
+            donor=self.donor,
+            food_item="Contested Meal",
+            category="cooked",
+            quantity="20",
+            pickup_location="Main Canteen",
+            pickup_by=timezone.now() + timedelta(hours=4),
+        )
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def run_in_parallel(self, calls):
+        # Every worker waits on the barrier so the requests genuinely overlap.
+        barrier = threading.Barrier(len(calls))
+
+        def run(call):
+            barrier.wait()
+            try:
+                return call()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            return list(pool.map(run, calls))
+
+
+class DonationLifecycleConcurrencyTests(DonationFixtures, TransactionTestCase):
+    ngo_count = workers = 8
+
+    def test_parallel_claims_have_exactly_one_winner(self):
+        url = f"/claim-donation/{self.donation.id}/"
+        clients = [self.client_for(ngo) for ngo in self.ngos]
+        responses = self.run_in_parallel([lambda c=c: c.get(url) for c in clients])
+
+        self.assertTrue(all(response.status_code == 302 for response in responses))
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'claimed')
+        self.assertIn(self.donation.claimed_by, self.ngos)
+        self.assertEqual(Notification.objects.filter(user=self.donor).count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_parallel_completions_count_once(self):
+        lifecycle.claim(self.donation.id, self.ngos[0])
+        url = f"/complete-donation/{self.donation.id}/"
+        clients = [self.client_for(self.donor) for _ in range(self.workers)]
+        self.run_in_parallel([lambda c=c: c.get(url) for c in clients])
+
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'completed')
+        self.assertEqual(LeaderboardEntry.objects.get(board='all', user=self.donor).count, 1)
+        self.assertEqual(ImpactBucket.objects.get(resolution='day').count, 1)
+        self.assertEqual(Notification.objects.filter(user=self.ngos[0]).count(), 1)
+
+    def statements(self, queries):
+        # Transaction control shows up as queries on some backends only.
+        return [q['sql'] for q in queries if q['sql'].split()[0] not in ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')]
+
+    def test_transition_round_trips(self):
+        webhooks.active_subscriptions()  # memoized per process; none here, so no outbox INSERT
+        # One conditional UPDATE, one SELECT and the event log INSERT for the winner...
+        with CaptureQueriesContext(connection) as queries:
+            lifecycle.claim(self.donation.id, self.ngos[0])
+        self.assertEqual(len(self.statements(queries)), 3)
+        # ...and for a loser the failed UPDATE plus the SELECT explaining why.
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(lifecycle.TransitionConflict):
+                lifecycle.claim(self.donation.id, self.ngos[1])
+        self.assertEqual(len(self.statements(queries)), 2)
+
+    def test_double_submitted_review_is_stored_once(self):
+        lifecycle.claim(self.donation.id, self.ngos[0])
+        lifecycle.complete(self.donation.id, self.donor)
+        url = f"/add-review/{self.donation.id}/"
+        clients = [self.client_for(self.donor) for _ in range(self.workers)]
+        # Half replay the same form (same idempotency key), half are distinct submits.
+        posts = [
+            lambda c=c, i=i: c.post(url, {'rating': '5', 'comment': 'Great', 'idempotency_key': f'key-{i % 2}'})
+            for i, c in enumerate(clients)
+        ]
+        responses = self.run_in_parallel(posts)
+
+        self.assertTrue(all(response.status_code == 302 for response in responses))
+        self.assertEqual(Review.objects.filter(donation=self.donation, reviewer=self.donor).count(), 1)
+        self.assertEqual(Notification.objects.filter(user=self.ngos[0], message__contains='review').count(), 1)
+
+
+class AllocationTests(DonationFixtures, TransactionTestCase):
+    def test_allocation_round_assigns_interested_ngos(self):
+        Donation.objects.filter(id=self.donation.id).update(allocate_after=timezone.now() + timedelta(minutes=10))
+        responses = self.run_in_parallel([
+            lambda c=self.client_for(ngo): c.get(f"/claim-donation/{self.donation.id}/") for ngo in self.ngos[:3]
+        ])
+        self.assertTrue(all(response.status_code == 302 for response in responses))
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'available')
+        self.assertEqual(self.donation.interests.count(), 3)
+
+        self.assertEqual(allocation.allocate(now=timezone.now() + timedelta(minutes=11)), (1, 0))
+        self.donation.refresh_from_db()
+        self.assertEqual(self.donation.status, 'claimed')
+        self.assertIn(self.donation.claimed_by, self.ngos[:3])
+        self.assertIsNone(self.donation.allocate_after)
+        self.assertFalse(self.donation.interests.exists())
+
+
+class NotificationDigestTests(DonationFixtures, TestCase):
+    def test_claims_coalesce_into_one_notification_and_digest(self):
+        for i in range(3):
+            donation = Donation.objects.create(
+                donor=self.donor, food_item=f"Meal {i}", category="cooked", quantity="5",
+                pickup_location="Main Canteen", pickup_by=timezone.now() + timedelta(hours=4),
+            )
+            self.client_for(self.ngos[i]).get(f"/claim-donation/{donation.id}/")
+
+        notification = Notification.objects.get(user=self.donor)
+        self.assertEqual((notification.count, notification.message), (3, "3 of your donations were claimed."))
+        # The first claim is emailed at once; the two merged into it wait for the digest.
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(notifications.send_digests(), (1, 1))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(notifications.send_digests(), (0, 0))
+
+    def test_failed_digests_stay_pending(self):
+        for user in (self.donor, self.ngos[0]):
+            Notification.objects.create(user=user, kind='review', message="New review", email_pending=True)
+        send = LocmemEmailBackend.send_messages
+
+        def refuse_donor(backend, messages):
+            if messages[0].to == [self.donor.email]:
+                raise smtplib.SMTPRecipientsRefused({self.donor.email: (550, b'No such user')})
+            return send(backend, messages)
+
+        with mock.patch.object(LocmemEmailBackend, 'send_messages', refuse_donor):
+            with self.assertLogs('core.notifications', 'ERROR'):
+                self.assertEqual(notifications.send_digests(), (1, 1))
+        self.assertEqual([m.to for m in mail.outbox], [[self.ngos[0].email]])
+        self.assertEqual(list(Notification.objects.filter(email_pending=True).values_list('user', flat=True)), [self.donor.id])
+        self.assertIsNone(UserProfile.objects.get(user=self.donor).last_digest_at)
+        self.assertEqual(notifications.send_digests(), (1, 1))
+
+
+class DonationPhotoTests(DonationFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def photo(self, name='meal.jpg'):
+        upload = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        Image.new('RGB', (2000, 1500), 'orange').save(upload, 'JPEG', exif=exif)
+        upload.name = name
+        upload.seek(0)
+        return upload
+
+    def test_donation_photo_thumbnails_strip_metadata(self):
+        # Thumbnails are rendered once the post commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_for(self.donor).post('/donate/', {
+                'food_item': 'Photo Meal', 'category': 'cooked', 'quantity': '5', 'pickup_by': '2030-01-01T12:00',
+                'pickup_location': 'Main Canteen', 'photo': self.photo(),
+            })
+
+        donation = Donation.objects.get(food_item='Photo Meal')
+        name, width, height = donation.thumbnails['files']['webp']['medium']
+        self.assertEqual((width, height), (640, 480))
+        response = self.client_for(self.ngos[0]).get(f"/donations/{donation.id}/photo/{name}")
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+        thumbnail = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(dict(thumbnail.getexif()), {})
+
+    def test_sweep_renders_photos_whose_task_was_lost(self):
+        self.donation.photo.save('meal.jpg', self.photo())
+        self.assertEqual(list(photos.missing_thumbnails()), [self.donation.id])
+        out = io.StringIO()
+        call_command('render_thumbnails', stdout=out)
+        self.assertIn("Rendered thumbnails for 1 of 1 donations.", out.getvalue())
+        self.donation.refresh_from_db()
+        self.assertEqual(sorted(self.donation.thumbnails['files']), sorted(photos.FORMATS))
+        self.assertEqual(list(photos.missing_thumbnails()), [])
+
+    def test_uploads_are_refused_without_an_encoder(self):
+        with mock.patch.object(photos, 'FORMATS', []):
+            with self.assertRaises(ValidationError):
+                photos.validate(self.photo())
+            with self.assertRaises(CommandError):
+                call_command('render_thumbnails')
+
+
+class WebhookTests(DonationFixtures, TransactionTestCase):
+    # Delivery threads open their own connections, so rows must be committed.
+    def test_webhooks_are_signed_batched_and_dead_lettered(self):
+        received = []
+
+        class Receiver(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            status = 204
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                received.append((self.headers[webhooks.SIGNATURE_HEADER], body))
+                self.send_response(Receiver.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Receiver)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        subscription = WebhookSubscription.objects.create(
+            name='Partner', url=f'http://127.0.0.1:{server.server_port}/hooks', events=['donation.claimed'],
+        )
+
+        self.client_for(self.ngos[0]).get(f"/claim-donation/{self.donation.id}/")
+        self.assertEqual(webhooks.deliver_due(), (1, 0, 1))
+        header, body = received[0]
+        self.assertTrue(webhooks.verify(subscription.secret, header, body))
+        self.assertFalse(webhooks.verify('wrong', header, body))
+        [delivery] = json.loads(body)['deliveries']
+        self.assertEqual((delivery['event'], delivery['data']['claimed_by']), ('donation.claimed', 'ngo0'))
+        self.assertFalse(WebhookDelivery.objects.exists())
+
+        Receiver.status = 500
+        webhooks.emit('donation.claimed', Donation.objects.get(id=self.donation.id))
+        with override_settings(WEBHOOK_MAX_ATTEMPTS=1):
+            self.assertEqual(webhooks.deliver_due(), (0, 1, 1))
+        letter = WebhookDeadLetter.objects.get()
+        self.assertEqual(letter.last_error, 'HTTP 500')
+
+        # Requeued deliveries keep their id, so partners can deduplicate.
+        admin = User.objects.create_superuser('admin', 'admin@test.com', None)
+        self.client_for(admin).post('/admin/core/webhookdeadletter/', {
+            'action': 'requeue', '_selected_action': [letter.id],
+        })
+        requeued = WebhookDelivery.objects.get()
+        self.assertEqual((requeued.id, requeued.created_at), (letter.delivery_id, letter.created_at))
+        self.assertFalse(WebhookDeadLetter.objects.exists())
+
+    def test_a_claim_that_loses_queues_no_webhook(self):
+        WebhookSubscription.objects.create(name='Partner', url='http://127.0.0.1:9/hooks')
+        self.client_for(self.ngos[0]).get(f"/claim-donation/{self.donation.id}/")
+        self.client_for(self.ngos[1]).get(f"/claim-donation/{self.donation.id}/")
+        self.client_for(self.donor).get(f"/complete-donation/{self.donation.id}/")
+        self.assertEqual(
+            list(WebhookDelivery.objects.order_by('id').values_list('event', flat=True)),
+            ['donation.claimed', 'donation.completed'],
+        )
+
+    @override_settings(WEBHOOK_BATCH_SIZE=1, WEBHOOK_LEASE_SECONDS=120)
+    def test_long_passes_renew_the_lease(self):
+        WebhookSubscription.objects.create(name='Partner', url='http://127.0.0.1:9/hooks')
+        for _ in range(3):
+            webhooks.emit('donation.claimed', Donation.objects.get(id=self.donation.id))
+        start, clock, leases = timezone.now(), [0], []
+
+        def slow_send(pool, subscription, batch):
+            leases.append((WebhookDelivery.objects.get(id=batch[0].id).next_attempt_at - start).total_seconds())
+            clock[0] += 100  # each POST eats most of the lease
+
+        with mock.patch.object(webhooks, '_send', slow_send), \
+                mock.patch('core.webhooks.time.monotonic', lambda: clock[0]), \
+                mock.patch('core.webhooks.timezone.now', lambda: start + timedelta(seconds=clock[0])):
+            self.assertEqual(webhooks.deliver_due(), (3, 0, 3))
+        self.assertEqual(leases, [120, 220, 320])
+
+    def test_a_broken_subscription_fails_only_its_own_batch(self):
+        broken = WebhookSubscription.objects.create(name='Broken', url='http://127.0.0.1:notaport/hooks')
+        WebhookSubscription.objects.create(name='Partner', url='http://127.0.0.1:9/hooks')
+        webhooks.emit('donation.claimed', Donation.objects.get(id=self.donation.id))
+
+        real_send = webhooks._send
+
+        def send(pool, subscription, batch):
+            return None if subscription.name == 'Partner' else real_send(pool, subscription, batch)
+
+        with mock.patch.object(webhooks, '_send', send), self.assertLogs('core.webhooks', 'ERROR'):
+            self.assertEqual(webhooks.deliver_due(), (1, 0, 2))
+        failed = WebhookDelivery.objects.get()
+        self.assertEqual((failed.subscription_id, failed.attempts), (broken.id, 1))
+        self.assertTrue(failed.last_error.startswith('ValueError'))
+
+
+class MetricsTests(DonationFixtures, TestCase):
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_metrics_endpoint_counts_claims_and_caches_gauges(self):
+        cache.delete(metrics.GAUGE_CACHE_KEY)
+        claimed = metrics.claims.values.get(('claimed',), 0)
+        self.client_for(self.ngos[0]).get(f"/claim-donation/{self.donation.id}/")
+        self.client_for(self.ngos[1]).get(f"/claim-donation/{self.donation.id}/")
+
+        self.assertEqual(Client().get('/metrics').status_code, 403)
+        body = Client().get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+        self.assertIn(f'nowastemate_claims_total{{outcome="claimed"}} {claimed + 1}\n', body)
+        self.assertIn('nowastemate_claims_total{outcome="unavailable"}', body)
+        self.assertIn('nowastemate_donations{status="claimed"} 1\n', body)
+        self.assertIn('nowastemate_http_request_duration_seconds_count{view="claim_donation_alias",method="GET"}', body)
+        # The database gauges are cached, so a scrape within the TTL runs no query.
+        with CaptureQueriesContext(connection) as queries:
+            Client().get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(len(queries), 0)
+
+
+class TypeaheadTests(DonationFixtures, TestCase):
+    def test_typeahead_follows_posts_claims_and_deadlines(self):
+        typeahead._index = None
+        self.addCleanup(setattr, typeahead, '_index', None)
+        ngo = self.client_for(self.ngos[0])
+
+        def suggest(field, q):
+            return ngo.get('/donations/suggest/', {'field': field, 'q': q}).json()['suggestions']
+
+        self.assertEqual(suggest('food', 'conte'), ['Contested Meal'])
+        self.assertEqual(suggest('location', 'CANT'), ['Main Canteen'])
+
+        self.client_for(self.donor).post('/donate/', {
+            'food_item': 'Veg  Fried Rice', 'category': 'cooked', 'quantity': '5', 'pickup_by': '2030-01-01T12:00',
+            'pickup_location': 'North Hostel, Block B',
+        })
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(typeahead.suggest('food', 'fri'), ['Veg Fried Rice'])
+            self.assertEqual(typeahead.suggest('location', 'block b'), ['North Hostel, Block B'])
+        self.assertEqual(len(queries), 0)
+        feed = ngo.get('/donations/', {'keyword': 'Veg Fried Rice'})
+        self.assertEqual([d.food_item for d in feed.context['donations']], ['Veg  Fried Rice'])
+
+        ngo.get(f"/claim-donation/{self.donation.id}/")
+        self.assertEqual(suggest('food', 'conte'), [])
+        typeahead.note_available(Donation(
+            id=10**6, food_item='Stale Bread', pickup_location='Gate', pickup_by=timezone.now() - timedelta(minutes=1),
+        ))
+        self.assertEqual(typeahead.suggest('food', 'stale'), [])
+
+    def test_rebuild_keeps_updates_made_during_the_build(self):
+        typeahead._index = None
+        self.addCleanup(setattr, typeahead, '_index', None)
+        build = typeahead.build
+        later = timezone.now() + timedelta(days=1)
+
+        def racing_build():
+            index = build()
+            # Committed after the build's query ran.
+            typeahead.note_available(Donation(id=10**6, food_item='Fresh Naan', pickup_location='Gate', pickup_by=later))
+            typeahead.note_unavailable(self.donation.id)
+            return index
+
+        with mock.patch.object(typeahead, 'build', racing_build):
+            typeahead.rebuild()
+        self.assertEqual(typeahead.suggest('food', 'naan'), ['Fresh Naan'])
+        self.assertEqual(typeahead.suggest('food', 'conte'), [])
+
+
+class DonationEventLogTests(DonationFixtures, TestCase):
+    @override_settings(DONATION_EVENT_SETTLE_SECONDS=0)
+    def test_event_log_tails_and_replays(self):
+        self.client_for(self.ngos[0]).get(f"/claim-donation/{self.donation.id}/")
+        self.client_for(self.donor).get(f"/complete-donation/{self.donation.id}/")
+        self.client_for(self.ngos[1]).get(f"/claim-donation/{self.donation.id}/")  # loses: no event
+        self.assertEqual(
+            list(DonationEvent.objects.order_by('id').values_list('kind', 'actor_id')),
+            [('claimed', self.ngos[0].id), ('completed', self.donor.id)],
+        )
+
+        seen = []
+        self.assertEqual(events.consume('test', seen.extend, batch_size=1), 2)
+        self.assertEqual(events.consume('test', seen.extend), 0)
+        self.assertEqual([event.kind for event in seen], ['claimed', 'completed'])
+
+        buckets = sorted(ImpactBucket.objects.values_list('resolution', 'start', 'count'))
+        entries = sorted(LeaderboardEntry.objects.values_list('board', 'user_id', 'count'))
+        ImpactBucket.objects.all().delete()
+        LeaderboardEntry.objects.all().delete()
+        self.assertEqual(events.replay(), (3, 3))
+        self.assertEqual(sorted(ImpactBucket.objects.values_list('resolution', 'start', 'count')), buckets)
+        self.assertEqual(sorted(LeaderboardEntry.objects.values_list('board', 'user_id', 'count')), entries)
+        # The donation predates the log, so only its posting is backfilled.
+        self.assertEqual(events.backfill(), 1)
+        self.assertEqual(events.backfill(), 0)
+
+        # A completion from before the log would vanish from the rebuilt history.
+        Donation.objects.create(
+            donor=self.donor, food_item="Old Meal", category="cooked", quantity="5", pickup_location="Main Canteen",
+            pickup_by=timezone.now(), status='completed', claimed_at=timezone.now(), completed_at=timezone.now(),
+        )
+        with self.assertRaises(events.IncompleteLog):
+            events.replay()
+        with self.assertRaisesMessage(CommandError, '--backfill'):
+            call_command('replay_donation_events', stdout=io.StringIO())
+        call_command('replay_donation_events', '--backfill', stdout=io.StringIO())
+        self.assertFalse(events.unlogged_completions().exists())
+
+
+class ArchiveTests(DonationFixtures, TestCase):
+    def test_archiving_goes_by_completion_date(self):
+        long_ago = timezone.now() - timedelta(days=200)
+        Donation.objects.filter(id=self.donation.id).update(
+            status='completed', created_at=long_ago, completed_at=timezone.now() - timedelta(days=1),
+        )
+        old = Donation.objects.create(
+            donor=self.donor, food_item="Old Meal", category="cooked", quantity="5",
+            pickup_location="Main Canteen", pickup_by=long_ago, status='completed', completed_at=long_ago,
+        )
+        call_command('archive_donations', stdout=io.StringIO())
+        self.assertEqual(list(Donation.objects.archived().values_list('id', flat=True)), [old.id])
+        page = self.client_for(self.donor).get('/dashboard/')
+        self.assertEqual([d.id for d in page.context['donations']], [self.donation.id])
+
+
+class MatchingTests(DonationFixtures, TestCase):
+    def test_nearby_sites_rank_first_and_donor_share_stands_in_without_coordinates(self):
+        near = PickupSite.objects.create(normalized_address='near', address='Near', latitude=12.97, longitude=77.59)
+        far = PickupSite.objects.create(normalized_address='far', address='Far', latitude=13.30, longitude=77.90)
+        Donation.objects.filter(id=self.donation.id).update(
+            status='completed', claimed_by=self.ngos[0], pickup_site=near, pickup_by=timezone.now() - timedelta(hours=1),
+        )
+        other_donor = User.objects.create_user(username='other', email='other@test.com')
+        UserProfile.objects.create(user=other_donor, role='donor', phone_number='3333333333', is_approved=True)
+
+        def post(donor, site):
+            return Donation.objects.create(
+                donor=donor, food_item="Meal", category="cooked", quantity="5", pickup_location="x",
+                pickup_site=site, pickup_by=timezone.now() + timedelta(hours=4),
+            ).id
+
+        # Same donor, far away, against another donor next door: distance wins.
+        far_id, near_id = post(self.donor, far), post(other_donor, near)
+        ranked = [d for _, d in matching.refresh([self.ngos[0].id])[self.ngos[0].id]]
+        self.assertEqual(ranked, [near_id, far_id])
+
+        # Without coordinates the NGO's history with the donor decides.
+        PickupSite.objects.update(latitude=None, longitude=None)
+        ranked = [d for _, d in matching.refresh([self.ngos[0].id])[self.ngos[0].id]]
+        self.assertEqual(ranked, [far_id, near_id])
+
+    def test_updates_skip_a_lock_held_elsewhere_and_leave_it_alone(self):
+        cache.set(matching.LOCK_KEY, 'other-process', 60)
+        self.addCleanup(cache.delete, matching.LOCK_KEY)
+        with mock.patch.object(matching, 'LOCK_SECONDS', 0.05), self.assertLogs('core.matching', 'WARNING'):
+            with matching._locked() as acquired:
+                self.assertFalse(acquired)
+        self.assertEqual(cache.get(matching.LOCK_KEY), 'other-process')
+        cache.delete(matching.LOCK_KEY)
+        with matching._locked() as acquired:
+            self.assertTrue(acquired)
+        self.assertIsNone(cache.get(matching.LOCK_KEY))
+
+
+class SeedTests(TestCase):
+    def test_seeding_is_deterministic_and_fills_the_rollups(self):
+        def seed(prefix):
+            call_command('seed', donors=4, ngos=2, donations=60, notifications=10, prefix=prefix, stdout=io.StringIO())
+            donations = Donation.objects.filter(donor__username__startswith=f'{prefix}-').order_by('id')
+            return list(donations.values_list('food_item', 'category', 'status'))
+
+        first = seed('a')
+        self.assertEqual(len(first), 60)
+        self.assertEqual(seed('b'), first)
+        completed = Donation.objects.filter(status='completed').count()
+        self.assertEqual(LeaderboardEntry.objects.filter(board='all').aggregate(n=Sum('count'))['n'], completed)
+        self.assertEqual(ImpactBucket.objects.filter(resolution='day').aggregate(n=Sum('count'))['n'], completed)
+
+
+class ProfilingMiddlewareTests(DonationFixtures, TestCase):
+    def test_staff_can_ask_for_a_profile(self):
+        output_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, output_dir)
+        with override_settings(PROFILING_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: HttpResponse())
+
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=output_dir):
+            middleware = ProfilingMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/feed/', {'_profile': 'cprofile'})
+        request.user = self.donor
+        self.assertNotIn('X-Profile-Output', middleware(request))
+        self.assertEqual(list(output_dir.iterdir()), [])
+
+        self.donor.is_staff = True
+        name = middleware(request)['X-Profile-Output']
+        self.assertEqual(sorted(p.name for p in output_dir.iterdir()), [f'{name}.prof', f'{name}.txt'])
+        self.assertTrue((output_dir / f'{name}.txt').read_text().startswith('GET /feed/?_profile=cprofile took'))
+
+
+class PickupSiteTests(DonationFixtures, TestCase):
+    def test_addresses_normalize_to_one_site(self):
+        self.assertEqual(addresses.normalize_address('  Opp. Main  Bldg, MG Rd '), 'opposite main building mg road')
+        self.assertEqual(addresses.normalize_text('Main St.'), 'main st')
+        with self.captureOnCommitCallbacks(execute=True):
+            site_id = addresses.site_for('12, MG Rd')
+        self.assertEqual(addresses.site_for('12 mg road'), site_id)
+        self.assertIsNone(addresses.site_for(' ,; '))
+        self.assertEqual(PickupSite.objects.get(id=site_id).address, '12, MG Rd')
+
+    def test_location_search_matches_partial_words_and_rows_without_a_site(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            site_id = addresses.site_for('4 North St, Gate 2')
+        sited = Donation.objects.create(
+            donor=self.donor, food_item="Bread", category="bakery", quantity="5", pickup_location="4 North St, Gate 2",
+            pickup_site_id=site_id, pickup_by=timezone.now() + timedelta(hours=4),
+        )
+        ngo = self.client_for(self.ngos[0])
+
+        def found(location):
+            return [d.id for d in ngo.get('/donations/', {'location': location}).context['donations']]
+
+        self.assertEqual(found('no'), [sited.id])  # not expanded to "number"
+        self.assertEqual(found('North Street'), [sited.id])
+        self.assertEqual(found('North St Gate'), [sited.id])  # a whole abbreviation mid-term
+        self.assertEqual(found('canteen'), [self.donation.id])  # no pickup_site yet
+
+
+class ImpactSeriesTests(DonationFixtures, TestCase):
+    def test_completions_roll_up_into_local_buckets(self):
+        def local(*args):
+            return timezone.make_aware(datetime(*args))
+
+        # 23:30 UTC on Jan 31 is already Feb 1 in Kolkata.
+        completions = [local(2025, 1, 31, 9, 15), local(2025, 1, 31, 9, 45), datetime(2025, 1, 31, 23, 30, tzinfo=dt_timezone.utc)]
+        for when in completions:
+            Donation.objects.create(
+                donor=self.donor, food_item="Meal", category="cooked", quantity="5", pickup_location="x",
+                pickup_by=when, status='completed', completed_at=when,
+            )
+            timeseries.record_completion(when)
+
+        self.assertEqual(timeseries.series('hour', local(2025, 1, 31, 8), local(2025, 1, 31, 10)), [
+            (local(2025, 1, 31, 8), 0), (local(2025, 1, 31, 9), 2), (local(2025, 1, 31, 10), 0),
+        ])
+        self.assertEqual(timeseries.series('day', local(2025, 1, 30), local(2025, 2, 1)), [
+            (local(2025, 1, 30), 0), (local(2025, 1, 31), 2), (local(2025, 2, 1), 1),
+        ])
+        self.assertEqual(timeseries.series('month', local(2024, 12, 15), local(2025, 2, 15)), [
+            (local(2024, 12, 1), 0), (local(2025, 1, 1), 2), (local(2025, 2, 1), 1),
+        ])
+        self.assertEqual(timeseries.step(local(2025, 1, 1), 'month', -2), local(2024, 11, 1))
+
+        incremental = sorted(ImpactBucket.objects.values_list('resolution', 'start', 'count'))
+        self.assertEqual(timeseries.rebuild(), len(incremental))
+        self.assertEqual(sorted(ImpactBucket.objects.values_list('resolution', 'start', 'count')), incremental)
+        # The migration that adds the table fills it the same way.
+        ImpactBucket.objects.all().delete()
+        importlib.import_module('core.migrations.0008_impact_time_series').fill_impact_buckets(apps, None)
+        self.assertEqual(sorted(ImpactBucket.objects.values_list('resolution', 'start', 'count')), incremental)
+
+
+class LeaderboardTests(DonationFixtures, TestCase):
+    def test_completions_update_every_board_and_rebuild_agrees(self):
+        rival = User.objects.create_user(username='rival', email='rival@test.com')
+        UserProfile.objects.create(user=rival, role='donor', phone_number='3333333333', is_approved=True)
+        for donor, category in [(rival, 'bakery'), (rival, 'cooked'), (self.donor, 'cooked')]:
+            donation = Donation.objects.create(
+                donor=donor, food_item="Meal", category=category, quantity="5", pickup_location="x",
+                pickup_by=timezone.now(), status='completed', completed_at=timezone.now(),
+            )
+            leaderboard.record_completion(donation)
+
+        def board(name):
+            return [(entry.user.username, entry.count) for entry in leaderboard.top(name)]
+
+        self.assertEqual(board(leaderboard.ALL_TIME), [('rival', 2), ('donor', 1)])
+        self.assertEqual(board(leaderboard.month_board(timezone.now())), [('rival', 2), ('donor', 1)])
+        self.assertEqual(board(leaderboard.category_board('cooked')), [('donor', 1), ('rival', 1)])
+        self.assertEqual(leaderboard.total_completed(), 3)
+        entries = sorted(LeaderboardEntry.objects.values_list('board', 'user_id', 'count'))
+        leaderboard.rebuild()
+        self.assertEqual(sorted(LeaderboardEntry.objects.values_list('board', 'user_id', 'count')), entries)
+        LeaderboardEntry.objects.all().delete()
+        importlib.import_module('core.migrations.0009_leaderboardentry').fill_leaderboards(apps, None)
+        self.assertEqual(sorted(LeaderboardEntry.objects.values_list('board', 'user_id', 'count')), entries)
+
+
+class WarmupTests(TestCase):
+    def test_warm_up_compiles_every_url_and_template(self):
+        self.assertGreaterEqual(warmup.warm_urls(), len(get_resolver().url_patterns))
+        templates = list((Path(__file__).parent / 'templates').rglob('*.html'))
+        self.assertGreaterEqual(warmup.warm_templates(), len(templates))
+
+
+class ContactThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_refills_over_time(self):
+        with mock.patch('core.throttling.time.time', return_value=1000.0) as clock:
+            self.assertEqual([throttling.allow('test', 'a', 2, 60) for _ in range(3)], [True, True, False])
+            self.assertTrue(throttling.allow('test', 'b', 2, 60))  # buckets are per key
+            clock.return_value = 1029.0
+            self.assertFalse(throttling.allow('test', 'a', 2, 60))
+            clock.return_value = 1060.0
+            self.assertTrue(throttling.allow('test', 'a', 2, 60))
+
+    def test_client_ip_takes_the_address_our_proxy_saw(self):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='6.6.6.6, 10.1.1.1, 10.2.2.2', REMOTE_ADDR='10.9.9.9')
+        with override_settings(TRUSTED_PROXY_HOPS=0):
+            self.assertEqual(throttling.client_ip(request), '10.9.9.9')
+        with override_settings(TRUSTED_PROXY_HOPS=1):
+            self.assertEqual(throttling.client_ip(request), '10.2.2.2')
+        with override_settings(TRUSTED_PROXY_HOPS=2):
+            self.assertEqual(throttling.client_ip(request), '10.1.1.1')
+        with override_settings(TRUSTED_PROXY_HOPS=4):
+            self.assertEqual(throttling.client_ip(request), '10.9.9.9')
+
+    @override_settings(CONTACT_THROTTLE_BURST=3)
+    def test_contact_form_drops_resubmissions_and_limits_acknowledgements(self):
+        def post(email, message='Do you collect on Sundays?'):
+            return self.client.post('/contact/', {'name': 'Asha', 'email': email, 'subject': 'Pickups', 'message': message})
+
+        post('a@example.com')
+        post('b@example.com')  # same text from another address
+        post('a@example.com', message='Another question')
+        self.assertEqual(ContactMessage.objects.count(), 2)
+        self.assertEqual([m.to for m in mail.outbox], [['a@example.com']])
+        self.assertEqual(post('c@example.com', message='Third').status_code, 429)
+
+
+class ExplainHotQueriesTests(DonationFixtures, TestCase):
+    def test_every_hot_query_is_explained(self):
+        out = io.StringIO()
+        call_command('explain_hot_queries', stdout=out)
+        lines = out.getvalue().splitlines()
+        names = [name for name, _ in hot_queries(self.donor, self.ngos[0])]
+        self.assertEqual([line.split(':')[0] for line in lines if line.split(':')[0] in names], names)
+        self.assertRegex(lines[-1], rf"^\d+ of {len(names)} queries scan a table \({connection.vendor}\)\.$")
+
+
+class KeysetPaginationTests(DonationFixtures, TestCase):
+    def test_pages_cover_ties_once_and_cursors_round_trip(self):
+        stamp = timezone.now() - timedelta(days=1)
+        for i in range(6):
+            Donation.objects.create(
+                donor=self.donor, food_item=f"Meal {i}", category="cooked", quantity="5", pickup_location="x",
+                pickup_by=stamp,
+            )
+        # All but the newest row share one created_at, so the id breaks the ties.
+        Donation.objects.exclude(food_item="Meal 5").filter(donor=self.donor).update(created_at=stamp)
+        expected = list(Donation.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        seen, position = [], None
+        while True:
+            rows, cursor = pagination.keyset_page(Donation.objects.all(), position, 2)
+            seen += [row.id for row in rows]
+            if cursor is None:
+                break
+            position = pagination.decode_cursor(cursor)
+            self.assertEqual(position, (rows[-1].created_at, rows[-1].id))
+        self.assertEqual(seen, expected)
+
+        for raw in ['', 'garbage', 'not-a-date|3', f'{stamp.isoformat()}|x', None]:
+            self.assertIsNone(pagination.decode_cursor(raw))
+        donor = self.client_for(self.donor)
+        self.assertEqual(donor.get('/dashboard/history/', {'before': 'garbage'}).status_code, 404)
+        page = donor.get('/dashboard/', {'before': pagination.encode_cursor(Donation.objects.get(id=expected[1]))})
+        self.assertEqual([d.id for d in page.context['donations']], expected[2:2 + settings.DASHBOARD_PAGE_SIZE])
+
+
+class ReputationTests(TestCase):
+    def test_completion_rates_smoothed_and_recency_weighted_ratings(self):
+        now = timezone.now()
+        t, day, nan = now.timestamp(), 86400, float('nan')
+        donations = {
+            'donor': np.array([1, 1, 1]),
+            'ngo': np.array([2, 2, -1]),  # the last one was never claimed
+            'completed': np.array([True, False, False]),
+            'claimed_at': np.array([t - 7200, t, nan]),
+            'completed_at': np.array([t, nan, nan]),
+        }
+        reviews = {
+            'reviewed': np.array([2, 2, 3]),
+            'rating': np.array([5.0, 1.0, 4.0]),
+            'created_at': np.array([t, t - 30 * day, t]),
+        }
+        metrics = reputation.compute(donations, reviews, 4, now, prior_weight=2, half_life_days=30)
+
+        donor, ngo = metrics['donor'], metrics['ngo']
+        self.assertAlmostEqual(donor['completion_rate'][1], 1 / 3)
+        self.assertAlmostEqual(ngo['completion_rate'][2], 1 / 2)
+        self.assertAlmostEqual(ngo['avg_completion_hours'][2], 2.0)
+        self.assertTrue(np.isnan(ngo['completion_rate'][3]))
+
+        prior = 10 / 3  # site-wide mean rating
+        self.assertAlmostEqual(ngo['bayesian_rating'][2], (2 * prior + 6) / 4)
+        self.assertAlmostEqual(ngo['bayesian_rating'][3], (2 * prior + 4) / 3)
+        self.assertAlmostEqual(ngo['bayesian_rating'][1], prior)
+        # The month-old 1-star review counts half as much as today's 5 stars.
+        self.assertAlmostEqual(ngo['recent_rating'][2], (5 + 0.5 * 1) / 1.5)
+        self.assertTrue(np.isnan(ngo['recent_rating'][1]))
+
+
+class AsyncLifecycleViewTests(DonationFixtures, TestCase):
+    async def test_claim_responds_before_its_side_effects_run(self):
+        queued = []
+        ngo, donor = AsyncClient(), AsyncClient()
+        await sync_to_async(ngo.force_login)(self.ngos[0])
+        await sync_to_async(donor.force_login)(self.donor)
+        with mock.patch('core.views.tasks.submit', lambda func, *args: queued.append((func, args))):
+            self.assertEqual((await donor.get(f"/claim-donation/{self.donation.id}/")).status_code, 302)
+            self.assertEqual((await ngo.get("/claim-donation/999999/")).status_code, 404)
+            response = await ngo.get(f"/claim-donation/{self.donation.id}/")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(await Notification.objects.acount(), 0)
+        self.assertEqual([func.__name__ for func, _ in queued], ['_announce_claim'])
+        func, args = queued[0]
+        await sync_to_async(func)(*args)
+        self.assertEqual(await Notification.objects.filter(user=self.donor).acount(), 1)
+
+
+class ProfileCacheTests(DonationFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        profiles._profiles.clear()
+
+    def test_saves_invalidate_and_other_writes_expire(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(profiles.role(self.donor), 'donor')
+            self.assertEqual(profiles.role(self.donor), 'donor')
+
+        profile = self.donor.userprofile
+        profile.digest_frequency = 'daily'
+        profile.save()
+        self.assertEqual(profiles.lookup(self.donor).digest_frequency, 'daily')
+
+        # A bulk update sends no signal, so only the TTL catches it.
+        UserProfile.objects.filter(user=self.donor).update(is_approved=False)
+        self.assertTrue(profiles.lookup(self.donor).is_approved)
+        later = time.monotonic() + settings.PROFILE_CACHE_TTL + 1
+        with mock.patch('core.lru.time.monotonic', return_value=later):
+            self.assertEqual(profiles.stats()['size'], 0)
+            self.assertFalse(profiles.lookup(self.donor).is_approved)
+            self.assertEqual(profiles.stats()['size'], 1)
+
+    def test_posting_reads_the_rating_from_the_cache(self):
+        donor = self.client_for(self.donor)
+        profiles.lookup(self.donor)
+        with CaptureQueriesContext(connection) as queries:
+            donor.post('/donate/', {
+                'food_item': 'Rice', 'category': 'cooked', 'quantity': '5', 'pickup_by': '2030-01-01T12:00',
+                'pickup_location': 'Main Canteen',
+            })
+        self.assertTrue(Donation.objects.filter(food_item='Rice').exists())
+        self.assertFalse([q for q in queries if 'FROM "core_userprofile"' in q['sql']])
+
+
+class StaticFilesTests(TestCase):
+    def test_collectstatic_writes_hashed_and_precompressed_copies(self):
+        static_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, static_root)
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'core.storage.PrecompressedManifestStaticFilesStorage'},
+        }
+        with override_settings(STATIC_ROOT=static_root, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            hashed = staticfiles_storage.stored_name('core/css/base.css')
+        self.assertRegex(hashed, r'^core/css/base\.[0-9a-f]{12}\.css$')
+        original = (static_root / hashed).read_bytes()
+        self.assertEqual(gzip.decompress((static_root / f'{hashed}.gz').read_bytes()), original)
+        small = [path for path in static_root.rglob('*.css') if path.stat().st_size < storage.MIN_SIZE]
+        self.assertTrue(small)
+        self.assertFalse([path for path in small if path.with_name(path.name + '.gz').exists()])
+
+
+class AdminSearchTests(DonationFixtures, TestCase):
+    def test_notification_search_matches_user_or_message_prefix_and_ids(self):
+        admin = User.objects.create_superuser('admin', 'admin@test.com', None)
+        pickup = Notification.objects.create(user=self.ngos[0], message="Pickup reminder for Contested Meal")
+        claimed = Notification.objects.create(user=self.donor, message="Your donation was claimed")
+        client = self.client_for(admin)
+
+        def found(term):
+            page = client.get('/admin/core/notification/', {'q': term})
+            return sorted(n.id for n in page.context['cl'].result_list)
+
+        self.assertEqual(found('pickup'), [pickup.id])
+        self.assertEqual(found('DONOR'), [claimed.id])
+        self.assertEqual(found('reminder'), [])  # prefixes only, so the index applies
+        self.assertEqual(found(str(claimed.id)), [claimed.id])
+
+        # Related matches go in as a subquery: one statement, nothing truncated.
+        notification_admin = django_admin.site._registry[Notification]
+        results, _ = notification_admin.get_search_results(None, Notification.objects.all(), 'donor')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual([n.id for n in results], [claimed.id])
+        self.assertEqual(len(queries), 1)
+
+
+class RoutingTests(DonationFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        routing._matrices.clear()
+
+    def test_two_opt_never_lengthens_and_keeps_the_start(self):
+        rng = np.random.default_rng(7)
+        for n in (3, 4, 10, 60):
+            points = rng.uniform(0, 1, size=(n, 2))
+            distances = np.linalg.norm(points[:, None] - points[None, :], axis=2)
+            start = int(rng.integers(n))
+            greedy = routing.nearest_neighbour(distances, start)
+            improved = routing.two_opt(distances, greedy.copy())
+            self.assertEqual(improved[0], start)
+            self.assertEqual(sorted(improved), list(range(n)))
+            self.assertLessEqual(routing.path_length(distances, improved), routing.path_length(distances, greedy) + 1e-9)
+
+        # Stops on a line: the best path from one end walks straight along it.
+        x = np.array([0.0, 3.0, 1.0, 2.0, 4.0])
+        distances = np.abs(x[:, None] - x[None, :])
+        tour = routing.two_opt(distances, np.array([0, 1, 2, 3, 4]))
+        self.assertEqual(list(tour), [0, 2, 3, 1, 4])
+
+    def test_plan_groups_sites_starts_at_the_earliest_deadline_and_flags_late_stops(self):
+        now = timezone.now()
+        # The airport gets the lower id, so the tour's start is not just the first site.
+        airport = PickupSite.objects.create(normalized_address='airport', address='Airport', latitude=13.42, longitude=77.59)
+        campus = PickupSite.objects.create(normalized_address='campus', address='Campus', latitude=12.97, longitude=77.59)
+        nowhere = PickupSite.objects.create(normalized_address='nowhere', address='Nowhere')
+
+        def claimed(site, hours):
+            return Donation.objects.create(
+                donor=self.donor, food_item="Meal", category="cooked", quantity="5", pickup_location=site.address,
+                pickup_site=site, pickup_by=now + timedelta(hours=hours), status='claimed', claimed_by=self.ngos[0],
+            )
+
+        lunch, dinner = claimed(airport, 1), claimed(airport, 3)
+        first = claimed(campus, 0.5)
+        lost = claimed(nowhere, 2)
+        route = routing.plan(self.ngos[0], now=now)
+
+        self.assertEqual([stop['donations'] for stop in route['stops']], [[first], [lunch, dinner]])
+        self.assertEqual(route['unplaced'], [[lost]])
+        self.assertEqual(route['stops'][0]['leg_km'], 0.0)
+        self.assertFalse(route['stops'][0]['late'])
+        # About 50 km at ROUTE_SPEED_KMH misses the one-hour deadline.
+        self.assertAlmostEqual(route['total_km'], 50.0, delta=1.0)
+        self.assertAlmostEqual(route['stops'][1]['cumulative_km'], route['total_km'])
+        self.assertTrue(route['stops'][1]['late'])
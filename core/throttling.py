@@ -0,0 +1,34 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def client_ip(request):
+    # Each proxy appends the address it was connected from, so the entry
+    # TRUSTED_PROXY_HOPS from the right was written by our outermost proxy.
+    # Anything to its left came from the client and can be forged.
+    hops = settings.TRUSTED_PROXY_HOPS
+    if hops:
+        forwarded = [entry.strip() for entry in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        if len(forwarded) >= hops and forwarded[-hops]:
+            return forwarded[-hops]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def allow(scope, key, capacity, per_seconds):
+    """
+    Token bucket kept in the cache: ``capacity`` requests may burst, refilled
+    at ``capacity`` per ``per_seconds``. Read-modify-write is not atomic across
+    processes, so a burst can overshoot slightly; that is fine for spam control.
+    """
+    cache_key = f"throttle:{scope}:{hashlib.sha256(key.encode()).hexdigest()[:32]}"
+    now = time.time()
+    tokens, updated = cache.get(cache_key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * capacity / per_seconds)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    cache.set(cache_key, (tokens, now), per_seconds)
+    return allowed
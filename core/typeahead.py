@@ -0,0 +1,231 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import tasks
+from .models import Donation
+
+# Typeahead for the feed's keyword and location boxes. Each process keeps a
+# prefix index over the food items and pickup locations of available
+# donations, so answering a keystroke never touches the database. A post or
+# claim in this process updates the index at once, and a donation drops out
+# when its pickup deadline passes. Changes made by other processes arrive
+# with a full rebuild in the background every TYPEAHEAD_REFRESH_SECONDS. The
+# first build runs at worker start (core.warmup); until it finishes,
+# suggestions are empty.
+FIELDS = ('food', 'location')
+LIMIT = 8
+# Most index entries examined per lookup. Enough to rank any prefix of two
+# or more letters; one-letter prefixes settle for the first entries.
+MAX_SCAN = 2000
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', text)).strip()
+
+
+def pattern(text):
+    """
+    Case-insensitive regex (for ``__iregex``) finding ``text`` in stored text
+    the way normalize() compares it: any run of spaces or punctuation between
+    words. A chosen label is whitespace-collapsed, so plain ``icontains``
+    would miss "Veg  Fried Rice". None when ``text`` has no words.
+    """
+    words = normalize(text).split()
+    return r'\W+'.join(re.escape(word) for word in words) if words else None
+
+
+def _word_starts(phrase):
+    # "veg fried rice" is found by "veg", "fried" and "rice".
+    return [phrase[match.start():] for match in re.finditer(r'\S+', phrase)]
+
+
+class PrefixIndex:
+    # Distinct phrases, each reference-counted by the donations using it,
+    # plus a sorted list of (word start, phrase) pairs searched with bisect.
+    def __init__(self):
+        self._keys = []
+        self._counts = {}
+        self._labels = {}
+
+    def load(self, phrases):
+        # Bulk form of add() for (phrase, label) pairs: one sort instead of
+        # an insertion per phrase.
+        for phrase, label in phrases:
+            count = self._counts.get(phrase, 0)
+            self._counts[phrase] = count + 1
+            if not count:
+                self._labels[phrase] = label
+        self._keys = sorted((key, phrase) for phrase in self._labels for key in _word_starts(phrase))
+
+    def add(self, phrase, label):
+        count = self._counts.get(phrase, 0)
+        self._counts[phrase] = count + 1
+        if count:
+            return
+        self._labels[phrase] = label
+        for key in _word_starts(phrase):
+            bisect.insort(self._keys, (key, phrase))
+
+    def discard(self, phrase):
+        count = self._counts.get(phrase, 0)
+        if count > 1:
+            self._counts[phrase] = count - 1
+            return
+        if not count:
+            return
+        del self._counts[phrase], self._labels[phrase]
+        for key in _word_starts(phrase):
+            i = bisect.bisect_left(self._keys, (key, phrase))
+            if i < len(self._keys) and self._keys[i] == (key, phrase):
+                del self._keys[i]
+
+    def search(self, prefix, limit=LIMIT):
+        """Labels of phrases with a word starting with ``prefix``: most donations first, then phrase starts."""
+        start = bisect.bisect_left(self._keys, (prefix,))
+        end = min(bisect.bisect_left(self._keys, (prefix + '\U0010ffff',)), start + MAX_SCAN)
+        phrases = {phrase for _, phrase in self._keys[start:end]}
+        ranked = heapq.nsmallest(limit, phrases, key=lambda p: (-self._counts[p], not p.startswith(prefix), p))
+        return [self._labels[phrase] for phrase in ranked]
+
+    def __len__(self):
+        return len(self._counts)
+
+
+class DonationIndex:
+    def __init__(self):
+        self.fields = {field: PrefixIndex() for field in FIELDS}
+        self._donations = {}  # id -> (food phrase, location phrase, pickup_by)
+        self._deadlines = []  # heap of (pickup_by, id)
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        # Fill an empty index from (id, food_item, pickup_location, pickup_by) rows.
+        labels = {'food': [], 'location': []}
+        for donation_id, food_item, pickup_location, pickup_by in rows:
+            food, location = normalize(food_item), normalize(pickup_location)
+            if donation_id in self._donations or not (food or location):
+                continue
+            self._donations[donation_id] = (food, location, pickup_by)
+            self._deadlines.append((pickup_by, donation_id))
+            if food:
+                labels['food'].append((food, ' '.join(food_item.split())))
+            if location:
+                labels['location'].append((location, ' '.join(pickup_location.split())))
+        heapq.heapify(self._deadlines)
+        for field, phrases in labels.items():
+            self.fields[field].load(phrases)
+
+    def add(self, donation_id, food_item, pickup_location, pickup_by):
+        food, location = normalize(food_item), normalize(pickup_location)
+        with self._lock:
+            if donation_id in self._donations or not (food or location):
+                return
+            self._donations[donation_id] = (food, location, pickup_by)
+            heapq.heappush(self._deadlines, (pickup_by, donation_id))
+            if food:
+                self.fields['food'].add(food, ' '.join(food_item.split()))
+            if location:
+                self.fields['location'].add(location, ' '.join(pickup_location.split()))
+
+    def remove(self, donation_id):
+        with self._lock:
+            self._remove(donation_id)
+
+    def _remove(self, donation_id):
+        entry = self._donations.pop(donation_id, None)
+        if entry is not None:
+            self.fields['food'].discard(entry[0])
+            self.fields['location'].discard(entry[1])
+
+    def expire(self, now):
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                pickup_by, donation_id = heapq.heappop(self._deadlines)
+                entry = self._donations.get(donation_id)
+                if entry is not None and entry[2] == pickup_by:
+                    self._remove(donation_id)
+
+    def search(self, field, prefix, limit=LIMIT):
+        with self._lock:
+            return self.fields[field].search(prefix, limit)
+
+
+_index = None
+_built_at = 0.0
+_rebuilding = threading.Lock()
+# While a rebuild runs, local updates are also logged here and replayed on
+# the new index before it replaces the old one; the build's query may have
+# run before they were committed.
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def build():
+    now = timezone.now()
+    index = DonationIndex()
+    rows = Donation.objects.hot().filter(status='available', pickup_by__gt=now).values_list(
+        'id', 'food_item', 'pickup_location', 'pickup_by'
+    )
+    index.load(rows.iterator(chunk_size=2000))
+    return index
+
+
+def rebuild():
+    global _index, _built_at, _journal
+    if not _rebuilding.acquire(blocking=False):
+        return  # another thread is already rebuilding
+    try:
+        with _journal_lock:
+            _journal = []
+        started = time.monotonic()
+        index = build()
+        with _journal_lock:
+            for method, args in _journal:
+                getattr(index, method)(*args)
+            _index, _built_at = index, started
+    finally:
+        with _journal_lock:
+            _journal = None
+        _rebuilding.release()
+
+
+def _current():
+    stale = _index is None or time.monotonic() - _built_at > settings.TYPEAHEAD_REFRESH_SECONDS
+    if stale and not _rebuilding.locked():
+        tasks.submit(rebuild)
+    return _index
+
+
+def suggest(field, text, limit=LIMIT):
+    prefix = normalize(text)
+    index = _current()
+    if not prefix or index is None:
+        return []
+    index.expire(timezone.now())
+    return index.search(field, prefix, limit)
+
+
+def _note(method, *args):
+    with _journal_lock:
+        if _index is not None:
+            getattr(_index, method)(*args)
+        if _journal is not None:
+            _journal.append((method, args))
+
+
+def note_available(donation):
+    _note('add', donation.id, donation.food_item, donation.pickup_location, donation.pickup_by)
+
+
+def note_unavailable(donation_id):
+    _note('remove', donation_id)
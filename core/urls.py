@@ -8,17 +8,26 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('contact/', views.contact_view, name='contact'),
     path('impact/', views.impact_analytics_view, name='impact_analytics'),
+    path('impact/series/', views.impact_series_view, name='impact_series'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/history/', views.donor_history_view, name='donor_history'),
+    path('dashboard/route/', views.pickup_route_view, name='pickup_route'),
 
     path('donate/', views.post_donation_view, name='post_donation'),
     path('donations/', views.view_donations_view, name='view_donations'),
+    path('donations/suggest/', views.donation_suggestions_view, name='donation_suggestions'),
 
     path('donations/claim/<int:donation_id>/', views.claim_donation_view, name='claim_donation'),
     path('claim-donation/<int:donation_id>/', views.claim_donation_view, name='claim_donation_alias'),
+    path('donations/<int:donation_id>/photo/<str:name>', views.donation_photo_view, name='donation_photo'),
 
     path('complete-donation/<int:donation_id>/', views.complete_donation_view, name='complete_donation'),
 
     path('add-review/<int:donation_id>/', views.add_review_view, name='add_review'),
 
     path('notifications/mark-as-read/', views.mark_notifications_as_read_view, name='mark_notifications_as_read'),
+    path('notifications/preferences/', views.notification_preferences_view, name='notification_preferences'),
+    path('cache-stats/', views.cache_stats_view, name='cache_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('donations/events/', views.donation_events_view, name='donation_events'),
 ]
@@ -1,22 +1,27 @@
+import hmac
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
 from django.core.validators import validate_email
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.db.models import Count, Avg, Q
-from django.db.models.functions import TruncDate
-import json
+from django.db import IntegrityError, transaction
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from datetime import timedelta
 from datetime import datetime 
 
-from .models import UserProfile, Donation, ContactMessage, Review, Notification
+from .models import UserProfile, Donation, ContactMessage, Review, PickupSite
 from .forms import CustomUserCreationForm
+from . import addresses, allocation, events, leaderboard, lifecycle, matching, metrics, notifications, pagination, photos, profiles, routing, tasks, throttling, timeseries, typeahead, webhooks
 
 
 def home_view(request):
@@ -78,11 +83,42 @@ def logout_view(request):
     return redirect('home')
 
 
+def _attach_reviews(donations, user):
+    donation_ids = [d.id for d in donations]
+    reviews_for_me_qs = Review.objects.filter(
+        donation_id__in=donation_ids,
+        reviewed_user=user
+    )
+    reviews_for_me = {review.donation_id: review for review in reviews_for_me_qs}
+    reviews_by_me = set(Review.objects.filter(
+        donation_id__in=donation_ids,
+        reviewer=user
+    ).values_list('donation_id', flat=True))
+    for d in donations:
+        if d.id in reviews_for_me:
+            d.review_for_me = reviews_for_me[d.id]
+        if d.id in reviews_by_me:
+            d.has_review_by_me = True
+
+
+def _donor_history_page(request):
+    # One page of the donor's history, newest first; older pages are fetched
+    # by the dashboard as the donor scrolls. Archived donations are left out.
+    position = None
+    if request.GET.get('before'):
+        position = pagination.decode_cursor(request.GET['before'])
+        if position is None:
+            raise Http404("Invalid cursor.")
+    history = Donation.objects.hot().filter(donor=request.user).select_related('claimed_by__userprofile')
+    donations, next_cursor = pagination.keyset_page(history, position, settings.DASHBOARD_PAGE_SIZE)
+    _attach_reviews(donations, request.user)
+    return donations, next_cursor
+
+
 @login_required
 def dashboard_view(request):
-    try:
-        profile = request.user.userprofile
-    except UserProfile.DoesNotExist:
+    profile = profiles.lookup(request.user)
+    if profile is None:
         if request.user.is_superuser:
             return redirect('/admin/')
         else:
@@ -90,52 +126,37 @@ def dashboard_view(request):
             return redirect('home')
 
     if profile.role == 'donor':
-        donations = Donation.objects.filter(donor=request.user).order_by('-created_at')
-        donation_ids = [d.id for d in donations]
-        
-        reviews_for_me_qs = Review.objects.filter(
-            donation_id__in=donation_ids,
-            reviewed_user=request.user
-        )
-        reviews_for_me = {review.donation_id: review for review in reviews_for_me_qs}
-        reviews_by_me = Review.objects.filter(
-            donation_id__in=donation_ids,
-            reviewer=request.user
-        ).values_list('donation_id', flat=True)
-        for d in donations:
-            if d.id in reviews_for_me:
-                d.review_for_me = reviews_for_me[d.id]
-            if d.id in reviews_by_me:
-                d.has_review_by_me = True
-
-        return render(request, 'core/donor_dashboard.html', {'donations': donations})
+        donations, next_cursor = _donor_history_page(request)
+        context = {
+            'donations': donations,
+            'next_cursor': next_cursor,
+            'monthly_leaders': leaderboard.top(leaderboard.month_board(timezone.now())),
+        }
+        return render(request, 'core/donor_dashboard.html', context)
     
     elif profile.role == 'ngo':
-        claimed_donations = Donation.objects.filter(claimed_by=request.user).order_by('-created_at')
-        donation_ids = [d.id for d in claimed_donations]
-        reviews_for_me_qs = Review.objects.filter(
-            donation_id__in=donation_ids,
-            reviewed_user=request.user
-        )
-        reviews_for_me = {review.donation_id: review for review in reviews_for_me_qs}
-        reviews_by_me = Review.objects.filter(
-            donation_id__in=donation_ids,
-            reviewer=request.user
-        ).values_list('donation_id', flat=True)
-
-        for d in claimed_donations:
-            if d.id in reviews_for_me:
-                d.review_for_me = reviews_for_me[d.id]
-            if d.id in reviews_by_me:
-                d.has_review_by_me = True
-        return render(request, 'core/ngo_dashboard.html', {'claimed_donations': claimed_donations})
+        claimed_donations = Donation.objects.hot().filter(claimed_by=request.user).select_related('donor__userprofile').order_by('-created_at')
+        _attach_reviews(claimed_donations, request.user)
+        context = {
+            'claimed_donations': claimed_donations,
+            'monthly_leaders': leaderboard.top(leaderboard.month_board(timezone.now())),
+        }
+        return render(request, 'core/ngo_dashboard.html', context)
 
     return redirect('home')
 
 
+@login_required
+def donor_history_view(request):
+    if profiles.role(request.user) != 'donor':
+        raise Http404
+    donations, next_cursor = _donor_history_page(request)
+    return render(request, 'core/_donor_history.html', {'donations': donations, 'next_cursor': next_cursor})
+
+
 @login_required
 def post_donation_view(request):
-    if request.user.userprofile.role != 'donor':
+    if profiles.role(request.user) != 'donor':
         return redirect('dashboard')
 
     if request.method == 'POST':
@@ -144,6 +165,13 @@ def post_donation_view(request):
         qty = request.POST.get('quantity')
         pickup_time_str = request.POST.get('pickup_by')
         addr = request.POST.get('pickup_location')
+        photo = request.FILES.get('photo')
+        if photo:
+            try:
+                photos.validate(photo)
+            except ValidationError as error:
+                messages.error(request, error.messages[0])
+                return render(request, 'core/post_donation.html', {'categories': Donation.CATEGORY_CHOICES})
 
         if all([food, cat, qty, pickup_time_str, addr]):
             if 'T' not in pickup_time_str and ' ' in pickup_time_str:
@@ -171,14 +199,29 @@ def post_donation_view(request):
 
             aware_datetime = timezone.make_aware(parsed_naive, timezone.get_current_timezone())
 
-            Donation.objects.create(
-                donor=request.user,
-                food_item=food,
-                category=cat,
-                quantity=qty,
-                pickup_location=addr,
-                pickup_by=aware_datetime,
-            )
+            with transaction.atomic():
+                if not lifecycle.use_idempotency_key(request):
+                    messages.info(request, 'This donation was already posted.')
+                    return redirect('dashboard')
+                donation = Donation.objects.create(
+                    donor=request.user,
+                    food_item=food,
+                    category=cat,
+                    quantity=qty,
+                    pickup_location=addr,
+                    pickup_site_id=addresses.site_for(addr),
+                    pickup_by=aware_datetime,
+                    allocate_after=allocation.round_closes(),
+                )
+                if photo:
+                    donation.photo.save(photo.name, photo)
+                    transaction.on_commit(lambda: tasks.submit(photos.make_thumbnails, donation.id))
+                webhooks.emit('donation.posted', donation)
+                # Last, so its recorded_at is close to the commit (core.events).
+                events.record('posted', donation, actor=request.user, when=donation.created_at)
+            matching.note_new_donation(donation, profiles.lookup(request.user).average_rating)
+            typeahead.note_available(donation)
+            metrics.donations_posted.inc()
 
             messages.success(request, 'Donation posted successfully!')
             return redirect('dashboard')
@@ -190,25 +233,46 @@ def post_donation_view(request):
 
 @login_required
 def view_donations_view(request):
-    if request.user.userprofile.role != 'ngo':
+    if profiles.role(request.user) != 'ngo':
         return redirect('dashboard')
 
-    donations = Donation.objects.filter(status='available')
+    donations = Donation.objects.hot().filter(status='available')
     keyword = request.GET.get('keyword', '')
     category = request.GET.get('category', '')
     location = request.GET.get('location', '')
     if keyword:
-        donations = donations.filter(food_item__icontains=keyword)
+        # Matches the way typeahead compares, so a picked suggestion finds its donations.
+        keyword_pattern = typeahead.pattern(keyword)
+        if keyword_pattern:
+            donations = donations.filter(food_item__iregex=keyword_pattern)
+        else:
+            donations = donations.filter(food_item__icontains=keyword)
     
     if category:
         donations = donations.filter(category=category)
 
     if location:
-        donations = donations.filter(pickup_location__icontains=location)
-    donations = donations.order_by('-created_at')
+        # Match against the small table of distinct normalized addresses, then
+        # filter donations by indexed site id. The term is tried as typed (a
+        # partial "st" must not become "street") and with abbreviations
+        # expanded (so "St Mary Rd" finds "street mary road"). Donations not
+        # yet given a site by backfill_pickup_sites fall back to their raw text.
+        sites = PickupSite.objects.filter(
+            Q(normalized_address__contains=addresses.normalize_text(location))
+            | Q(normalized_address__contains=addresses.normalize_address(location))
+        )
+        donations = donations.filter(
+            Q(pickup_site__in=sites) | Q(pickup_site__isnull=True, pickup_location__icontains=location.strip())
+        )
+    donations = donations.select_related('donor__userprofile').order_by('-created_at')
+
+    recommended = []
+    if not (keyword or category or location):
+        recommended = matching.recommended_donations(request.user)
 
     context = {
         'donations': donations,
+        'recommended': recommended,
         'categories': Donation.CATEGORY_CHOICES,
         'search_keyword': keyword,
         'search_category': category,
@@ -218,67 +282,144 @@ def view_donations_view(request):
 
 
 @login_required
-def claim_donation_view(request, donation_id):
-    if request.user.userprofile.role != 'ngo':
-        return redirect('dashboard')
-    donation = get_object_or_404(Donation, id=donation_id, status='available')
+def donation_suggestions_view(request):
+    # Typeahead for the feed's search boxes, answered from memory.
+    if profiles.role(request.user) != 'ngo':
+        return JsonResponse({'suggestions': []}, status=403)
+    field = request.GET.get('field')
+    if field not in typeahead.FIELDS:
+        return JsonResponse({'error': 'field must be food or location'}, status=400)
+    response = JsonResponse({'suggestions': typeahead.suggest(field, request.GET.get('q', '')[:100])})
+    response['Cache-Control'] = 'private, max-age=30'
+    return response
+
+
+def _announce_claim(donation):
+    notifications.notify(
+        donation.donor, 'claimed',
+        f"Your donation '{donation.food_item}' was claimed by {donation.claimed_by.username}.",
+        subject=f"Your donation '{donation.food_item}' has been claimed!",
+        body=f"Great news! Your donation has been claimed by the NGO: {donation.claimed_by.username}.",
+    )
 
-    donation.claimed_by = request.user
-    donation.status = 'claimed'
-    donation.save()
 
-    if donation.donor.email:
-        Notification.objects.create(
-            user=donation.donor,
-            message=f"Your donation '{donation.food_item}' was claimed by {request.user.username}.",
-            link="/dashboard/"
-        )
-        subject = f"Your donation '{donation.food_item}' has been claimed!"
-        message = f"Great news! Your donation has been claimed by the NGO: {donation.claimed_by.username}."
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[donation.donor.email],
-            fail_silently=True,
+def _announce_completion(donation):
+    if donation.claimed_by:
+        notifications.notify(
+            donation.claimed_by, 'completed',
+            f"Donation of '{donation.food_item}' is now complete. Please leave a review!",
+            subject=f"Donation Completed: {donation.food_item}",
+            body=f"The donation '{donation.food_item}' from {donation.donor.username} has been marked as completed.",
         )
 
+
+def _claim(donation_id, ngo):
+    donation = lifecycle.claim(donation_id, ngo)
+    typeahead.note_unavailable(donation.id)
+    tasks.submit(_announce_claim, donation)
+    return donation
+
+
+def _complete(donation_id, donor):
+    donation = lifecycle.complete(donation_id, donor)
+    tasks.submit(_announce_completion, donation)
+    return donation
+
+
+# Claim and complete are async: under ASGI (nowastemate/asgi.py) the worker
+# only waits for the transition itself, and the notification row and email
+# go to the background task pool.
+@login_required
+async def claim_donation_view(request, donation_id):
+    user = await request.auser()
+    if await sync_to_async(profiles.role)(user) != 'ngo':
+        return redirect('dashboard')
+    try:
+        donation = await sync_to_async(_claim)(donation_id, user)
+    except lifecycle.TransitionConflict as conflict:
+        if conflict.current is None:
+            raise Http404("No such donation.")
+        if conflict.current.claimed_by_id == user.id:
+            metrics.claims.inc(outcome='already_claimed')
+            messages.info(request, f"You have already claimed the donation: '{conflict.current.food_item}'.")
+            return redirect('dashboard')
+        if conflict.current.status == 'available' and conflict.current.allocate_after:
+            await sync_to_async(allocation.register_interest)(conflict.current, user)
+            metrics.claims.inc(outcome='interest')
+            closes = timezone.localtime(conflict.current.allocate_after)
+            messages.info(
+                request,
+                f"Your interest in '{conflict.current.food_item}' is registered. "
+                f"Donations in this round are allocated after {closes:%H:%M}.",
+            )
+            return redirect('view_donations')
+        metrics.claims.inc(outcome='unavailable')
+        messages.warning(request, "Sorry, this donation is no longer available.")
+        return redirect('view_donations')
+
+    metrics.claims.inc(outcome='claimed')
     messages.success(request, f"You have successfully claimed the donation: '{donation.food_item}'.")
     return redirect('dashboard')
 
 
 @login_required
-def complete_donation_view(request, donation_id):
-    donation = get_object_or_404(Donation, id=donation_id, donor=request.user)
-    if donation.status == 'claimed':
-        donation.status = 'completed'
-        donation.save()
-
-        if donation.claimed_by and donation.claimed_by.email:
-            Notification.objects.create(
-                user=donation.claimed_by,
-                message=f"Donation of '{donation.food_item}' is now complete. Please leave a review!",
-                link="/dashboard/"
-            )
-            subject = f"Donation Completed: {donation.food_item}"
-            message = f"The donation '{donation.food_item}' from {donation.donor.username} has been marked as completed."
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[donation.claimed_by.email],
-                fail_silently=True,
-            )
-        
-        messages.success(request, f"Thank you! You have marked the donation '{donation.food_item}' as completed.")
-    else:
-        messages.error(request, "This donation cannot be marked as completed at this time.")
+async def complete_donation_view(request, donation_id):
+    user = await request.auser()
+    try:
+        donation = await sync_to_async(_complete)(donation_id, user)
+    except lifecycle.TransitionConflict as conflict:
+        if conflict.current is None:
+            raise Http404("No such donation.")
+        if conflict.current.status == 'completed':
+            messages.info(request, f"The donation '{conflict.current.food_item}' is already marked as completed.")
+        else:
+            messages.error(request, "This donation cannot be marked as completed at this time.")
+        return redirect('dashboard')
 
+    metrics.completions.inc()
+    messages.success(request, f"Thank you! You have marked the donation '{donation.food_item}' as completed.")
     return redirect('dashboard')
 
 
+@login_required
+def donation_photo_view(request, donation_id, name):
+    donation = get_object_or_404(Donation.objects.only('id', 'thumbnails'), id=donation_id)
+    path = photos.thumbnail_path(donation, name)
+    if path is None:
+        raise Http404("No such photo.")
+    content_type = photos.MIME_TYPES[name.rsplit('.', 1)[-1]]
+    if settings.PHOTO_ACCEL_REDIRECT_PREFIX:
+        # nginx streams the file itself with sendfile.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.PHOTO_ACCEL_REDIRECT_PREFIX + path
+    else:
+        # Under gunicorn, FileResponse goes out through wsgi.file_wrapper (sendfile).
+        response = FileResponse(default_storage.open(path, 'rb'), content_type=content_type)
+    # File names carry a content hash, so a URL never changes meaning.
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
+@login_required
+def pickup_route_view(request):
+    if profiles.role(request.user) != 'ngo':
+        return redirect('dashboard')
+    return render(request, 'core/pickup_route.html', {'route': routing.plan(request.user)})
+
+
 def contact_view(request):
     if request.method == 'POST':
+        # Bots that fill the hidden honeypot field get the normal success page
+        # and cost nothing.
+        if request.POST.get('website'):
+            messages.success(request, "Thank you for your message! It has been sent successfully.")
+            return redirect('contact')
+
+        if not throttling.allow('contact', throttling.client_ip(request),
+                                settings.CONTACT_THROTTLE_BURST, settings.CONTACT_THROTTLE_SECONDS):
+            messages.error(request, "You have sent several messages recently. Please try again later.")
+            return render(request, 'core/contact.html', status=429)
+
         name = request.POST.get('name')
         email = request.POST.get('email')
         subject = request.POST.get('subject')
@@ -291,25 +432,22 @@ def contact_view(request):
         except ValidationError:
             messages.error(request, "Please enter a valid email address.")
             return render(request, 'core/contact.html')
-        ContactMessage.objects.create(
-            name=name, email=email, subject=subject, message=message
-        )
-        admin_subject = f"New Contact Message from {name}: {subject}"
-        admin_message = f"Message from: {name} ({email})\n\n{message}"
-        send_mail(
-            subject=admin_subject,
-            message=admin_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=['admin@nowastemate.com'],
-        )
-        user_subject = "Thank you for contacting NoWasteMate"
-        user_message = f"Hi {name},\n\nWe have received your message and will get back to you soon."
-        send_mail(
-            subject=user_subject,
-            message=user_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-        )
+
+        content_hash = ContactMessage.hash_content(subject, message)
+        window_start = timezone.now() - timedelta(hours=settings.CONTACT_DUPLICATE_WINDOW_HOURS)
+        if not ContactMessage.objects.filter(content_hash=content_hash, sent_at__gte=window_start).exists():
+            ContactMessage.objects.create(
+                name=name, email=email, subject=subject, message=message, content_hash=content_hash
+            )
+            # The address is whatever the sender typed, so cap what we send it.
+            if throttling.allow('contact-ack', email.casefold(), 1, settings.CONTACT_ACK_INTERVAL_SECONDS):
+                tasks.submit(
+                    send_mail,
+                    subject="Thank you for contacting NoWasteMate",
+                    message=f"Hi {name},\n\nWe have received your message and will get back to you soon.",
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    recipient_list=[email],
+                )
         messages.success(request, "Thank you for your message! It has been sent successfully.")
         return redirect('contact')
 
@@ -319,47 +457,54 @@ def contact_view(request):
 @login_required
 def add_review_view(request, donation_id):
     donation = get_object_or_404(Donation, id=donation_id)
-    user_profile = request.user.userprofile
+    role = profiles.role(request.user)
 
     if donation.status != 'completed':
         messages.error(request, "You can only review completed donations.")
         return redirect('dashboard')
 
     user_to_review = None
-    if user_profile.role == 'donor' and donation.claimed_by:
+    if role == 'donor' and donation.claimed_by:
         user_to_review = donation.claimed_by
-    elif user_profile.role == 'ngo' and donation.donor:
+    elif role == 'ngo' and donation.donor:
         user_to_review = donation.donor
     else:
         messages.error(request, "Cannot determine who to review for this donation.")
         return redirect('dashboard')
 
-    try:
-        Review.objects.get(donation=donation, reviewer=request.user)
+    if Review.objects.filter(donation=donation, reviewer=request.user).exists():
         messages.warning(request, "You have already reviewed this donation.")
         return redirect('dashboard')
-    except ObjectDoesNotExist:
-        pass 
+
     if request.method == 'POST':
         rating = request.POST.get('rating')
         comment = request.POST.get('comment')
         if not rating:
             messages.error(request, "You must select a rating.")
         else:
-            new_review = Review.objects.create(
-                donation=donation,
-                reviewer=request.user,
-                reviewed_user=user_to_review,
-                rating=rating,
-                comment=comment
-            )
-            
-            user_to_review.userprofile.recalculate_rating()
-            
-            Notification.objects.create(
-                user=user_to_review,
-                message=f"{request.user.username} left you a {rating}-star review!",
-                link="/dashboard/"
+            try:
+                with transaction.atomic():
+                    if not lifecycle.use_idempotency_key(request):
+                        messages.info(request, "Your review was already submitted.")
+                        return redirect('dashboard')
+                    Review.objects.create(
+                        donation=donation,
+                        reviewer=request.user,
+                        reviewed_user=user_to_review,
+                        rating=rating,
+                        comment=comment
+                    )
+                    user_to_review.userprofile.recalculate_rating()
+            except IntegrityError:
+                # A concurrent submission won the (donation, reviewer) unique constraint.
+                messages.warning(request, "You have already reviewed this donation.")
+                return redirect('dashboard')
+
+            metrics.reviews.inc()
+            notifications.notify(
+                user_to_review, 'review',
+                f"{request.user.username} left you a {rating}-star review!",
+                email=False,
             )
 
             messages.success(request, f"Thank you! Your review for {user_to_review.username} has been submitted.")
@@ -374,7 +519,7 @@ def add_review_view(request, donation_id):
 
 def impact_analytics_view(request):
     
-    total_donations = Donation.objects.filter(status='completed').count()
+    total_donations = leaderboard.total_completed()
     total_donors = UserProfile.objects.filter(role='donor', is_approved=True).count()
     total_ngos = UserProfile.objects.filter(role='ngo', is_approved=True).count()
 
@@ -397,24 +542,13 @@ def impact_analytics_view(request):
         review_count__gte=min_reviews
     ).aggregate(Avg('average_rating'))['average_rating__avg'] or 0.0
 
-    top_donors_data = User.objects.filter(donations__status='completed').annotate(
-        donation_count=Count('donations')
-    ).order_by('-donation_count')[:5]
-
-    donor_labels = [user.username for user in top_donors_data]
-    donor_counts = [user.donation_count for user in top_donors_data]
-
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    donations_over_time = (
-        Donation.objects.filter(status='completed', created_at__gte=thirty_days_ago)
-        .annotate(date=TruncDate('created_at'))
-        .values('date')
-        .annotate(count=Count('id'))
-        .order_by('date')
-    )
+    top_donors = leaderboard.top(leaderboard.ALL_TIME, 5)
+    donor_labels = [entry.user.username for entry in top_donors]
+    donor_counts = [entry.count for entry in top_donors]
 
-    time_labels = [item['date'].strftime('%b %d') for item in donations_over_time]
-    time_counts = [item['count'] for item in donations_over_time]
+    resolution, points = timeseries.recent_series('30d')
+    time_labels = timeseries.labels(points, resolution)
+    time_counts = [count for _, count in points]
 
     context = {
         'total_donations': total_donations,
@@ -424,16 +558,94 @@ def impact_analytics_view(request):
         'avg_ngo_rating': avg_ngo_rating,
         'min_reviews_for_rating': min_reviews,
 
-        'donor_labels': json.dumps(donor_labels),
-        'donor_counts': json.dumps(donor_counts),
+        'donor_labels': donor_labels,
+        'donor_counts': donor_counts,
 
-        'time_labels': json.dumps(time_labels),
-        'time_counts': json.dumps(time_counts),
+        'time_labels': time_labels,
+        'time_counts': time_counts,
     }
     return render(request, 'core/impact_analytics.html', context)
 
 
+def impact_series_view(request):
+    range_key = request.GET.get('range')
+    if range_key in timeseries.RANGES:
+        resolution, points = timeseries.recent_series(range_key)
+    else:
+        resolution = request.GET.get('resolution', 'day')
+        try:
+            start = timezone.make_aware(datetime.fromisoformat(request.GET['start']))
+            end = timezone.make_aware(datetime.fromisoformat(request.GET['end']))
+        except (KeyError, ValueError):
+            return JsonResponse({'error': "Pass a preset 'range' or ISO 'start' and 'end'."}, status=400)
+        if resolution not in timeseries.TRUNCATE or not start <= end <= start + timeseries.MAX_WINDOWS[resolution]:
+            return JsonResponse({'error': 'Invalid resolution or window.'}, status=400)
+        points = timeseries.series(resolution, start, end)
+
+    return JsonResponse({
+        'resolution': resolution,
+        'labels': timeseries.labels(points, resolution),
+        'counts': [count for _, count in points],
+    })
+
+
+@staff_member_required
+def cache_stats_view(request):
+    # Hit rates of this worker process's in-memory caches.
+    normalized = addresses.normalize_address.cache_info()
+    lookups = normalized.hits + normalized.misses
+    return JsonResponse({
+        'profiles': profiles.stats(),
+        'pickup_sites': addresses.site_cache_stats(),
+        'normalized_addresses': {
+            'size': normalized.currsize, 'maxsize': normalized.maxsize,
+            'hits': normalized.hits, 'misses': normalized.misses,
+            'hit_rate': round(normalized.hits / lookups, 4) if lookups else 0.0,
+        },
+    })
+
+
+def _machine_allowed(request, token):
+    # Machine clients send the configured bearer token; without one, staff only.
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metrics_view(request):
+    if not _machine_allowed(request, settings.METRICS_TOKEN):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def donation_events_view(request):
+    # Tail of the donation event log: pass the returned cursor as ``after``.
+    if not _machine_allowed(request, settings.DONATION_EVENTS_TOKEN):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    try:
+        after = max(0, int(request.GET.get('after', 0)))
+        limit = min(max(1, int(request.GET.get('limit', 500))), 1000)
+    except ValueError:
+        return JsonResponse({'error': 'after and limit must be integers'}, status=400)
+    batch = events.read(after, limit)
+    return JsonResponse({
+        'events': [events.serialize(event) for event in batch],
+        'cursor': batch[-1].id if batch else after,
+    })
+
+
 @login_required
 def mark_notifications_as_read_view(request):
     request.user.notifications.filter(is_read=False).update(is_read=True)
-    return redirect(request.META.get('HTTP_REFERER', 'dashboard'))
\ No newline at end of file
+    return redirect(request.META.get('HTTP_REFERER', 'dashboard'))
+
+
+@login_required
+def notification_preferences_view(request):
+    frequency = request.POST.get('digest_frequency')
+    if request.method == 'POST' and frequency in dict(UserProfile.DIGEST_CHOICES):
+        UserProfile.objects.filter(user=request.user).update(digest_frequency=frequency)
+        # update() skips save signals, so drop the cached preference explicitly.
+        profiles.invalidate(request.user.pk)
+        messages.success(request, "Your email preference has been saved.")
+    return redirect(request.META.get('HTTP_REFERER', 'dashboard'))
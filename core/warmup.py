@@ -0,0 +1,63 @@
+import logging
+
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver
+
+from . import typeahead
+
+logger = logging.getLogger(__name__)
+
+
+def _compile_patterns(patterns):
+    count = 0
+    for pattern in patterns:
+        pattern.pattern.regex  # compiled lazily on first access
+        count += 1
+        if isinstance(pattern, URLResolver):
+            count += _compile_patterns(pattern.url_patterns)
+    return count
+
+
+def warm_urls():
+    resolver = get_resolver()
+    resolver.reverse_dict  # populates the reverse lookup tables
+    return _compile_patterns(resolver.url_patterns)
+
+
+def warm_templates():
+    engine = engines['django']
+    count = 0
+    for directory in list(engine.engine.dirs) + list(get_app_template_dirs('templates')):
+        for path in directory.rglob('*.html'):
+            try:
+                engine.get_template(path.relative_to(directory).as_posix())
+                count += 1
+            except TemplateSyntaxError:
+                logger.warning("Skipping template %s during warmup", path, exc_info=True)
+    return count
+
+
+def warm_typeahead():
+    # Build this worker's feed typeahead index before it takes requests.
+    typeahead.rebuild()
+
+
+def warm_connections():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def warm_up(connect=True):
+    """
+    Pay the first-request costs at boot: URL regex compilation, template
+    parsing (kept by the cached loader) and, optionally, the DB connection
+    and the typeahead index.
+    """
+    urls = warm_urls()
+    templates = warm_templates()
+    if connect:
+        warm_connections()
+        warm_typeahead()
+    logger.info("Warmed %d URL patterns and %d templates", urls, templates)
@@ -0,0 +1,289 @@
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .lru import LRUCache
+from .models import WebhookDeadLetter, WebhookDelivery, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+# Partner webhooks. A lifecycle transition writes one WebhookDelivery row per
+# interested subscription (an outbox). The deliver_webhooks worker then POSTs
+# them in batches over kept-alive connections. A failed batch is retried with
+# exponential backoff and jitter; after WEBHOOK_MAX_ATTEMPTS the rows move to
+# WebhookDeadLetter. Each POST body is
+#     {"deliveries": [{"id": ..., "event": ..., "created_at": ..., "data": {...}}, ...]}
+# and is signed in the X-NoWasteMate-Signature header as
+#     t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<body>" keyed by the secret>.
+SIGNATURE_HEADER = 'X-NoWasteMate-Signature'
+USER_AGENT = 'NoWasteMate-Webhooks/1'
+
+# Active subscriptions, memoized so transitions with no subscribers cost no
+# query. Local saves invalidate at once (core.signals); other processes see
+# changes within the TTL.
+_subscriptions = LRUCache(maxsize=1, ttl=60)
+
+
+def active_subscriptions():
+    subscriptions = _subscriptions.get('active')
+    if subscriptions is None:
+        subscriptions = list(WebhookSubscription.objects.filter(is_active=True).values_list('id', 'events'))
+        _subscriptions.set('active', subscriptions)
+    return subscriptions
+
+
+def forget_subscriptions():
+    _subscriptions.pop('active')
+
+
+def donation_data(donation):
+    return {
+        'id': donation.id,
+        'food_item': donation.food_item,
+        'category': donation.category,
+        'quantity': donation.quantity,
+        'status': donation.status,
+        'pickup_location': donation.pickup_location,
+        'pickup_by': donation.pickup_by,
+        'donor': donation.donor.username,
+        'claimed_by': donation.claimed_by.username if donation.claimed_by_id else None,
+        'created_at': donation.created_at,
+        'claimed_at': donation.claimed_at,
+        'completed_at': donation.completed_at,
+    }
+
+
+def emit(event, donation):
+    """Queue ``event`` for every subscription that wants it. Returns the number queued."""
+    targets = [sub_id for sub_id, events in active_subscriptions() if not events or event in events]
+    if not targets:
+        return 0
+    # Round-trip through JSON so datetimes are stored as the strings partners receive.
+    payload = json.loads(json.dumps(donation_data(donation), cls=DjangoJSONEncoder))
+    WebhookDelivery.objects.bulk_create(
+        WebhookDelivery(subscription_id=sub_id, event=event, payload=payload) for sub_id in targets
+    )
+    return len(targets)
+
+
+def sign(secret, timestamp, body):
+    message = f'{timestamp}.'.encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify(secret, header, body, tolerance=300):
+    """Check a signature header the way a receiver should. Used by tests and documented for partners."""
+    try:
+        parts = dict(item.split('=', 1) for item in header.split(','))
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), parts.get('v1', ''))
+
+
+class ConnectionPool:
+    # Kept-alive HTTP(S) connections per origin, shared by the delivery
+    # threads. A connection is checked out for one request and returned
+    # afterwards. A reused connection the partner has since closed is
+    # retried once on a fresh one.
+    def __init__(self, timeout, per_origin=4):
+        self.timeout = timeout
+        self.per_origin = per_origin
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _checkout(self, origin):
+        with self._lock:
+            if self._idle[origin]:
+                return self._idle[origin].pop(), True
+        scheme, host, port = origin
+        factory = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return factory(host, port, timeout=self.timeout), False
+
+    def _checkin(self, origin, connection):
+        with self._lock:
+            if len(self._idle[origin]) < self.per_origin:
+                self._idle[origin].append(connection)
+                return
+        connection.close()
+
+    def post(self, url, body, headers):
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        while True:
+            connection, reused = self._checkout(origin)
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._checkin(origin, connection)
+            return response.status
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for connection in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: doubling up to a cap, jittered between half and all of it."""
+    delay = min(settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.WEBHOOK_RETRY_MAX_SECONDS)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _lease(limit, now):
+    # Take due rows and push their next attempt past the lease so a second
+    # worker skips them; the lease lapses on its own if this one dies.
+    with transaction.atomic():
+        rows = list(
+            WebhookDelivery.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(next_attempt_at__lte=now)
+            .select_related('subscription')
+            .order_by('next_attempt_at')[:limit]
+        )
+        WebhookDelivery.objects.filter(id__in=[row.id for row in rows]).update(
+            next_attempt_at=now + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS)
+        )
+    return rows
+
+
+def _send(pool, subscription, batch):
+    body = json.dumps({'deliveries': [
+        {'id': row.id, 'event': row.event, 'created_at': row.created_at.isoformat(), 'data': row.payload}
+        for row in batch
+    ]}).encode()
+    timestamp = int(time.time())
+    headers = {
+        'Content-Type': 'application/json',
+        'User-Agent': USER_AGENT,
+        SIGNATURE_HEADER: f't={timestamp},v1={sign(subscription.secret, timestamp, body)}',
+    }
+    try:
+        status = pool.post(subscription.url, body, headers)
+    except (OSError, http.client.HTTPException) as error:
+        return f'{type(error).__name__}: {error}'
+    return None if 200 <= status < 300 else f'HTTP {status}'
+
+
+def _settle(batch, error, now):
+    if error is None:
+        WebhookDelivery.objects.filter(id__in=[row.id for row in batch]).delete()
+        return len(batch), 0
+    attempts = batch[0].attempts + 1
+    if attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+        with transaction.atomic():
+            WebhookDeadLetter.objects.bulk_create(
+                WebhookDeadLetter(
+                    delivery_id=row.id, subscription_id=row.subscription_id, event=row.event, payload=row.payload,
+                    attempts=row.attempts + 1, last_error=error, created_at=row.created_at,
+                )
+                for row in batch
+            )
+            WebhookDelivery.objects.filter(id__in=[row.id for row in batch]).delete()
+        logger.warning("Dead-lettered %d webhook deliveries to %s: %s", len(batch), batch[0].subscription, error)
+        return 0, len(batch)
+    for row in batch:
+        row.attempts += 1
+        row.last_error = error
+        row.next_attempt_at = now + timedelta(seconds=backoff(row.attempts))
+    WebhookDelivery.objects.bulk_update(batch, ['attempts', 'last_error', 'next_attempt_at'])
+    return 0, 0
+
+
+def deliver_due(pool=None, limit=1000):
+    """
+    One pass: lease up to ``limit`` due deliveries and POST them in batches
+    of WEBHOOK_BATCH_SIZE per subscription, WEBHOOK_WORKERS subscriptions in
+    parallel. Returns (delivered, dead_lettered, leased).
+    """
+    rows = _lease(limit, timezone.now())
+    if not rows:
+        return 0, 0, 0
+    # Batches share an attempt count so a retried batch keeps its own backoff.
+    batches = defaultdict(list)
+    for row in rows:
+        batches[(row.subscription_id, row.attempts)].append(row)
+    jobs = []
+    for group in batches.values():
+        for start in range(0, len(group), settings.WEBHOOK_BATCH_SIZE):
+            jobs.append(group[start:start + settings.WEBHOOK_BATCH_SIZE])
+
+    own_pool = pool is None
+    pool = pool or ConnectionPool(settings.WEBHOOK_TIMEOUT_SECONDS)
+
+    # A pass can outlast the lease (many slow partners), so before each POST
+    # the lease on every row not yet settled is pushed out again. Renewals
+    # and settlements take turns under one lock, so a renewal never
+    # overwrites the retry time a settlement just set.
+    unsettled = {row.id for row in rows}
+    lock = threading.Lock()
+    renewed = [time.monotonic()]
+
+    def renew():
+        if time.monotonic() - renewed[0] < settings.WEBHOOK_LEASE_SECONDS / 4:
+            return
+        WebhookDelivery.objects.filter(id__in=list(unsettled)).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS)
+        )
+        renewed[0] = time.monotonic()
+
+    def run(subscription_jobs):
+        delivered = dead = 0
+        try:
+            for batch in subscription_jobs:
+                with lock:
+                    renew()
+                try:
+                    error = _send(pool, batch[0].subscription, batch)
+                except Exception as exc:
+                    # A bad stored URL or payload fails this batch, not the whole pass.
+                    logger.exception("Webhook batch to %s failed", batch[0].subscription)
+                    error = f'{type(exc).__name__}: {exc}'
+                with lock:
+                    ok, failed = _settle(batch, error, timezone.now())
+                    unsettled.difference_update(row.id for row in batch)
+                delivered += ok
+                dead += failed
+        finally:
+            connections.close_all()  # this thread's database connection
+        return delivered, dead
+
+    # Each subscription's batches go in order on one thread; different
+    # subscriptions are delivered in parallel.
+    by_subscription = defaultdict(list)
+    for batch in jobs:
+        by_subscription[batch[0].subscription_id].append(batch)
+    try:
+        with ThreadPoolExecutor(max_workers=min(settings.WEBHOOK_WORKERS, len(by_subscription))) as executor:
+            results = list(executor.map(run, by_subscription.values()))
+    finally:
+        if own_pool:
+            pool.close()
+    return sum(r[0] for r in results), sum(r[1] for r in results), len(rows)
@@ -0,0 +1,49 @@
+# Gunicorn settings for the production profile:
+#   gunicorn -c gunicorn.conf.py
+# Every value can be overridden from the environment (or on the command line).
+import multiprocessing
+import os
+
+raw_env = [f"DJANGO_SETTINGS_MODULE={os.environ.get('DJANGO_SETTINGS_MODULE', 'nowastemate.settings_production')}"]
+
+# Use nowastemate.asgi:application with worker_class uvicorn.workers.UvicornWorker for ASGI.
+wsgi_app = os.environ.get('GUNICORN_APP', 'nowastemate.wsgi:application')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# The views mostly wait on PostgreSQL, so threaded workers (gthread) give more
+# concurrency per megabyte than extra processes. Start at 2 x cores + 1
+# processes and tune threads with the benchmark in benchmarks/bench_workers.py.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Load Django once in the master so workers share its memory copy-on-write and
+# start already warm.
+preload_app = True
+
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+# Recycle workers periodically to bound slow memory growth.
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded; no DB connection here, as a
+    # socket opened before fork would be shared by every worker.
+    from core.warmup import warm_up
+    warm_up(connect=False)
+
+
+def post_fork(server, worker):
+    from django.db import connections
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    from core.warmup import warm_connections, warm_typeahead
+    warm_connections()
+    warm_typeahead()
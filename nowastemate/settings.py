@@ -19,6 +19,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -26,6 +27,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'nowastemate.urls'
@@ -77,6 +79,11 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded donation photos. Only the thumbnails are served, by
+# core.views.donation_photo_view, never directly from MEDIA_URL.
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = 'dashboard'
@@ -85,11 +92,127 @@ LOGOUT_REDIRECT_URL = 'home'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 LOGIN_URL = 'login'
 
+# Donations completed more than this many days ago are flagged as archived by
+# `manage.py archive_donations`, keeping them out of hot-path indexes.
+DONATION_ARCHIVE_AFTER_DAYS = 90
+
+# Donations per page on the donor dashboard; older pages load as the donor
+# scrolls, so a long history never renders in one response.
+DASHBOARD_PAGE_SIZE = 20
+
+# Reputation metrics (`manage.py refresh_reputation`): ratings are smoothed as
+# if every user had this many extra site-average reviews, and the recent
+# rating weighs each review by half every REPUTATION_HALF_LIFE_DAYS.
+REPUTATION_PRIOR_REVIEWS = 5
+REPUTATION_HALF_LIFE_DAYS = 30
+
+# Threads per process for fire-and-forget side effects (core.tasks), such as
+# claim/completion notifications and emails. Eager mode runs them inline.
+BACKGROUND_TASK_WORKERS = 4
+BACKGROUND_TASKS_EAGER = False
+
+# Per-process cache of each user's role and approval (core.profiles). Local
+# saves invalidate it at once; other processes' changes show up within the TTL.
+PROFILE_CACHE_SIZE = 10000
+PROFILE_CACHE_TTL = 60
+
+# Admin changelists on large tables show PostgreSQL's row estimate instead of
+# an exact COUNT(*) once the estimate reaches this many rows.
+ADMIN_EXACT_COUNT_LIMIT = 50000
+
+# Same-kind notifications for one user within this window merge into one row
+# (core.notifications). Emails follow each user's digest preference; queued
+# ones go out with `manage.py send_notification_digests`.
+NOTIFICATION_COALESCE_MINUTES = 60
+
+# Allocation mode (core.allocation): new donations collect NGO interest for
+# ALLOCATION_WINDOW_MINUTES, then `manage.py allocate_donations` assigns each
+# round at once instead of first-click-wins. An NGO holds at most
+# ALLOCATION_NGO_CAPACITY uncompleted claims; proximity decays over
+# ALLOCATION_DISTANCE_SCALE_KM.
+ALLOCATION_MODE = False
+ALLOCATION_WINDOW_MINUTES = 10
+ALLOCATION_NGO_CAPACITY = 5
+ALLOCATION_DISTANCE_SCALE_KM = 5.0
+
+# Average travel speed used for ETAs on NGO pickup routes (core.routing).
+ROUTE_SPEED_KMH = 20
+
+# Donation photo uploads (core.photos). Behind nginx, set
+# PHOTO_ACCEL_REDIRECT_PREFIX to an `internal` location aliased to MEDIA_ROOT
+# and nginx sends the file itself via X-Accel-Redirect.
+DONATION_PHOTO_MAX_MB = 10
+PHOTO_ACCEL_REDIRECT_PREFIX = None
+
+# Partner webhooks (core.webhooks), sent by `manage.py deliver_webhooks`.
+# Failed batches retry after WEBHOOK_RETRY_BASE_SECONDS, doubling up to
+# WEBHOOK_RETRY_MAX_SECONDS; after WEBHOOK_MAX_ATTEMPTS they are dead-lettered.
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_WORKERS = 8
+WEBHOOK_TIMEOUT_SECONDS = 10
+WEBHOOK_LEASE_SECONDS = 120
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE_SECONDS = 30
+WEBHOOK_RETRY_MAX_SECONDS = 6 * 3600
+
+# Prometheus metrics at /metrics (core.metrics). Scrapers send
+# `Authorization: Bearer <METRICS_TOKEN>`; without a token only staff can
+# read it. With several worker processes set METRICS_DIR to a local directory
+# they share: each writes its counts there every METRICS_FLUSH_SECONDS and a
+# scrape adds them up. Database gauges are recomputed every METRICS_GAUGE_TTL.
+METRICS_TOKEN = None
+METRICS_DIR = None
+METRICS_FLUSH_SECONDS = 5
+METRICS_STALE_SECONDS = 60
+METRICS_GAUGE_TTL = 30
+
+# Feed search typeahead (core.typeahead): each process rebuilds its in-memory
+# index this often to pick up posts and claims made by other processes.
+TYPEAHEAD_REFRESH_SECONDS = 30
+
+# Donation event log (core.events). Readers skip events younger than
+# DONATION_EVENT_SETTLE_SECONDS so a slow commit cannot slip in behind their
+# cursor. It must exceed the time from an event's insert to its commit.
+DONATION_EVENT_SETTLE_SECONDS = 5
+# /donations/events/ takes `Authorization: Bearer <DONATION_EVENTS_TOKEN>`,
+# or staff logins when no token is set.
+DONATION_EVENTS_TOKEN = None
+
+# Dotted path to a callable taking an address string and returning
+# (latitude, longitude) or None. Used when pickup sites are backfilled.
+GEOCODER = None
+
+# Contact form spam control: each client IP may send CONTACT_THROTTLE_BURST
+# messages per CONTACT_THROTTLE_SECONDS. Admins get one batched digest from
+# `manage.py send_contact_digest` instead of one email per message.
+CONTACT_THROTTLE_BURST = 5
+CONTACT_THROTTLE_SECONDS = 3600
+CONTACT_DUPLICATE_WINDOW_HOURS = 24
+CONTACT_DIGEST_RECIPIENTS = ['admin@nowastemate.com']
+# Senders get at most one acknowledgement email per address in this window.
+CONTACT_ACK_INTERVAL_SECONDS = 24 * 3600
+# Number of reverse proxies in front of the app that append to
+# X-Forwarded-For. 0 ignores the header and uses the socket address.
+TRUSTED_PROXY_HOPS = 0
+
+# On-demand profiling (core.middleware.ProfilingMiddleware). When disabled the
+# middleware removes itself at startup, so it costs nothing per request.
+PROFILING_ENABLED = False
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_SAMPLE_EVERY = 0  # profile 1 in N requests; 0 means only on request
+PROFILING_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_TOP_N = 40
+
 
 # Use SQLite for testing
 import sys
 if 'test' in sys.argv:
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': 'test_db.sqlite3'
-    }
\ No newline at end of file
+        'NAME': 'test_db.sqlite3',
+        # The concurrency tests need a file-backed database: SQLite's shared
+        # in-memory database errors on lock contention instead of waiting.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        'TEST': {'NAME': 'test_db.sqlite3'},
+    }
+    BACKGROUND_TASKS_EAGER = True
\ No newline at end of file
@@ -0,0 +1,62 @@
+# Production profile. Select it with
+#   DJANGO_SETTINGS_MODULE=nowastemate.settings_production
+# and serve with `gunicorn -c gunicorn.conf.py` (see gunicorn.conf.py).
+import os
+
+from .settings import *  # noqa: F401,F403
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'nowastemate_db'),
+        'USER': os.environ.get('POSTGRES_USER', 'nowastemate_user'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Keep connections open across requests instead of reconnecting every
+        # time; health checks drop connections the server has closed.
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# With DEBUG off and no explicit loaders, Django wraps the template loaders in
+# the cached loader, so each worker compiles a template once.
+
+# Caches shared between worker processes (cached gauges, recommendation lists)
+# need a shared backend; fall back to per-process memory without Redis.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
+# Gunicorn runs several workers; they pool their metrics here.
+METRICS_DIR = os.environ.get('METRICS_DIR', '/tmp/nowastemate-metrics')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+DONATION_EVENTS_TOKEN = os.environ.get('DONATION_EVENTS_TOKEN')
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic writes content-hashed copies of every asset plus .gz/.br
+# variants; serve STATIC_ROOT with far-future immutable cache headers.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.storage.PrecompressedManifestStaticFilesStorage'},
+}
+
+EMAIL_BACKEND = os.environ.get('DJANGO_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DJANGO_DEFAULT_FROM_EMAIL', 'no-reply@nowastemate.com')
+
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+# Reverse proxies in front of gunicorn that append to X-Forwarded-For.
+TRUSTED_PROXY_HOPS = int(os.environ.get('DJANGO_TRUSTED_PROXY_HOPS', 1))